@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app_service.settings")
 
 application = get_asgi_application()
+
+# opt-in: start the PDF render processes now rather than on the first report
+from rest_app import pdf_render  # noqa: E402
+if pdf_render.PDF_RENDER_WARM_UP:
+    pdf_render.warm_up_render_pool()
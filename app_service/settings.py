@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "rest_app.metrics.StageTimingMiddleware",  # first, so it times everything below
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  #  ← add right after Security
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -80,6 +81,10 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # request threads, the Supabase writer and the report workers write
+        # concurrently: take the write lock up front so they wait for it
+        # instead of failing with "database is locked"
+        "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
     }
 }
 
@@ -137,3 +142,16 @@ MEDIA_URL = "images/"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Uploads are streamed to temporary files, hashed and checked as they arrive
+# (rest_app.uploads) instead of being held in memory for the whole request.
+FILE_UPLOAD_HANDLERS = ["rest_app.uploads.HashingUploadHandler"]
+
+# rest_app logs through `logging` (stage timings, spooled writes, failed
+# report prefetches); show its INFO messages on the console.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"rest_app": {"handlers": ["console"], "level": "INFO"}},
+}
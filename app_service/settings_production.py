@@ -0,0 +1,46 @@
+"""
+Production settings for app_service.
+
+Everything in settings.py, with debugging off, the secret key and hosts
+taken from the environment (DJANGO_SECRET_KEY and ALLOWED_HOSTS, both
+required: there is no safe default for either), and templates compiled once per process by the
+cached loader (no reloading when the files change). Select it with
+DJANGO_SETTINGS_MODULE=app_service.settings_production.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from app_service.settings import *  # noqa: F401,F403
+from app_service.settings import TEMPLATES
+
+
+def _required(name):
+    value = os.getenv(name, "").strip()
+    if not value:
+        raise ImproperlyConfigured(f"{name} must be set for app_service.settings_production")
+    return value
+
+
+DEBUG = False
+
+SECRET_KEY = _required("DJANGO_SECRET_KEY")
+
+ALLOWED_HOSTS = [host.strip() for host in _required("ALLOWED_HOSTS").split(",") if host.strip()]
+
+# Explicit loaders can't be combined with APP_DIRS: the app_directories
+# loader below takes its place.
+TEMPLATES = [{
+    **TEMPLATES[0],
+    "APP_DIRS": False,
+    "OPTIONS": {
+        **TEMPLATES[0]["OPTIONS"],
+        "debug": False,
+        "loaders": [
+            ("django.template.loaders.cached.Loader", [
+                "django.template.loaders.filesystem.Loader",
+                "django.template.loaders.app_directories.Loader",
+            ]),
+        ],
+    },
+}]
@@ -16,14 +16,35 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from rest_app.views.home_views import home, upload, inference
+from rest_app.views.home_views import home, upload, inference, inference_async
+from rest_app.views.job_views import create_job, job_events, job_status
+from rest_app.views.report_views import report_viewer
+from rest_app.views.export_views import export_buildings, export_csv, export_geojson
+from rest_app.views.history_views import (batch_results, batch_results_map, execution_history,
+                                          execution_history_details)
+from rest_app.views.metrics_views import metrics
+from rest_app.views.thumbnail_views import mask_tile, thumbnail
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", home, name="home"),
     path("upload/", upload, name="upload"),
     path("inference/", inference, name="inference"),
+    path("inference/async/", inference_async, name="inference_async"),
+    path("jobs/", create_job, name="create_job"),
+    path("jobs/<uuid:job_id>/", job_status, name="job_status"),
+    path("jobs/<uuid:job_id>/events/", job_events, name="job_events"),
     # path('report/pdf/', generate_pdf_report, name='generate_pdf'),
-    # path('report/view/<header_id>', report_viewer, name='view_report'),
+    path('report/view/<header_id>', report_viewer, name='view_report'),
+    path('export/<header_id>/csv/', export_csv, name='export_csv'),
+    path('export/<header_id>/geojson/', export_geojson, name='export_geojson'),
+    path('export/<header_id>/buildings/', export_buildings, name='export_buildings'),
+    path('history/', execution_history, name='execution_history'),
+    path('history/<header_id>/', execution_history_details, name='execution_history_details'),
+    path('results/<header_id>/', batch_results, name='batch_results'),
+    path('results/<header_id>/map/', batch_results_map, name='batch_results_map'),
+    path('metrics', metrics, name='metrics'),
+    path('thumbs/', thumbnail, name='thumbnail'),
+    path('tiles/<int:z>/<int:x>/<int:y>.png', mask_tile, name='mask_tile'),
     
 ]
@@ -0,0 +1,98 @@
+"""
+Compare the synchronous /inference/ view with /inference/async/ under
+concurrent, slow requests.
+
+Everything runs offline: Supabase is the in-memory backend, uploads go to a
+local directory with an artificial per-file delay, and /predict is a local
+stub with an artificial per-request delay. The WSGI side is limited to
+--workers concurrent requests (gunicorn's sync workers); the ASGI side serves
+every request from one event loop.
+
+    python benchmarks/bench_asgi_vs_wsgi.py --requests 24 --workers 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.offline import (as_form, percentile, setup_django, start_services,  # noqa: E402
+                                synthetic_batch)
+from rest_app.test.support import asgi_post  # noqa: E402
+
+
+def _form(i):
+    # a small tile: this benchmark is about waiting on I/O, not about bytes
+    return as_form(*synthetic_batch(i, pairs=1, size=64))
+
+
+def _summary(name, latencies, wall):
+    p95 = percentile(latencies, 95)
+    print(f"{name:<5} {len(latencies)} requests in {wall:6.2f} s  "
+          f"{len(latencies) / wall:6.2f} req/s  "
+          f"latency mean {statistics.mean(latencies):.2f} s  p95 {p95:.2f} s")
+
+
+def bench_wsgi(args, offset):
+    from django.test import Client
+
+    def one(i):
+        start = time.perf_counter()
+        resp = Client().post('/inference/', _form(offset + i))
+        assert resp.status_code == 200, resp.content[:200]
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        latencies = list(pool.map(one, range(args.requests)))
+    _summary('WSGI', latencies, time.perf_counter() - start)
+
+
+def bench_asgi(args, offset):
+    from django.core.asgi import get_asgi_application
+    application = get_asgi_application()
+
+    async def one(i):
+        start = time.perf_counter()
+        status, body = await asgi_post(application, '/inference/async/', _form(offset + i))
+        assert status == 200, body[:200]
+        return time.perf_counter() - start
+
+    async def run():
+        # straight to the ASGI app: django.test.AsyncClient serializes requests
+        return await asyncio.gather(*(one(i) for i in range(args.requests)))
+
+    start = time.perf_counter()
+    latencies = asyncio.run(run())
+    _summary('ASGI', latencies, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=24, help='single-pair requests per run')
+    parser.add_argument('--workers', type=int, default=3, help='concurrent WSGI workers')
+    parser.add_argument('--upload-delay', type=float, default=0.3, help='seconds per upload')
+    parser.add_argument('--predict-delay', type=float, default=0.5, help='seconds per /predict')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        services = start_services(upload_delay=args.upload_delay,
+                                  predict_delay=args.predict_delay)
+        # the PDF report is rendered in the background either way; leave it out
+        setup_django(tmp, services, render_reports=False)
+        try:
+            print(f"{args.requests} requests, upload {args.upload_delay}s/file, "
+                  f"predict {args.predict_delay}s, {args.workers} WSGI workers")
+            bench_wsgi(args, 0)
+            bench_asgi(args, args.requests)
+        finally:
+            services.close()
+
+
+if __name__ == '__main__':
+    main()
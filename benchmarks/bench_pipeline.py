@@ -0,0 +1,302 @@
+"""
+Offline benchmark of the /inference/ request path.
+
+Cloudinary, Supabase and the Flask model are replaced by local stand-ins
+with configurable latency (see benchmarks/offline.py). Each request uploads
+--pairs synthetic pre/post PNG pairs plus their geotransform JSON, and the
+run waits for the background Supabase writes and PDF reports to finish.
+
+The report covers request throughput and, for every stage timed with
+rest_app.metrics.timed (receive, validate, upload, inference, finish,
+render, the cloudinary.* / supabase.* / inference.predict / pdf.* calls,
+including those on worker threads): the call count, mean, p50, p95 and p99
+latency, and the peak RSS of the process while the stage ran.
+
+    python benchmarks/bench_pipeline.py --requests 20 --pairs 4 --concurrency 2
+    python benchmarks/bench_pipeline.py --json before.json   # keep for comparison
+
+With --url the requests go to a running server instead (start it with the
+offline backends, SUPABASE_BACKEND=memory CLOUDINARY_BACKEND=local). Stage
+means then come from its /metrics endpoint; percentiles and RSS per stage are
+only available in-process.
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.offline import (as_form, percentile, setup_django, start_services,  # noqa: E402
+                                synthetic_batch)
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        # no procfs (macOS): fall back to the high-water mark
+        return peak_rss()
+
+
+def peak_rss():
+    """High-water mark of this process's RSS in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageRecorder:
+    """
+    Collects (stage, start, end) windows of every timed stage, plus RSS
+    samples every `interval` seconds to attribute a peak RSS to each stage.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.windows = []
+        self.rss = []           # (time, bytes), in time order
+        self._stop = threading.Event()
+
+    def start(self):
+        from rest_app.metrics import STAGE_DURATION
+        observe = STAGE_DURATION.observe
+
+        def recording_observe(value, *labels):
+            observe(value, *labels)
+            end = time.perf_counter()
+            self.windows.append((labels[0], end - value, end))
+
+        # an instance attribute shadows the method for every timed() block
+        STAGE_DURATION.observe = recording_observe
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.rss.append((time.perf_counter(), current_rss()))
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        from rest_app.metrics import STAGE_DURATION
+        vars(STAGE_DURATION).pop('observe', None)
+        self._stop.set()
+        if hasattr(self, '_sampler'):
+            self._sampler.join()
+
+    def reset(self):
+        self.windows.clear()
+
+    def add(self, stage, start, end):
+        self.windows.append((stage, start, end))
+
+    def _peak_rss(self, windows):
+        times = [t for t, _ in self.rss]
+        peak = 0
+        for _, start, end in windows:
+            lo, hi = bisect_left(times, start), bisect_left(times, end)
+            # stages shorter than the interval: the first sample after start
+            samples = self.rss[lo:max(hi, lo + 1)]
+            peak = max([peak] + [rss for _, rss in samples])
+        return peak
+
+    def summary(self):
+        """stage → n, mean, p50, p95, p99 (seconds) and peak_rss_mb, in first-seen order."""
+        by_stage = {}
+        for window in self.windows:
+            by_stage.setdefault(window[0], []).append(window)
+        stats = {}
+        for stage, windows in by_stage.items():
+            durations = sorted(end - start for _, start, end in windows)
+            stats[stage] = {
+                'n': len(durations),
+                'mean': sum(durations) / len(durations),
+                'p50': percentile(durations, 50),
+                'p95': percentile(durations, 95),
+                'p99': percentile(durations, 99),
+                'peak_rss_mb': self._peak_rss(windows) / 2 ** 20,
+            }
+        return stats
+
+
+def wait_for_background(timeout=600):
+    """Block until the Supabase spool is empty and no report is pending."""
+    from rest_app.models import PendingWrite, Report
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not (PendingWrite.objects.exists()
+                or Report.objects.filter(status=Report.PENDING).exists()):
+            return
+        time.sleep(0.05)
+    raise RuntimeError('background work did not finish in time')
+
+
+def run_in_process(args, recorder):
+    """Drive /inference/ through the Django test client; returns the wall time."""
+    from django.test import Client
+
+    def one(i):
+        form = as_form(*synthetic_batch(i, args.pairs, args.image_size))
+        start = time.perf_counter()
+        resp = Client().post('/inference/', form)
+        end = time.perf_counter()
+        # batches of several pairs redirect to their results page
+        if resp.status_code not in (200, 302):
+            raise RuntimeError(f'request {i} failed: {resp.status_code} {resp.content[:200]!r}')
+        recorder.add('request', start, end)
+
+    for i in range(args.warmup):
+        one(args.requests + i)
+    wait_for_background()
+    recorder.reset()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - start
+
+    drain_start = time.perf_counter()
+    wait_for_background()
+    recorder.add('background.drain', drain_start, time.perf_counter())
+    return wall
+
+
+_METRIC_RE = re.compile(r'^app_stage_duration_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$')
+
+
+def _scrape(session, url):
+    totals = {}
+    for line in session.get(f'{url}/metrics', timeout=30).text.splitlines():
+        match = _METRIC_RE.match(line)
+        if match:
+            kind, stage, value = match.groups()
+            totals.setdefault(stage, {'sum': 0.0, 'count': 0.0})[kind] = float(value)
+    return totals
+
+
+def run_against_server(args):
+    """Drive a running server over HTTP; returns (wall time, summary)."""
+    import requests
+
+    url = args.url.rstrip('/')
+    local = threading.local()
+    latencies = []
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            local.session.get(f'{url}/upload/', timeout=30)     # sets the CSRF cookie
+        return local.session
+
+    def one(i):
+        files, geo_json = synthetic_batch(i, args.pairs, args.image_size)
+        s = session()
+        start = time.perf_counter()
+        resp = s.post(f'{url}/inference/',
+                      files=[('image_files', (name, content, 'image/png'))
+                             for name, content in files]
+                      + [('json_file', ('geo.json', geo_json, 'application/json'))],
+                      headers={'X-CSRFToken': s.cookies.get('csrftoken', ''),
+                               'Referer': f'{url}/upload/'},
+                      timeout=600, allow_redirects=False)
+        latencies.append(time.perf_counter() - start)
+        if resp.status_code not in (200, 302):
+            raise RuntimeError(f'request {i} failed: {resp.status_code} {resp.text[:200]}')
+
+    # distinct content per run, so a long-running server's caches stay cold
+    offset = int(time.time()) % 10000 * 1000
+    for i in range(args.warmup):
+        one(offset + args.requests + i)
+    latencies.clear()
+
+    before = _scrape(session(), url)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda i: one(offset + i), range(args.requests)))
+    wall = time.perf_counter() - start
+    after = _scrape(session(), url)
+
+    latencies.sort()
+    summary = {'request': {'n': len(latencies), 'mean': sum(latencies) / len(latencies),
+                           'p50': percentile(latencies, 50), 'p95': percentile(latencies, 95),
+                           'p99': percentile(latencies, 99), 'peak_rss_mb': None}}
+    for stage, total in after.items():
+        prev = before.get(stage, {'sum': 0.0, 'count': 0.0})
+        n = total['count'] - prev['count']
+        if n:
+            summary[stage] = {'n': int(n), 'mean': (total['sum'] - prev['sum']) / n,
+                              'p50': None, 'p95': None, 'p99': None, 'peak_rss_mb': None}
+    return wall, summary
+
+
+def _fmt(value, unit='s'):
+    if value is None:
+        return '-'
+    return f'{value:.1f}' if unit == 'mb' else f'{value * 1000:.1f}ms'
+
+
+def print_report(args, wall, summary):
+    pairs = args.requests * args.pairs
+    target = (args.url if args.url else
+              f"latency upload {args.upload_delay}s, supabase {args.supabase_delay}s, "
+              f"predict {args.predict_delay}s")
+    print(f"{args.requests} requests x {args.pairs} pairs ({args.image_size}px), "
+          f"concurrency {args.concurrency}; {target}")
+    print(f"throughput {args.requests / wall:.2f} req/s, {pairs / wall:.2f} pairs/s "
+          f"({wall:.2f} s)" + ("" if args.url else f"; peak RSS {peak_rss() / 2 ** 20:.1f} MB"))
+    print(f"{'stage':<22}{'n':>6}{'mean':>11}{'p50':>11}{'p95':>11}{'p99':>11}{'peak MB':>9}")
+    for stage, s in summary.items():
+        print(f"{stage:<22}{s['n']:>6}{_fmt(s['mean']):>11}{_fmt(s['p50']):>11}"
+              f"{_fmt(s['p95']):>11}{_fmt(s['p99']):>11}{_fmt(s['peak_rss_mb'], 'mb'):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=20, help='measured requests')
+    parser.add_argument('--pairs', type=int, default=4, help='pre/post pairs per request')
+    parser.add_argument('--concurrency', type=int, default=2, help='requests in flight')
+    parser.add_argument('--image-size', type=int, default=512, help='tile width/height in pixels')
+    parser.add_argument('--warmup', type=int, default=1, help='unmeasured requests first')
+    parser.add_argument('--upload-delay', type=float, default=0.05, help='seconds per upload')
+    parser.add_argument('--supabase-delay', type=float, default=0.02,
+                        help='seconds per Supabase call')
+    parser.add_argument('--predict-delay', type=float, default=0.2, help='seconds per /predict')
+    parser.add_argument('--url', help='benchmark a running server instead (e.g. http://127.0.0.1:8000)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    if args.url:
+        wall, summary = run_against_server(args)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            services = start_services(args.upload_delay, args.supabase_delay, args.predict_delay)
+            recorder = StageRecorder()
+            try:
+                setup_django(tmp, services)
+                recorder.start()
+                wall = run_in_process(args, recorder)
+            finally:
+                recorder.stop()
+                services.close()
+            summary = recorder.summary()
+
+    print_report(args, wall, summary)
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump({'config': vars(args), 'wall': wall,
+                       'throughput': args.requests / wall, 'stages': summary}, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Peak memory of merging a paged report into one PDF.
+
+Renders one report part of --page-size images (local 340px JPEG tiles, as
+the prefetch stage leaves them), then merges --parts copies of it with
+utils.merge_pdf_parts, as generate_pdf_report does for large batches, and
+reports the Python heap peak (tracemalloc) and RSS growth of the merge
+next to the size of the merged file.
+
+    python benchmarks/bench_report_merge.py --parts 4 20 40
+"""
+import argparse
+import gc
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MB = 1024 * 1024
+
+
+def _tiles(tmp, n, width=340):
+    """n pairs of noisy JPEG tiles (photo-like: they barely compress)."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        pair = []
+        for kind in ('post', 'mask'):
+            path = os.path.join(tmp, f"{kind}_{i}.jpg")
+            pixels = rng.integers(0, 255, (width, width, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(path, quality=85)
+            pair.append(path)
+        paths.append(pair)
+    return paths
+
+
+def render_part(tmp, page_size):
+    from rest_app import pdf_render, utils
+    from rest_app.test.test_reports import ROW
+
+    pdf_render.PDF_RENDER_WORKERS = 0
+    tiles = _tiles(tmp, page_size)
+    rows = [dict(ROW, post_image_url=post, damage_mask_url=mask) for post, mask in tiles]
+    utils.prefetch_images = lambda urls, **kwargs: {url: url for url in urls}
+    context = utils._report_context(*utils.build_summary(rows))
+    return utils._render_pdf_file({**context, "show_cover": False,
+                                   "image_data": utils._report_image_data(rows),
+                                   "image_offset": 0})
+
+
+def measure_merge(part, copies, tmp):
+    from rest_app.utils import merge_pdf_parts
+
+    parts = []
+    for i in range(copies):
+        parts.append(os.path.join(tmp, f"part_{i}.pdf"))
+        shutil.copyfile(part, parts[-1])
+    dest = os.path.join(tmp, "merged.pdf")
+
+    gc.collect()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    merge_pdf_parts(parts, dest)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+
+    size = os.path.getsize(dest)
+    for path in parts + [dest]:
+        os.remove(path)
+    return size, peak, rss_growth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--parts', type=int, nargs='+', default=[4, 20, 40],
+                        help='parts per merged report (one run each, in this order)')
+    parser.add_argument('--page-size', type=int, default=25, help='images per part')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app_service.settings')
+    import django
+    django.setup()
+    import logging
+    logging.getLogger('xhtml2pdf').setLevel(logging.CRITICAL)
+
+    tmp = tempfile.mkdtemp(prefix='bench_merge_')
+    try:
+        part = render_part(tmp, args.page_size)
+        print(f"part of {args.page_size} images: {os.path.getsize(part) / MB:.2f} MB")
+        for copies in args.parts:
+            size, peak, rss_growth = measure_merge(part, copies, tmp)
+            # ru_maxrss only grows: later, smaller runs show 0
+            print(f"{copies:4d} parts ({copies * args.page_size:5d} images): "
+                  f"merged {size / MB:7.1f} MB  heap peak {peak / MB:7.1f} MB  "
+                  f"RSS high-water +{rss_growth / MB:6.1f} MB")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Per-report template overhead, before and after the report fragments and the
+production template settings.
+
+Each iteration builds the report context and renders report.html for the
+cover and every --page-size images, as generate_pdf_report does, without
+pisa (add --pdf to include it). Three setups are timed in one process:
+
+  uncached   templates read and compiled on every get_template, fragments
+             rendered for every report (the old behaviour)
+  default    settings.py as is (Django's default loaders), fragments
+             rendered for every report
+  production settings_production TEMPLATES, fragments rendered once
+
+Images are never fetched: the prefetch step is replaced by local names.
+
+    python benchmarks/bench_report_render.py --reports 200 --images 10
+"""
+import argparse
+import io
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.offline import percentile  # noqa: E402
+
+
+def _uncached_templates(templates):
+    options = {**templates[0]['OPTIONS'], 'loaders': [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader']}
+    return [{**templates[0], 'APP_DIRS': False, 'OPTIONS': options}]
+
+
+def _rows(n):
+    from rest_app.test.test_reports import ROW
+    return [dict(ROW, post_image_url=f"post_{i}.png", damage_mask_url=f"mask_{i}.png")
+            for i in range(n)]
+
+
+def render_report(rows, page_size, pdf):
+    """Everything generate_pdf_report renders for one report, minus the upload."""
+    from django.template.loader import get_template
+    from xhtml2pdf import pisa
+    from rest_app import utils
+
+    context = utils._report_context(*utils.build_summary(rows))
+    parts = [context] + [{**context, "show_cover": False,
+                          "image_data": utils._report_image_data(rows[i:i + page_size]),
+                          "image_offset": i}
+                         for i in range(0, len(rows), page_size)]
+    for part in parts:
+        html = get_template("report.html").render(part)
+        if pdf:
+            pisa.CreatePDF(html, dest=io.BytesIO())
+
+
+def bench(name, args, rows, cache_fragments):
+    from rest_app.report_fragments import clear_report_fragments
+
+    clear_report_fragments()
+    render_report(rows, args.page_size, args.pdf)      # warm-up
+    timings = []
+    for _ in range(args.reports):
+        if not cache_fragments:
+            clear_report_fragments()
+        start = time.perf_counter()
+        render_report(rows, args.page_size, args.pdf)
+        timings.append(time.perf_counter() - start)
+    print(f"{name:<11} mean {1000 * statistics.mean(timings):8.2f} ms  "
+          f"p50 {1000 * percentile(timings, 50):8.2f} ms  "
+          f"p95 {1000 * percentile(timings, 95):8.2f} ms")
+    return statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--reports', type=int, default=200, help='reports per setup')
+    parser.add_argument('--images', type=int, default=10, help='images per report')
+    parser.add_argument('--page-size', type=int, default=25, help='images per rendered part')
+    parser.add_argument('--pdf', action='store_true', help='also run pisa on every part')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app_service.settings')
+    # only TEMPLATES is taken from the production profile
+    os.environ.setdefault('DJANGO_SECRET_KEY', 'bench-only')
+    os.environ.setdefault('ALLOWED_HOSTS', 'localhost')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.test.utils import override_settings
+
+    from app_service import settings_production
+    from rest_app import utils
+
+    utils.prefetch_images = lambda urls, **kwargs: {url: url for url in urls}
+    # pisa complains about every (local, missing) image
+    logging.getLogger('xhtml2pdf').setLevel(logging.CRITICAL)
+    rows = _rows(args.images)
+    print(f"{args.reports} reports x {args.images} images, page size {args.page_size}"
+          f"{', with pisa' if args.pdf else ', templates only'}")
+
+    with override_settings(TEMPLATES=_uncached_templates(settings.TEMPLATES)):
+        before = bench('uncached', args, rows, cache_fragments=False)
+    bench('default', args, rows, cache_fragments=False)
+    with override_settings(DEBUG=False, TEMPLATES=settings_production.TEMPLATES):
+        after = bench('production', args, rows, cache_fragments=True)
+    print(f"production vs uncached: {1000 * (after - before):+.2f} ms per report "
+          f"({before / after:.2f}x speed-up)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Offline environment shared by the benchmarks.
+
+`start_services` runs the local stand-ins that need no Django (the Flask
+/predict stub and an image server for the masks and the report logo, from
+rest_app.test.support). `setup_django` then points the app at them, at the
+in-memory Supabase and at a local upload directory, each with an artificial
+per-call latency, and migrates a throwaway sqlite database.
+`synthetic_batch` builds pre/post PNG pairs and their geotransform JSON, and
+`percentile` is the one percentile definition every benchmark reports.
+"""
+import io
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from rest_app.config.offline import InMemorySupabase  # noqa: E402
+from rest_app.test.support import (SlowUploader, StubImageServer,  # noqa: E402
+                                   StubInferenceService)
+
+GEO_PROJECTION = "EPSG:4326"
+
+
+class SlowSupabase(InMemorySupabase):
+    """InMemorySupabase whose every request takes `delay` seconds."""
+
+    def __init__(self, delay, tables=None):
+        super().__init__(tables)
+        self.delay = delay
+
+    def table(self, name):
+        query = super().table(name)
+        execute = query.execute
+
+        def slow_execute():
+            time.sleep(self.delay)
+            return execute()
+        query.execute = slow_execute
+        return query
+
+
+class Services:
+    """The running stand-ins and their latencies."""
+
+    def __init__(self, upload_delay=0.0, supabase_delay=0.0, predict_delay=0.0):
+        self.upload_delay, self.supabase_delay = upload_delay, supabase_delay
+        self.images = StubImageServer()
+        self.inference = StubInferenceService(
+            delay=predict_delay, mask_url=self.images.url(512, 512) + '?{name}')
+
+    def close(self):
+        self.inference.close()
+        self.images.close()
+
+
+def start_services(upload_delay=0.0, supabase_delay=0.0, predict_delay=0.0):
+    return Services(upload_delay, supabase_delay, predict_delay)
+
+
+def setup_django(tmp, services, render_reports=True):
+    """
+    Configure Django for an offline run inside the directory `tmp`.
+
+    With `render_reports=False` the background PDF report is left out.
+    """
+    os.environ.update(DJANGO_SETTINGS_MODULE='app_service.settings',
+                      SUPABASE_BACKEND='memory', CLOUDINARY_BACKEND='local',
+                      CLOUDINARY_LOCAL_DIR=os.path.join(tmp, 'uploads'),
+                      REPORT_IMAGE_CACHE_DIR=os.path.join(tmp, 'report_images'),
+                      INFERENCE_API_URL=services.inference.url)
+
+    import django
+    from django.db import connections
+    django.setup()
+    from django.test.utils import setup_test_environment
+    setup_test_environment()        # lets the test clients through ALLOWED_HOSTS
+    connections['default'].settings_dict['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+    from rest_app import pipeline, utils
+    from rest_app.config import cloudinary as cloudinary_config
+    from rest_app.config import supabase as supabase_config
+
+    cloudinary_config.set_uploader(SlowUploader(os.path.join(tmp, 'uploads'),
+                                                services.upload_delay))
+    supabase_config.set_supabase_client(SlowSupabase(services.supabase_delay))
+    utils.LOGO_URL = services.images.url(300, 90)
+    if not render_reports:
+        pipeline.schedule_report = lambda header_id, rows: None
+
+
+def synthetic_png(seed, size=512):
+    """A PNG tile of `size`² pixels: smooth terrain plus noise, unique per seed."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(0, 160, size, dtype=np.float32)
+    terrain = ramp[None, :, None] + ramp[:, None, None] * rng.uniform(0.2, 0.8, 3)
+    pixels = terrain + rng.integers(0, 48, (size, size, 3))
+    buf = io.BytesIO()
+    Image.fromarray(pixels.clip(0, 255).astype(np.uint8), 'RGB').save(
+        buf, format='PNG', compress_level=1)
+    return buf.getvalue()
+
+
+def synthetic_batch(index, pairs=1, size=512):
+    """
+    The files of one request: `pairs` pre/post tiles with unique content, so
+    the upload and inference caches never short-circuit them.
+
+    Returns:
+        (list, bytes): (file name, PNG bytes) pairs and the geotransform JSON.
+    """
+    files, geo = [], {}
+    for p in range(pairs):
+        base = f"bench_{index:05d}_{p:03d}"
+        origin = (-90.0 + 0.06 * p, 30.0 - 0.06 * index)
+        for k, kind in enumerate(('pre', 'post')):
+            name = f"{base}_{kind}_disaster.png"
+            files.append((name, synthetic_png((index, p, k), size)))
+            geo[name] = [[origin[0], 0.0001, 0.0, origin[1], 0.0, -0.0001], GEO_PROJECTION]
+    return files, json.dumps(geo).encode()
+
+
+def as_form(files, geo_json):
+    """Django test client form data for a synthetic_batch."""
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    return {'image_files': [SimpleUploadedFile(name, content) for name, content in files],
+            'json_file': SimpleUploadedFile('geo.json', geo_json)}
+
+
+def percentile(values, q):
+    """Nearest-rank q-th percentile (0-100) of `values`, in any order."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))]
@@ -0,0 +1,179 @@
+"""
+asyncio version of the inference pipeline, for the ASGI views.
+
+The stages are the same as in rest_app.pipeline, but every slow call is
+awaited instead of holding a worker thread: uploads fan out over
+`sync_to_async` threads (the Cloudinary SDK is synchronous), /predict chunks
+go through httpx, and local database work runs on Django's thread-sensitive
+executor. One event loop can therefore keep many slow batches in flight.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+from rest_app.cache import (plan_uploads, record_failed_uploads, record_uploads,
+                            lookup_inference_results, store_inference_results)
+from rest_app.config.cloudinary import upload_file, CLOUDINARY_UPLOAD_CONCURRENCY
+from rest_app.config.inference import get_async_inference_client
+from rest_app.metrics import timed
+from rest_app.pipeline import (INFERENCE_CHUNK_SIZE, INFERENCE_CHUNK_CONCURRENCY,
+                               INFERENCE_CHUNK_RETRIES, PipelineError, BatchResults,
+                               collect_uploads, create_execution_header,
+                               merge_chunk_response)
+from rest_app.uploads import release_upload
+from rest_app.validation import batch_index
+from rest_app.writes import close_execution, open_execution, write_rows
+
+# Threads shared by every request for blocking network calls (Cloudinary SDK,
+# Supabase header insert); bounds the process's outstanding blocking I/O.
+ASYNC_IO_THREADS = int(os.getenv('ASYNC_IO_THREADS', '32'))
+
+_io_executor = None
+
+
+def _io(func):
+    """sync_to_async on the shared I/O pool instead of the small default one."""
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=ASYNC_IO_THREADS,
+                                          thread_name_prefix='async-io')
+    return sync_to_async(func, thread_sensitive=False, executor=_io_executor)
+
+
+async def upload_files_deduplicated_async(files, folder=None, max_concurrency=None,
+                                          on_complete=None):
+    """
+    Awaitable upload_files_deduplicated; `on_complete` is a plain callable.
+
+    Raises:
+        PipelineError: on the first failed upload; the other uploads are
+                       cancelled (and awaited) first.
+    """
+    files = list(files)
+    plan = await sync_to_async(plan_uploads)(files, folder, on_complete)
+    limit = asyncio.Semaphore(max_concurrency or CLOUDINARY_UPLOAD_CONCURRENCY)
+    upload = _io(upload_file)
+
+    first_by_digest = plan['first_by_digest']
+
+    # each distinct content goes up under its digest (see rest_app.cache)
+    async def _upload(digest, file):
+        async with limit:
+            return digest, await upload(file, folder=folder, public_id=digest)
+
+    tasks = [asyncio.ensure_future(_upload(digest, file))
+             for digest, file in plan['misses']]
+    uploaded = {}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            digest, res = await next_done
+            public_id = first_by_digest[digest]
+            if not res['success']:
+                raise PipelineError(f'Failed to upload {public_id}: {res["error"]}')
+            uploaded[digest] = res
+            if on_complete:
+                on_complete(public_id, res)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # no upload outlives the call, whatever made it stop
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if len(uploaded) < len(plan['misses']):
+            record_failed_uploads(files, plan)
+
+    # keep the planned order regardless of completion order
+    uploaded = {digest: uploaded[digest] for digest, _ in plan['misses']}
+    return await sync_to_async(record_uploads)(files, folder, plan, uploaded, on_complete)
+
+
+async def predict_in_chunks_async(pairs, on_chunk, base_by_pre, chunk_size=None,
+                                  concurrency=None, retries=None, client=None):
+    """
+    Awaitable predict_in_chunks: same arguments and return value, with
+    `on_chunk` a coroutine function awaited as each chunk succeeds.
+    """
+    chunk_size  = chunk_size  or INFERENCE_CHUNK_SIZE
+    concurrency = concurrency or INFERENCE_CHUNK_CONCURRENCY
+    retries     = INFERENCE_CHUNK_RETRIES if retries is None else retries
+    client      = client or get_async_inference_client()
+
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    limit = asyncio.Semaphore(concurrency)
+
+    async def _predict(chunk):
+        # retry only the chunk that failed
+        for attempt in range(retries + 1):
+            try:
+                async with limit:
+                    flask_data = await client.predict([pair for _, pair in chunk])
+                return chunk, merge_chunk_response(chunk, flask_data, base_by_pre), None
+            except Exception as exc:
+                error = getattr(exc, 'message', str(exc))
+        return chunk, None, error
+
+    failed = []
+    for next_done in asyncio.as_completed([_predict(chunk) for chunk in chunks]):
+        chunk, chunk_results, error = await next_done
+        if error is None:
+            await on_chunk(chunk_results)
+        else:
+            failed.append((chunk, error))
+    return failed
+
+
+async def run_inference_pipeline_async(image_map, json_data, base_names):
+    """
+    Awaitable run_inference_pipeline (same arguments, result and errors).
+    """
+    index = batch_index(base_names, json_data)
+
+    # ------------------------------------------------------------------ #
+    # 1)  upload originals (fan-out over threads)                        #
+    # ------------------------------------------------------------------ #
+    uploads = collect_uploads(image_map, index)
+    with timed('upload'):
+        upload_res = await upload_files_deduplicated_async(
+            uploads, folder='inputs',
+            on_complete=lambda img_name, res: release_upload(image_map[img_name]))
+
+    # ------------------------------------------------------------------ #
+    # 2)  create the execution header (network only, off the DB thread)  #
+    # ------------------------------------------------------------------ #
+    header_id = await _io(create_execution_header)()
+    await sync_to_async(open_execution)(header_id)
+
+    # ------------------------------------------------------------------ #
+    # 3)  chunked inference over httpx; rows spooled as chunks land      #
+    # ------------------------------------------------------------------ #
+    batch = BatchResults(header_id, index, upload_res, json_data)
+    digests = batch.digests()
+    spool = sync_to_async(write_rows)
+
+    async def _on_predicted(chunk_results):
+        chunk_results = batch.predicted_chunk(chunk_results)
+        await spool('execution_details', batch.add(chunk_results))
+        await sync_to_async(store_inference_results)(batch.memo_entries(digests, chunk_results))
+
+    try:
+        with timed('inference'):
+            cached = await sync_to_async(lookup_inference_results)(digests)
+            if cached:
+                await spool('execution_details', batch.add(batch.cached_chunk(cached)))
+
+            to_predict = batch.to_predict(cached)
+            failed = await predict_in_chunks_async(to_predict, _on_predicted,
+                                                   batch.base_by_pre())
+    finally:
+        # as in run_inference_pipeline: no more rows are coming
+        await sync_to_async(close_execution)(header_id)
+    if failed:
+        raise PipelineError(f'Flask call failed for {len(failed)} chunk(s): '
+                            f'{failed[0][1]}')
+
+    # ------------------------------------------------------------------ #
+    # 4)  schedule the background PDF report                             #
+    # ------------------------------------------------------------------ #
+    with timed('finish'):
+        return await sync_to_async(batch.finish)(cached)
@@ -0,0 +1,280 @@
+"""
+Local caches that let repeated submissions skip remote work.
+
+Uploads are content-addressed: every file is hashed (streamed, one pass) and
+the digest is looked up in the `UploadedAsset` table before anything is sent
+to Cloudinary. Files are uploaded under their digest as public_id, so a
+later upload of different content under the same file name cannot overwrite
+an asset the table still points to. Predictions are memoized in `InferenceResult`, keyed by the
+digests of the pre/post pair and the model version.
+"""
+import hashlib
+import os
+import threading
+from datetime import timedelta
+
+from django.utils import timezone
+
+from rest_app.config.cloudinary import upload_files_concurrently
+from rest_app.models import UploadedAsset, InferenceResult
+
+# Entries kept before least-recently-used ones are evicted, and their lifetime
+UPLOAD_CACHE_MAX_ENTRIES = int(os.getenv('UPLOAD_CACHE_MAX_ENTRIES', '10000'))
+UPLOAD_CACHE_TTL         = int(os.getenv('UPLOAD_CACHE_TTL', str(7 * 24 * 3600)))
+
+# Tag of the model behind INFERENCE_API_URL; bump it when the model changes
+INFERENCE_MODEL_VERSION     = os.getenv('INFERENCE_MODEL_VERSION', 'default')
+INFERENCE_CACHE_MAX_ENTRIES = int(os.getenv('INFERENCE_CACHE_MAX_ENTRIES', '10000'))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_stats = {'upload':    {'hits': 0, 'misses': 0},
+          'inference': {'hits': 0, 'misses': 0}}
+_stats_lock = threading.Lock()
+
+
+def file_digest(file):
+    """
+    Return the SHA-256 hex digest of a file path, Django upload or file object.
+
+    The content is streamed in chunks and file objects are rewound afterwards
+    so they can be uploaded as-is. Uploads hashed on arrival by
+    rest_app.uploads.HashingUploadHandler are not read again.
+    """
+    if getattr(file, 'digest', None):
+        return file.digest
+
+    h = hashlib.sha256()
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    if isinstance(file, bytes):
+        h.update(file)
+        return h.hexdigest()
+
+    if hasattr(file, 'chunks'):
+        for block in file.chunks(HASH_CHUNK_SIZE):
+            h.update(block)
+    else:
+        for block in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            h.update(block)
+    file.seek(0)
+    return h.hexdigest()
+
+
+def upload_cache_stats():
+    """Process-wide hit/miss counters of the upload cache."""
+    with _stats_lock:
+        return dict(_stats['upload'])
+
+
+def inference_cache_stats():
+    """Process-wide hit/miss counters of the inference result cache."""
+    with _stats_lock:
+        return dict(_stats['inference'])
+
+
+def _record(cache_name, hits, misses):
+    with _stats_lock:
+        _stats[cache_name]['hits']   += hits
+        _stats[cache_name]['misses'] += misses
+
+
+def evict_uploads():
+    """Drop expired entries, then the least recently used beyond the size cap."""
+    UploadedAsset.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=UPLOAD_CACHE_TTL)).delete()
+
+    stale = (UploadedAsset.objects.order_by('-last_used_at')
+             .values_list('pk', flat=True)[UPLOAD_CACHE_MAX_ENTRIES:])
+    stale = list(stale)
+    if stale:
+        UploadedAsset.objects.filter(pk__in=stale).delete()
+
+
+def plan_uploads(files, folder=None, on_complete=None):
+    """
+    Hash `files` and resolve the ones already uploaded to `folder`.
+
+    Returns:
+        dict: 'digests' (public_id → digest), 'results' for the cache hits,
+              'misses' (the (digest, file) pairs still to upload, one per
+              distinct content; the digest is the public_id to upload under)
+              and 'first_by_digest' (digest → the first public_id given
+              for that content).
+    """
+    files = list(files)
+    digests = {public_id: file_digest(file) for public_id, file in files}
+
+    now = timezone.now()
+    fresh = UploadedAsset.objects.filter(
+        digest__in=set(digests.values()), folder=folder or '',
+        created_at__gte=now - timedelta(seconds=UPLOAD_CACHE_TTL))
+    known = {asset.digest: asset for asset in fresh}
+
+    results, misses, first_by_digest = {}, [], {}
+    for public_id, file in files:
+        digest = digests[public_id]
+        asset = known.get(digest)
+        if asset:
+            results[public_id] = {'success': True, 'secure_url': asset.secure_url,
+                                  'public_id': asset.public_id, 'digest': digest,
+                                  'cached': True}
+            if on_complete:
+                on_complete(public_id, results[public_id])
+        elif digest not in first_by_digest:
+            # identical files within one batch are uploaded once
+            first_by_digest[digest] = public_id
+            misses.append((digest, file))
+
+    if known:
+        UploadedAsset.objects.filter(digest__in=known, folder=folder or '').update(last_used_at=now)
+    return {'digests': digests, 'results': results, 'misses': misses,
+            'first_by_digest': first_by_digest}
+
+
+def record_uploads(files, folder, plan, uploaded, on_complete=None):
+    """
+    Remember freshly uploaded files and assemble the final result.
+
+    Args:
+        files: The (public_id, file) list given to plan_uploads.
+        plan: The plan_uploads result.
+        uploaded: digest → upload_file result for every planned miss.
+
+    Returns:
+        The upload_files_deduplicated result.
+    """
+    digests, results, first_by_digest = plan['digests'], plan['results'], plan['first_by_digest']
+    hits = len(files) - len(plan['misses'])
+    _record('upload', hits, len(plan['misses']))
+
+    for digest, res in uploaded.items():
+        res.update(digest=digest, cached=False)
+        results[first_by_digest[digest]] = res
+
+    # any row left for a missed digest has expired; replace it
+    UploadedAsset.objects.filter(digest__in=first_by_digest, folder=folder or '').delete()
+    UploadedAsset.objects.bulk_create(
+        [UploadedAsset(digest=res['digest'], folder=folder or '',
+                       secure_url=res['secure_url'], public_id=res['public_id'])
+         for res in uploaded.values()],
+        ignore_conflicts=True)
+    evict_uploads()
+
+    # duplicates inside the batch share the first copy's upload
+    for public_id, _ in files:
+        if public_id not in results:
+            results[public_id] = {**results[first_by_digest[digests[public_id]]], 'cached': True}
+            if on_complete:
+                on_complete(public_id, results[public_id])
+
+    return {'success': True, 'hits': hits, 'misses': len(plan['misses']),
+            'results': {public_id: results[public_id] for public_id, _ in files}}
+
+
+def record_failed_uploads(files, plan):
+    """Count the hits and misses of a batch whose uploads failed."""
+    _record('upload', len(files) - len(plan['misses']), len(plan['misses']))
+
+
+def upload_files_deduplicated(files, folder=None, max_workers=None, on_complete=None):
+    """
+    Drop-in replacement for upload_files_concurrently that skips files whose
+    content has already been uploaded to the same folder.
+
+    Returns:
+        The upload_files_concurrently result; each upload result also carries
+        its 'digest' and 'cached' flag, and the top level 'hits' / 'misses'.
+    """
+    files = list(files)
+    plan = plan_uploads(files, folder, on_complete)
+    first_by_digest = plan['first_by_digest']
+
+    def _on_upload(digest, res):
+        on_complete(first_by_digest[digest], res)
+
+    upload_res = upload_files_concurrently(plan['misses'], folder=folder,
+                                           max_workers=max_workers,
+                                           on_complete=_on_upload if on_complete else None)
+    if not upload_res['success']:
+        record_failed_uploads(files, plan)
+        return {**upload_res, 'failed': first_by_digest[upload_res['failed']]}
+    return record_uploads(files, folder, plan, upload_res['results'], on_complete)
+
+
+# --------------------------------------------------------------------------- #
+# Inference results                                                           #
+# --------------------------------------------------------------------------- #
+def pair_key(pre_digest, post_digest, model_version=None):
+    """Cache key of a pre/post pair for a given model version."""
+    version = model_version or INFERENCE_MODEL_VERSION
+    return hashlib.sha256(f"{version}:{pre_digest}:{post_digest}".encode()).hexdigest()
+
+
+def lookup_inference_results(pairs):
+    """
+    Look up memoized predictions.
+
+    Args:
+        pairs (dict): base name → (pre_digest, post_digest).
+
+    Returns:
+        dict: base name → (pre_mask_url, post_mask_url, damage) for every hit,
+              including each of several pairs with the same content.
+    """
+    keys = {}
+    for base, digests in pairs.items():
+        keys.setdefault(pair_key(*digests), []).append(base)
+    found = InferenceResult.objects.filter(key__in=keys, model_version=INFERENCE_MODEL_VERSION)
+
+    hits = {}
+    for row in found:
+        for base in keys[row.key]:
+            hits[base] = (row.pre_mask_url, row.post_mask_url, row.damage)
+    if hits:
+        found.update(last_used_at=timezone.now())
+    _record('inference', len(hits), len(pairs) - len(hits))
+    return hits
+
+
+def store_inference_results(results):
+    """
+    Memoize fresh predictions.
+
+    Args:
+        results (dict): base name → (pre_digest, post_digest,
+                        pre_mask_url, post_mask_url, damage).
+    """
+    rows = [InferenceResult(key=pair_key(pre_digest, post_digest),
+                            model_version=INFERENCE_MODEL_VERSION,
+                            pre_mask_url=pre_mask, post_mask_url=post_mask, damage=damage)
+            for pre_digest, post_digest, pre_mask, post_mask, damage in results.values()]
+    InferenceResult.objects.bulk_create(rows, ignore_conflicts=True)
+    evict_inference_results()
+
+
+def evict_inference_results():
+    """Drop the least recently used results beyond INFERENCE_CACHE_MAX_ENTRIES."""
+    stale = list(InferenceResult.objects.order_by('-last_used_at')
+                 .values_list('pk', flat=True)[INFERENCE_CACHE_MAX_ENTRIES:])
+    if stale:
+        InferenceResult.objects.filter(pk__in=stale).delete()
+
+
+def invalidate_inference_cache(everything=False):
+    """
+    Delete memoized results produced by any other model version
+    (or every result when `everything` is set).
+
+    Returns:
+        int: number of deleted results.
+    """
+    rows = InferenceResult.objects.all()
+    if not everything:
+        rows = rows.exclude(model_version=INFERENCE_MODEL_VERSION)
+    deleted, _ = rows.delete()
+    return deleted
@@ -3,7 +3,10 @@ import cloudinary.uploader
 import cloudinary.api
 from django.conf import settings
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from rest_app.metrics import timed
 
 # Load environment variables
 load_dotenv()
@@ -12,7 +15,7 @@ load_dotenv()
 def initialize_cloudinary():
     """
     Initialize Cloudinary with credentials from environment variables.
-    This function should be called once when the app starts.
+    Called by get_uploader() the first time a process needs Cloudinary.
     """
     cloudinary.config(
         cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
@@ -22,11 +25,53 @@ def initialize_cloudinary():
     )
     return cloudinary
 
-# Initialize the client
-cloudinary_client = initialize_cloudinary()
+# 'remote' uploads to Cloudinary; 'local' copies files to a directory (offline)
+CLOUDINARY_BACKEND = os.getenv('CLOUDINARY_BACKEND', 'remote')
 CLOUDINARY_FOLDER_NAME = os.getenv('CLOUDINARY_FOLDER_NAME', 'default_folder')
+# Maximum number of uploads in flight for upload_files_concurrently
+CLOUDINARY_UPLOAD_CONCURRENCY = int(os.getenv('CLOUDINARY_UPLOAD_CONCURRENCY', '8'))
+
+# The uploader is configured on first use, once per process (fork-safe)
+_uploader = None
+_uploader_pid = None
+_uploader_lock = threading.Lock()
+
+
+def get_uploader():
+    """Return the object whose upload()/destroy() store files (cloudinary.uploader by default)."""
+    global _uploader, _uploader_pid
+    with _uploader_lock:
+        if _uploader is None or _uploader_pid != os.getpid():
+            if CLOUDINARY_BACKEND == 'local':
+                from rest_app.config.offline import LocalUploader
+                _uploader = LocalUploader(os.getenv('CLOUDINARY_LOCAL_DIR'))
+            else:
+                initialize_cloudinary()
+                _uploader = cloudinary.uploader
+            _uploader_pid = os.getpid()
+        return _uploader
+
+
+def set_uploader(uploader):
+    """Swap the uploader (e.g. for a LocalUploader); None restores lazy creation."""
+    global _uploader, _uploader_pid
+    with _uploader_lock:
+        previous = _uploader
+        _uploader, _uploader_pid = uploader, (os.getpid() if uploader is not None else None)
+        return previous
+
+
+def _reset_after_fork():
+    global _uploader, _uploader_pid, _uploader_lock
+    _uploader, _uploader_pid = None, None
+    _uploader_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 # File management functions
+@timed('cloudinary.upload')
 def upload_file(file, folder=None, public_id=None):
     """
     Upload a file to Cloudinary
@@ -50,8 +95,12 @@ def upload_file(file, folder=None, public_id=None):
     if public_id:
         upload_options['public_id'] = public_id
     
+    if hasattr(file, 'temporary_file_path'):
+        # uploads spooled to disk are sent from their path
+        file = file.temporary_file_path()
+
     try:
-        result = cloudinary.uploader.upload(file, **upload_options)
+        result = get_uploader().upload(file, **upload_options)
         return {
             'success': True,
             'secure_url': result['secure_url'],
@@ -66,6 +115,64 @@ def upload_file(file, folder=None, public_id=None):
             'error': str(e)
         }
 
+def upload_files_concurrently(files, folder=None, max_workers=None, on_complete=None):
+    """
+    Upload several files to Cloudinary using a bounded thread pool
+
+    Args:
+        files: Ordered list of (public_id, file) tuples
+        folder: Optional folder name shared by every upload
+        max_workers: Maximum number of parallel uploads
+                     (defaults to CLOUDINARY_UPLOAD_CONCURRENCY)
+        on_complete: Optional callback(public_id, result) invoked as each
+                     successful upload finishes
+
+    Returns:
+        Dictionary with 'success' and 'results' (public_id -> upload_file
+        result, in the same order as `files`). On the first failed upload the
+        uploads that have not started yet are cancelled and 'failed' / 'error'
+        describe the failure.
+    """
+    files = list(files)
+    if not files:
+        return {'success': True, 'results': {}}
+
+    max_workers = max(1, min(max_workers or CLOUDINARY_UPLOAD_CONCURRENCY, len(files)))
+    abort = threading.Event()
+
+    def _upload(file, public_id):
+        # uploads still queued when another one fails are skipped
+        if abort.is_set():
+            return {'success': False, 'error': 'cancelled'}
+        return upload_file(file, folder=folder, public_id=public_id)
+
+    results, failure = {}, None
+    with ThreadPoolExecutor(max_workers=max_workers,
+                            thread_name_prefix='cloudinary-upload') as pool:
+        futures = {pool.submit(_upload, file, public_id): public_id
+                   for public_id, file in files}
+        for future in as_completed(futures):
+            public_id = futures[future]
+            try:
+                res = future.result()
+            except Exception as e:
+                res = {'success': False, 'error': str(e)}
+            if not res['success'] and failure is None:
+                failure = (public_id, res['error'])
+                abort.set()
+                for pending in futures:
+                    pending.cancel()
+            results[public_id] = res
+            if res['success'] and on_complete:
+                on_complete(public_id, res)
+
+    if failure:
+        return {'success': False, 'failed': failure[0], 'error': failure[1]}
+
+    # keep the caller's ordering regardless of completion order
+    return {'success': True,
+            'results': {public_id: results[public_id] for public_id, _ in files}}
+
 def delete_file(public_id, resource_type='image'):
     """
     Delete a file from Cloudinary
@@ -78,7 +185,7 @@ def delete_file(public_id, resource_type='image'):
         Dictionary with deletion result
     """
     try:
-        result = cloudinary.uploader.destroy(public_id, resource_type=resource_type)
+        result = get_uploader().destroy(public_id, resource_type=resource_type)
         return {
             'success': True,
             'result': result
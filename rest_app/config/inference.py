@@ -0,0 +1,287 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from dotenv import load_dotenv
+from rest_app.metrics import timed
+
+# Load environment variables
+load_dotenv()
+
+INFERENCE_API_URL           = os.getenv('INFERENCE_API_URL', 'http://127.0.0.1:8001/predict')
+INFERENCE_CONNECT_TIMEOUT   = float(os.getenv('INFERENCE_CONNECT_TIMEOUT', '5'))
+# Longest a /predict call may wait for its answer (a chunk of INFERENCE_CHUNK_SIZE pairs)
+INFERENCE_READ_TIMEOUT      = float(os.getenv('INFERENCE_READ_TIMEOUT', '300'))
+INFERENCE_POOL_SIZE         = int(os.getenv('INFERENCE_POOL_SIZE', '10'))
+INFERENCE_MAX_RETRIES       = int(os.getenv('INFERENCE_MAX_RETRIES', '3'))
+INFERENCE_BACKOFF           = float(os.getenv('INFERENCE_BACKOFF', '0.5'))
+INFERENCE_BREAKER_THRESHOLD = int(os.getenv('INFERENCE_BREAKER_THRESHOLD', '5'))
+INFERENCE_BREAKER_RESET     = float(os.getenv('INFERENCE_BREAKER_RESET', '30'))
+
+# Gateway errors mean the model server never handled the request, so it is
+# safe to send again; anything else may already have consumed GPU time. The
+# same goes for connection failures: only those before the request was sent
+# (see _never_sent) are retried, not a connection dropped while waiting.
+RETRYABLE_STATUS = {502, 503, 504}
+
+
+def _never_sent(exc):
+    """Whether a requests.ConnectionError happened before any byte was sent."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    # refused / unresolvable: urllib3 gave up opening a new connection
+    reason = exc.args[0] if exc.args else None
+    return isinstance(reason, MaxRetryError) and isinstance(reason.reason, NewConnectionError)
+
+
+class InferenceError(Exception):
+    """The inference service could not produce a prediction."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class CircuitOpenError(InferenceError):
+    """Calls are short-circuited after repeated failures."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `threshold` failures in a row the circuit opens and calls fail fast
+    for `reset_timeout` seconds. Then a single call is let through as a trial:
+    it closes the circuit if it succeeds and reopens it if it fails, and every
+    other call fails fast until it has. A trial that never reports back is
+    replaced after another `reset_timeout`.
+    """
+
+    def __init__(self, threshold=INFERENCE_BREAKER_THRESHOLD,
+                 reset_timeout=INFERENCE_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError('Inference service circuit is open')
+            if self.trial_started is not None and now - self.trial_started < self.reset_timeout:
+                raise CircuitOpenError('Inference service circuit is half-open; '
+                                       'a trial call is in progress')
+            self.trial_started = now
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold or self.trial_started is not None:
+                self.opened_at = time.monotonic()
+            self.trial_started = None
+
+
+class InferenceClient:
+    """
+    Keep-alive client for the Flask inference service.
+
+    One pooled `requests.Session` is shared by every caller in the process, so
+    concurrent chunks reuse warm TCP/TLS connections instead of opening one
+    per request.
+    """
+
+    def __init__(self, url=None, connect_timeout=None, read_timeout=None,
+                 pool_size=None, max_retries=None, backoff=None, breaker=None):
+        self.url = url or INFERENCE_API_URL
+        self.timeout = (connect_timeout or INFERENCE_CONNECT_TIMEOUT,
+                        read_timeout or INFERENCE_READ_TIMEOUT)
+        self.max_retries = INFERENCE_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = INFERENCE_BACKOFF if backoff is None else backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        pool_size = pool_size or INFERENCE_POOL_SIZE
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _sleep(self, attempt):
+        # exponential backoff with full jitter
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    @timed('inference.predict')
+    def predict(self, images):
+        """
+        POST a list of {image_name: url} pairs to /predict.
+
+        Returns:
+            dict: The decoded JSON response.
+
+        Raises:
+            CircuitOpenError: while the circuit is open.
+            InferenceError: when the call fails after its retries.
+        """
+        self.breaker.before_call()
+
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                resp = self.session.post(self.url, json={'images': images},
+                                         timeout=self.timeout)
+            except requests.ConnectionError as e:
+                if not _never_sent(e):
+                    # dropped after the request went out: it may have run
+                    self.breaker.record_failure()
+                    raise InferenceError(f'Inference call failed: {e}')
+                if last:
+                    self.breaker.record_failure()
+                    raise InferenceError(f'Inference service unreachable: {e}')
+                self._sleep(attempt)
+                continue
+            except requests.RequestException as e:
+                self.breaker.record_failure()
+                raise InferenceError(f'Inference call failed: {e}')
+
+            if resp.status_code in RETRYABLE_STATUS and not last:
+                self._sleep(attempt)
+                continue
+            if resp.status_code != 200:
+                self.breaker.record_failure()
+                raise InferenceError(f'Flask prediction failed ({resp.status_code})',
+                                     status_code=resp.status_code)
+
+            self.breaker.record_success()
+            return resp.json()
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncInferenceClient:
+    """
+    asyncio counterpart of InferenceClient for the ASGI views.
+
+    Uses a pooled `httpx.AsyncClient`, the same retry rules and, by default,
+    the circuit breaker of the shared synchronous client, so both paths see
+    the service's health alike.
+    """
+
+    def __init__(self, url=None, connect_timeout=None, read_timeout=None,
+                 pool_size=None, max_retries=None, backoff=None, breaker=None):
+        self.url = url or INFERENCE_API_URL
+        self.max_retries = INFERENCE_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = INFERENCE_BACKOFF if backoff is None else backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        pool_size = pool_size or INFERENCE_POOL_SIZE
+        self.session = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout or INFERENCE_READ_TIMEOUT,
+                                  connect=connect_timeout or INFERENCE_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size))
+
+    async def _sleep(self, attempt):
+        # exponential backoff with full jitter
+        await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    @timed('inference.predict')
+    async def predict(self, images):
+        """Same contract as InferenceClient.predict, awaited."""
+        self.breaker.before_call()
+
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                resp = await self.session.post(self.url, json={'images': images})
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                # raised while opening a connection, before the request is
+                # sent; a dropped connection is a RemoteProtocolError / ReadError
+                if last:
+                    self.breaker.record_failure()
+                    raise InferenceError(f'Inference service unreachable: {e}')
+                await self._sleep(attempt)
+                continue
+            except httpx.HTTPError as e:
+                self.breaker.record_failure()
+                raise InferenceError(f'Inference call failed: {e}')
+
+            if resp.status_code in RETRYABLE_STATUS and not last:
+                await self._sleep(attempt)
+                continue
+            if resp.status_code != 200:
+                self.breaker.record_failure()
+                raise InferenceError(f'Flask prediction failed ({resp.status_code})',
+                                     status_code=resp.status_code)
+
+            self.breaker.record_success()
+            return resp.json()
+
+    async def close(self):
+        await self.session.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+# httpx clients are bound to the event loop that first used them:
+# loop → (client, the _close_with_loop generator that closes it)
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_inference_client():
+    """Return the process-wide InferenceClient, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = InferenceClient()
+        return _client
+
+
+async def _close_with_loop(client):
+    # asyncio.run() (and so async_to_sync under WSGI) finalizes the async
+    # generators of a loop before closing it: the client goes with its loop
+    try:
+        yield
+    finally:
+        await client.close()
+
+
+def get_async_inference_client():
+    """
+    Return the AsyncInferenceClient of the running event loop; it is closed
+    when the loop shuts down.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        client = AsyncInferenceClient(breaker=get_inference_client().breaker)
+        closer = _close_with_loop(client)
+        loop.create_task(closer.__anext__())
+        _async_clients[loop] = (client, closer)
+    return _async_clients[loop][0]
@@ -0,0 +1,157 @@
+"""
+Offline stand-ins for Supabase and Cloudinary.
+
+Selected with SUPABASE_BACKEND=memory and CLOUDINARY_BACKEND=local, they let
+the service (and its tests) run without credentials or network access.
+Only the parts of the client APIs this app uses are implemented.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+
+# --------------------------------------------------------------------------- #
+# Supabase                                                                    #
+# --------------------------------------------------------------------------- #
+class InMemorySupabase:
+    """Keeps every table as a list of dicts in this process."""
+
+    def __init__(self, tables=None):
+        self.tables = tables or {}
+        self.queries = []   # (table, (first, last) row bounds) of every executed select
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+class _Query:
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+        self.filters, self.order_by, self.bounds = [], None, None
+        self.action, self.payload, self.columns = 'select', None, None
+
+    def select(self, *columns):
+        names = [c.strip() for c in ','.join(columns).split(',') if c.strip()]
+        self.columns = None if names in ([], ['*']) else names
+        return self
+
+    def insert(self, data):
+        self.action, self.payload = 'insert', data
+        return self
+
+    def update(self, data):
+        self.action, self.payload = 'update', data
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    def eq(self, field, value):
+        self.filters.append((field, lambda v, ref=value: str(v) == str(ref)))
+        return self
+
+    def gt(self, field, value):
+        self.filters.append((field, lambda v, ref=value: v is not None and v > ref))
+        return self
+
+    def lt(self, field, value):
+        self.filters.append((field, lambda v, ref=value: v is not None and v < ref))
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def limit(self, count):
+        self.bounds = (0, count - 1)
+        return self
+
+    def _matches(self, row):
+        return all(test(row.get(f)) for f, test in self.filters)
+
+    def execute(self):
+        with self.db._lock:
+            rows = self.db.tables.setdefault(self.name, [])
+
+            if self.action == 'insert':
+                new = self.payload if isinstance(self.payload, list) else [self.payload]
+                next_id = max((r.get('id', 0) for r in rows), default=0) + 1
+                added = [{'id': next_id + i, **row} for i, row in enumerate(new)]
+                rows.extend(added)
+                return _Response(added)
+
+            matched = [r for r in rows if self._matches(r)]
+            if self.action == 'update':
+                for row in matched:
+                    row.update(self.payload)
+                return _Response(matched)
+            if self.action == 'delete':
+                self.db.tables[self.name] = [r for r in rows if not self._matches(r)]
+                return _Response(matched)
+
+            self.db.queries.append((self.name, self.bounds))
+            if self.order_by:
+                column, desc = self.order_by
+                matched.sort(key=lambda r: r[column], reverse=desc)
+            if self.bounds:
+                matched = matched[self.bounds[0]:self.bounds[1] + 1]
+            if self.columns:
+                return _Response([{c: r.get(c) for c in self.columns} for r in matched])
+            return _Response([dict(r) for r in matched])
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+        self.error = None
+
+
+# --------------------------------------------------------------------------- #
+# Cloudinary                                                                  #
+# --------------------------------------------------------------------------- #
+class LocalUploader:
+    """Mimics cloudinary.uploader by copying files into a local directory."""
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(tempfile.gettempdir(), 'deployforce_uploads')
+
+    def _path(self, public_id):
+        return os.path.join(self.root, *public_id.split('/'))
+
+    def upload(self, file, folder=None, public_id=None, **options):
+        public_id = '/'.join(p for p in (folder, public_id or os.urandom(8).hex()) if p)
+        path = self._path(public_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if isinstance(file, (str, os.PathLike)):
+            shutil.copyfile(file, path)
+        else:
+            if hasattr(file, 'seek'):
+                file.seek(0)
+            with open(path, 'wb') as out:
+                chunks = file.chunks() if hasattr(file, 'chunks') else [file.read()]
+                for chunk in chunks:
+                    out.write(chunk)
+
+        return {
+            'secure_url': f'file://{path}',
+            'public_id': public_id,
+            'resource_type': 'image',
+            'format': os.path.splitext(getattr(file, 'name', str(file)))[1].lstrip('.'),
+            'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }
+
+    def destroy(self, public_id, resource_type='image'):
+        try:
+            os.remove(self._path(public_id))
+            return {'result': 'ok'}
+        except FileNotFoundError:
+            return {'result': 'not found'}
@@ -1,24 +1,83 @@
-from supabase import create_client
 import os
+import threading
 from dotenv import load_dotenv
+from rest_app.metrics import timed
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
-supabase_url = os.getenv('SUPABASE_HOST_URL')
-supabase_key = os.getenv('SUPABASE_API_SECRET')
-supabase_client = create_client(supabase_url, supabase_key) 
+# 'remote' talks to Supabase; 'memory' keeps every table in this process (offline)
+SUPABASE_BACKEND = os.getenv('SUPABASE_BACKEND', 'remote')
+
+# The client is created on first use, once per process: connections must not
+# be shared with forked workers, so a fork drops the parent's instance.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def _create_client():
+    if SUPABASE_BACKEND == 'memory':
+        from rest_app.config.offline import InMemorySupabase
+        return InMemorySupabase()
+
+    supabase_url = os.getenv('SUPABASE_HOST_URL')
+    supabase_key = os.getenv('SUPABASE_API_SECRET')
+    if not supabase_url or not supabase_key:
+        raise RuntimeError('SUPABASE_HOST_URL and SUPABASE_API_SECRET must be set '
+                           '(or SUPABASE_BACKEND=memory to run offline).')
+    # imported here: the supabase package is slow to import
+    from supabase import create_client
+    return create_client(supabase_url, supabase_key)
+
+
+def get_supabase_client():
+    """Return this process's Supabase client, creating it on first use."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client, _client_pid = _create_client(), os.getpid()
+        return _client
+
+
+def set_supabase_client(client):
+    """
+    Swap the client (e.g. for an InMemorySupabase); None restores lazy creation.
+
+    Returns:
+        The previously installed client, or None.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        previous = _client
+        _client, _client_pid = client, (os.getpid() if client is not None else None)
+        return previous
+
+
+def _reset_after_fork():
+    global _client, _client_pid, _client_lock
+    _client, _client_pid = None, None
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# Rows fetched per request when paging through a table (PostgREST caps at 1000)
+SUPABASE_PAGE_SIZE = int(os.getenv('SUPABASE_PAGE_SIZE', '1000'))
 
 def get_new_supabase_client():
-    return supabase_client
+    return get_supabase_client()
 
 # INSERT
+@timed('supabase.insert')
 def insert_row(table_name: str, data: dict):
     """Insert a single row into a Supabase table."""
-    response = supabase_client.table(table_name).insert(data).execute()
+    response = get_supabase_client().table(table_name).insert(data).execute()
     return response.data if response.data else response.error
 
+@timed('supabase.insert')
 def insert_multiple_rows(table_name: str, data_list: list[dict]) -> list[dict] | None:
     """
     Inserts multiple rows into a Supabase table.
@@ -35,7 +94,7 @@ def insert_multiple_rows(table_name: str, data_list: list[dict]) -> list[dict] |
         return None
 
     try:
-        response = supabase_client.table(table_name).insert(data_list).execute()
+        response = get_supabase_client().table(table_name).insert(data_list).execute()
         if response.data:
             return response.data
         else:
@@ -46,28 +105,69 @@ def insert_multiple_rows(table_name: str, data_list: list[dict]) -> list[dict] |
         return None
 
 # RETRIEVE BY ID
+@timed('supabase.select')
 def get_row_by_id(table_name: str, id_field: str, id_value):
     """Retrieve a single row by its ID field (usually primary key)."""
-    response = supabase_client.table(table_name).select("*").eq(id_field, id_value).execute()
+    response = get_supabase_client().table(table_name).select("*").eq(id_field, id_value).execute()
     return response.data if response.data else response.error
 
 # RETRIEVE BY MULTIPLE FIELDS
+@timed('supabase.select')
 def get_rows_by_filters(table_name: str, filters: dict):
     """Retrieve rows matching multiple filters (e.g., {'user_id': 1, 'status': 'done'})."""
-    query = supabase_client.table(table_name).select("*")
+    query = get_supabase_client().table(table_name).select("*")
     for field, value in filters.items():
         query = query.eq(field, value)
     response = query.execute()
     return response.data if response.data else response.error
 
+# KEYSET PAGE
+@timed('supabase.select')
+def select_page(table_name: str, filters: dict = None, columns: str = "*",
+                order_by: str = 'id', after=None, limit: int = None, desc: bool = False):
+    """
+    Return one page of rows ordered by `order_by`, starting after the key `after`.
+
+    Keyset pagination: the next page is requested with the `order_by` value of
+    the last row received, so deep pages cost the same as the first one.
+    Only the requested `columns` (a PostgREST select string) are fetched.
+    """
+    query = get_supabase_client().table(table_name).select(columns)
+    for field, value in (filters or {}).items():
+        query = query.eq(field, value)
+    if after is not None:
+        query = query.lt(order_by, after) if desc else query.gt(order_by, after)
+    response = query.order(order_by, desc=desc).limit(limit or SUPABASE_PAGE_SIZE).execute()
+    return response.data or []
+
+# ITERATE PAGE BY PAGE
+def iter_rows(table_name: str, filters: dict, order_by: str = 'id', page_size: int = None,
+              columns: str = "*"):
+    """
+    Yield the rows matching `filters` one page at a time.
+
+    Only one page is held in memory, so arbitrarily large result sets can be
+    streamed. `order_by` must be unique and part of `columns` (it is the page key).
+    """
+    page_size = page_size or SUPABASE_PAGE_SIZE
+    after = None
+    while True:
+        rows = select_page(table_name, filters, columns, order_by, after, page_size)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = rows[-1][order_by]
+
 # UPDATE BY ID
+@timed('supabase.update')
 def update_row_by_id(table_name: str, id_field: str, id_value, updated_data: dict):
     """Update a row based on its ID field."""
-    response = supabase_client.table(table_name).update(updated_data).eq(id_field, id_value).execute()
+    response = get_supabase_client().table(table_name).update(updated_data).eq(id_field, id_value).execute()
     return response.data if response.data else response.error
 
 # DELETE BY ID
+@timed('supabase.delete')
 def delete_row_by_id(table_name: str, id_field: str, id_value):
     """Delete a row based on its ID field."""
-    response = supabase_client.table(table_name).delete().eq(id_field, id_value).execute()
+    response = get_supabase_client().table(table_name).delete().eq(id_field, id_value).execute()
     return response.data if response.data else response.error
\ No newline at end of file
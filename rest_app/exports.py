@@ -0,0 +1,165 @@
+"""
+CSV / GeoJSON exports of an execution's `execution_details` rows.
+
+Both formats are produced by generators that read Supabase one page at a time
+and yield the output piece by piece, so an export never holds more than a
+page of rows in memory.
+
+The building export downloads each tile's damage mask, decodes it into class
+labels (DAMAGE_MASK_COLOURS) and outlines every building with
+geo.mask_polygons, one tile at a time.
+"""
+import csv
+import io
+import json
+import logging
+import os
+
+import numpy as np
+from PIL import Image
+
+from rest_app.config.supabase import iter_rows
+from rest_app.damage import AREA_COLUMNS, COST_COLUMNS, NUM_COLUMNS, SEVERITY_ORDER
+from rest_app.geo import mask_polygons, polygons_to_features, tile_footprint
+from rest_app.metrics import timed
+from rest_app.report_assets import read_source
+from rest_app.thumbnails import ThumbnailError, check_source
+
+# RGB colour of each damage class in the model's damage masks ("class=rrggbb,...");
+# black is background. Single-channel masks hold the class ids themselves
+# (xBD convention: 1 = no_damage ... 4 = destroyed).
+DAMAGE_MASK_COLOURS = {
+    name.strip(): tuple(bytes.fromhex(colour.strip()))
+    for name, colour in (item.split('=') for item in os.getenv(
+        'DAMAGE_MASK_COLOURS',
+        'no_damage=00ff00,minor_damage=ffff00,major_damage=ff8000,destroyed=ff0000').split(','))
+}
+# buildings smaller than this many mask pixels are left out (speckle)
+BUILDING_MIN_AREA = int(os.getenv('BUILDING_MIN_AREA', '4'))
+
+# mask class id → class name
+BUILDING_CLASSES = {i + 1: name for i, name in enumerate(SEVERITY_ORDER)}
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = (
+    ['pre_image_name', 'post_image_name', 'pre_image_url', 'post_image_url',
+     'localisation_mask_url', 'damage_mask_url']
+    + list(NUM_COLUMNS) + list(AREA_COLUMNS) + list(COST_COLUMNS)
+    + ['total_cost']
+)
+
+
+def execution_rows(header_id):
+    """Yield the detail rows of one execution, page by page."""
+    return iter_rows('execution_details', {'header_id': header_id})
+
+
+def export_record(row):
+    """Flatten one detail row into the exported fields (without geometry)."""
+    record = {col: row.get(col) for col in EXPORT_COLUMNS if col != 'total_cost'}
+    record['total_cost'] = sum(float(row.get(col) or 0) for col in COST_COLUMNS)
+    return record
+
+
+def row_footprint(row):
+    """GeoJSON polygon of the tile covered by a row, or None without geo_params."""
+    geo_params = row.get('geo_params')
+    if not geo_params:
+        return None
+    try:
+        return {'type': 'Polygon', 'coordinates': [tile_footprint(geo_params)]}
+    except (TypeError, ValueError):
+        return None
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """Yield CSV lines: a header, then one line per row (footprint ring as JSON)."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS + ['footprint'])
+    for row in rows:
+        record = export_record(row)
+        footprint = row_footprint(row)
+        yield writer.writerow([record[col] for col in EXPORT_COLUMNS]
+                              + [json.dumps(footprint['coordinates'][0]) if footprint else ''])
+
+
+def stream_geojson(rows, properties=None):
+    """Yield a GeoJSON FeatureCollection with one tile-footprint Feature per row."""
+    yield '{"type": "FeatureCollection"'
+    if properties:
+        yield f', "properties": {json.dumps(properties)}'
+    yield ', "features": ['
+    separator = ''
+    for row in rows:
+        feature = {'type': 'Feature',
+                   'geometry': row_footprint(row),
+                   'properties': export_record(row)}
+        yield separator + json.dumps(feature)
+        separator = ', '
+    yield ']}\n'
+
+
+# --------------------------------------------------------------------------- #
+# Building polygons                                                           #
+# --------------------------------------------------------------------------- #
+def mask_labels(img):
+    """
+    Class ids (0 = background, 1..4 in SEVERITY_ORDER) of a damage mask image.
+
+    Colour masks are matched to the nearest DAMAGE_MASK_COLOURS entry, so
+    resampling noise doesn't split a building; black stays background.
+    """
+    if img.mode in ('L', 'P', 'I'):
+        return np.asarray(img, dtype=np.int64)
+
+    rgb = np.asarray(img.convert('RGB'), dtype=np.int32)
+    palette = np.array([DAMAGE_MASK_COLOURS[name] for name in SEVERITY_ORDER])
+    distance = ((rgb[:, :, None, :] - palette) ** 2).sum(axis=-1)
+    labels = distance.argmin(axis=-1) + 1
+    labels[(rgb == 0).all(axis=-1)] = 0
+    return labels
+
+
+def row_buildings(row):
+    """
+    GeoJSON Features outlining the buildings of one detail row's damage mask;
+    empty when the row has no geotransform or its mask can't be fetched.
+    """
+    geo_params, url = row.get('geo_params'), row.get('damage_mask_url')
+    if not geo_params or not url:
+        return []
+    try:
+        check_source(url)
+        with Image.open(io.BytesIO(read_source(url))) as img:
+            labels = mask_labels(img)
+    except (ThumbnailError, OSError, ValueError) as exc:
+        logger.warning("Building export skipped %s: %s", url, exc)
+        return []
+
+    with timed('export.buildings'):
+        return polygons_to_features(
+            geo_params, mask_polygons(labels, BUILDING_MIN_AREA), BUILDING_CLASSES,
+            {'pre_image_name': row.get('pre_image_name'),
+             'post_image_name': row.get('post_image_name')})
+
+
+def stream_buildings_geojson(rows, properties=None):
+    """Yield a GeoJSON FeatureCollection with one polygon Feature per building."""
+    yield '{"type": "FeatureCollection"'
+    if properties:
+        yield f', "properties": {json.dumps(properties)}'
+    yield ', "features": ['
+    separator = ''
+    for row in rows:
+        for feature in row_buildings(row):
+            yield separator + json.dumps(feature)
+            separator = ', '
+    yield ']}\n'
@@ -0,0 +1,298 @@
+"""
+Vectorized pixel → geographic transforms.
+
+Every tile comes with the 6-parameter affine geotransform used by GDAL:
+
+    (lon_top_left, pixel_width, rotation_x, lat_top_left, rotation_y, pixel_height)
+
+    lon = lon_top_left + x * pixel_width + y * rotation_x
+    lat = lat_top_left + x * rotation_y  + y * pixel_height
+
+The helpers below apply it to whole coordinate arrays at once, so building
+outlines, footprints and reference points for a batch are one matrix product
+instead of a Python call per point.
+
+`mask_polygons` outlines the buildings of a label mask: 8-connected regions
+of one class, traced along their pixel edges.
+"""
+import numpy as np
+
+IMAGE_SIZE = (512, 512)  # Width x Height of the mask or satellite image
+
+
+def affine_matrix(geo_params):
+    """Return the 2x3 matrix mapping homogeneous pixel (x, y, 1) to (lon, lat)."""
+    lon0, pw, rx, lat0, ry, ph = np.asarray(geo_params, dtype=float)
+    return np.array([[pw, rx, lon0],
+                     [ry, ph, lat0]])
+
+
+def pixels_to_lonlat(geo_params, points):
+    """
+    Transform pixel coordinates to geographic ones.
+
+    Args:
+        geo_params: One 6-parameter geotransform, or an (M, 6) stack of them.
+        points: (N, 2) array of (x, y) pixels, or (M, N, 2) when a stack of
+                geotransforms is given (one set of points per tile).
+
+    Returns:
+        np.ndarray: Same shape as `points`, holding (lon, lat).
+    """
+    params = np.asarray(geo_params, dtype=float)
+    pts = np.asarray(points, dtype=float)
+
+    if params.ndim == 1:
+        m = affine_matrix(params)
+        return pts @ m[:, :2].T + m[:, 2]
+
+    # (M, 6) → (M, 2, 3): one affine matrix per tile
+    lon0, pw, rx, lat0, ry, ph = params.T
+    linear = np.stack([np.stack([pw, rx], -1), np.stack([ry, ph], -1)], 1)
+    offset = np.stack([lon0, lat0], -1)
+    return np.einsum('mnk,mjk->mnj', pts, linear) + offset[:, None, :]
+
+
+def pixels_to_latlon(geo_params, points):
+    """Like pixels_to_lonlat but in (lat, lon) order, as Leaflet expects."""
+    return pixels_to_lonlat(geo_params, points)[..., ::-1]
+
+
+def reference_points(image_size=IMAGE_SIZE):
+    """Pixel positions of the corners and centre used by the result viewer."""
+    width, height = image_size
+    return {
+        "top_left":     (0, 0),
+        "top_right":    (width - 1, 0),
+        "center":       (width // 2, height // 2),
+        "bottom_left":  (0, height - 1),
+        "bottom_right": (width - 1, height - 1),
+    }
+
+
+def reference_coords(geo_params, image_size=IMAGE_SIZE):
+    """Return {point name: [lat, lon]} for the corners and centre of one tile."""
+    names, pts = zip(*reference_points(image_size).items())
+    latlon = pixels_to_latlon(geo_params, np.array(pts))
+    return {name: [float(lat), float(lon)] for name, (lat, lon) in zip(names, latlon)}
+
+
+def batch_reference_coords(geo_params_list, image_size=IMAGE_SIZE):
+    """reference_coords for many tiles in a single transform."""
+    if not len(geo_params_list):
+        return []
+    names, pts = zip(*reference_points(image_size).items())
+    stack = np.broadcast_to(np.array(pts, dtype=float), (len(geo_params_list), len(pts), 2))
+    latlon = pixels_to_latlon(np.asarray(geo_params_list, dtype=float), stack)
+    return [{name: [float(lat), float(lon)] for name, (lat, lon) in zip(names, tile)}
+            for tile in latlon]
+
+
+def tile_footprint(geo_params, image_size=IMAGE_SIZE):
+    """Closed GeoJSON ring ([lon, lat] pairs) around the whole tile."""
+    width, height = image_size
+    corners = np.array([(0, 0), (width, 0), (width, height), (0, height), (0, 0)])
+    return pixels_to_lonlat(geo_params, corners).tolist()
+
+
+# --------------------------------------------------------------------------- #
+# Mask → polygons                                                             #
+# --------------------------------------------------------------------------- #
+def _row_runs(labels):
+    """Runs of equal, non-zero labels per row as (row, start, end, label) arrays (end exclusive)."""
+    h, w = labels.shape
+    padded = np.zeros((h, w + 2), dtype=labels.dtype)
+    padded[:, 1:-1] = labels
+    change = padded[:, 1:] != padded[:, :-1]
+    rows, cols = np.nonzero(change)
+    # every change closes the previous run and opens the next one
+    starts_r, starts_c = rows[:-1], cols[:-1]
+    ends_r, ends_c = rows[1:], cols[1:]
+    same_row = starts_r == ends_r
+    run_rows, run_start, run_end = starts_r[same_row], starts_c[same_row], ends_c[same_row]
+    run_label = labels[run_rows, run_start]
+    keep = run_label != 0
+    return run_rows[keep], run_start[keep], run_end[keep], run_label[keep]
+
+
+def connected_components(labels):
+    """
+    Label 8-connected regions of equal class in a 2-D integer mask.
+
+    Returns:
+        (runs, component): the run arrays from _row_runs and, for every run,
+        the id of the component it belongs to.
+    """
+    rows, starts, ends, classes = _row_runs(labels)
+    n = len(rows)
+    # plain lists: the sweep below indexes element by element
+    s_, e_, c_ = starts.tolist(), ends.tolist(), classes.tolist()
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # runs are ordered by row; sweep pairs of consecutive rows
+    row_bounds = np.searchsorted(rows, np.arange(labels.shape[0] + 1)).tolist()
+    for r in range(1, labels.shape[0]):
+        p0, p1 = row_bounds[r - 1], row_bounds[r]
+        c0, c1 = row_bounds[r], row_bounds[r + 1]
+        if p0 == p1 or c0 == c1:
+            continue
+        j = p0
+        for i in range(c0, c1):
+            # skip previous-row runs that end before this one starts (8-connected)
+            while j < p1 and e_[j] < s_[i]:
+                j += 1
+            k = j
+            while k < p1 and s_[k] <= e_[i]:
+                if c_[k] == c_[i]:
+                    a, b = find(i), find(k)
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+                k += 1
+
+    component = np.array([find(i) for i in range(n)], dtype=int)
+    return (rows, starts, ends, classes), component
+
+
+def component_map(labels):
+    """
+    Per-pixel component ids of a label mask.
+
+    Returns:
+        (ndarray, ndarray): (H, W) ids, -1 for background, numbered 0..n-1
+        in raster order of the components' first pixels; and the class of
+        every id.
+    """
+    (rows, starts, ends, classes), component = connected_components(np.asarray(labels))
+    ids = np.full(np.shape(labels), -1, dtype=np.int64)
+    if not len(rows):
+        return ids, classes
+
+    _, index = np.unique(component, return_inverse=True)
+    comp_class = np.zeros(index.max() + 1, dtype=classes.dtype)
+    comp_class[index] = classes
+
+    # every pixel of every run, without a Python loop over the runs
+    lengths = ends - starts
+    run = np.repeat(np.arange(len(rows)), lengths)
+    offset = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    ids[rows[run], starts[run] + offset] = index[run]
+    return ids, comp_class
+
+
+# unit steps of the boundary edges: right, down, left, up (image y points down)
+_STEPS = np.array([(1, 0), (0, 1), (-1, 0), (0, -1)])
+
+
+def _boundary_edges(ids):
+    """
+    Every pixel edge between a component and anything else, oriented
+    clockwise on screen (the component on the right).
+
+    Returns:
+        (comp, start, direction): component id, start vertex (x, y) and
+        _STEPS index of every edge.
+    """
+    padded = np.pad(ids, 1, constant_values=-1)
+    centre = padded[1:-1, 1:-1]
+    neighbours = (padded[:-2, 1:-1], padded[1:-1, 2:], padded[2:, 1:-1], padded[1:-1, :-2])
+    # where each side's edge starts, relative to the pixel's top-left corner
+    corners = ((0, 0), (1, 0), (1, 1), (0, 1))
+
+    comps, starts, dirs = [], [], []
+    for direction, (neighbour, (dx, dy)) in enumerate(zip(neighbours, corners)):
+        r, c = np.nonzero((centre >= 0) & (neighbour != centre))
+        comps.append(centre[r, c])
+        starts.append(np.column_stack([c + dx, r + dy]))
+        dirs.append(np.full(len(r), direction))
+    return np.concatenate(comps), np.concatenate(starts), np.concatenate(dirs)
+
+
+def _outer_rings(ids):
+    """Closed (K, 2) outline, in pixel corners, of every component of `ids`."""
+    comp, start, dirs = _boundary_edges(ids)
+    if not len(comp):
+        return []
+    end = start + _STEPS[dirs]
+    width = ids.shape[1] + 1
+    start_key = comp * (width * (ids.shape[0] + 1)) + start[:, 1] * width + start[:, 0]
+    end_key = comp * (width * (ids.shape[0] + 1)) + end[:, 1] * width + end[:, 0]
+
+    # a vertex has two outgoing edges where pixels touch diagonally
+    outgoing = {}
+    for e, key in enumerate(start_key.tolist()):
+        outgoing.setdefault(key, []).append(e)
+
+    # the top edge of a component's first pixel (raster order) is on its outline
+    tops = np.flatnonzero(dirs == 0)
+    _, first = np.unique(comp[tops], return_index=True)
+
+    end_key, dirs_ = end_key.tolist(), dirs.tolist()
+    rings = []
+    for e0 in tops[first].tolist():
+        edges, e = [], e0
+        while True:
+            edges.append(e)
+            options = outgoing[end_key[e]]
+            if len(options) > 1:
+                # turn left: diagonal neighbours belong to the same outline
+                left = (dirs_[e] + 3) % 4
+                e = next(o for o in options if dirs_[o] == left)
+            else:
+                e = options[0]
+            if e == e0:
+                break
+        edges = np.array(edges)
+        # keep the corners only
+        turn = dirs[edges] != np.roll(dirs[edges], 1)
+        ring = start[edges[turn]].astype(float)
+        rings.append(np.vstack([ring, ring[:1]]))
+    return rings
+
+
+def mask_polygons(labels, min_area=1):
+    """
+    Outline every building (connected region of one class) of a label mask.
+
+    Args:
+        labels: 2-D integer array, 0 = background, other values = class ids.
+        min_area: Regions smaller than this many pixels are dropped.
+
+    Returns:
+        list[dict]: {'class': id, 'area_px': n, 'ring': (K, 2) pixel ring},
+                    the ring following the region's outer pixel edges
+                    (holes are not traced).
+    """
+    ids, comp_class = component_map(labels)
+    if not len(comp_class):
+        return []
+    areas = np.bincount(ids[ids >= 0], minlength=len(comp_class))
+    return [{'class': int(cls), 'area_px': int(area), 'ring': ring}
+            for cls, area, ring in zip(comp_class.tolist(), areas.tolist(), _outer_rings(ids))
+            if area >= min_area]
+
+
+def polygons_to_features(geo_params, polygons, class_names=None, properties=None):
+    """
+    GeoJSON Features of mask_polygons output; all vertices of all polygons
+    are transformed in one call.
+    """
+    if not polygons:
+        return []
+    class_names = class_names or {}
+    properties = properties or {}
+
+    rings = [p['ring'] for p in polygons]
+    lonlat = pixels_to_lonlat(geo_params, np.concatenate(rings))
+    bounds = np.cumsum([len(r) for r in rings])[:-1]
+    return [{'type': 'Feature',
+             'geometry': {'type': 'Polygon', 'coordinates': [ring.tolist()]},
+             'properties': {**properties,
+                            'class': class_names.get(poly['class'], poly['class']),
+                            'area_px': poly['area_px']}}
+            for poly, ring in zip(polygons, np.split(lonlat, bounds))]
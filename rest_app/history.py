@@ -0,0 +1,222 @@
+"""
+Read layer for execution history.
+
+Executions are read from Supabase with column projection and keyset
+pagination, and pages are kept in a small in-process LRU cache with a TTL.
+
+Only complete executions are cached: once the pipeline has spooled every
+detail row and the spool has sent them all to Supabase, an execution never
+changes, so every worker process can keep its pages. An execution still in
+progress is read from Supabase on every request (see execution_complete);
+both markers live in the shared database, so all processes agree.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from rest_app.config.supabase import iter_rows, select_page
+from rest_app.damage import AREA_COLUMNS, COST_COLUMNS, NUM_COLUMNS, DamageTable
+from rest_app.geo import IMAGE_SIZE, pixels_to_latlon
+from rest_app.models import OpenExecution, PendingWrite
+from rest_app.uploads import image_base
+
+HISTORY_CACHE_MAX_ENTRIES = int(os.getenv('HISTORY_CACHE_MAX_ENTRIES', '256'))
+HISTORY_CACHE_TTL         = int(os.getenv('HISTORY_CACHE_TTL', '300'))
+HISTORY_PAGE_SIZE         = int(os.getenv('HISTORY_PAGE_SIZE', '50'))
+
+HEADER_COLUMNS = 'id,upload_time'
+# what a history list needs: no mask names, no geotransform
+DETAIL_SUMMARY_COLUMNS = ','.join(
+    ['id', 'header_id', 'pre_image_name', 'post_image_name', 'pre_image_url', 'post_image_url']
+    + list(NUM_COLUMNS) + list(AREA_COLUMNS) + list(COST_COLUMNS))
+
+# what the batch map needs: the geotransform and per-tile totals, no URLs
+MAP_COLUMNS = ','.join(['id', 'pre_image_name', 'geo_params'] + list(NUM_COLUMNS)
+                       + list(COST_COLUMNS))
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries, self.ttl = max_entries, ttl
+        self.hits = self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (found, value)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._data.pop(key, None)
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, predicate):
+        """Drop every entry whose key matches `predicate`; returns how many."""
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._data)}
+
+
+_cache = TTLCache(HISTORY_CACHE_MAX_ENTRIES, HISTORY_CACHE_TTL)
+
+
+def _page(rows, limit, key='id'):
+    return {'rows': rows, 'next': rows[-1][key] if len(rows) == limit else None}
+
+
+def list_executions(after=None, limit=None):
+    """
+    One page of execution headers, newest first.
+
+    Args:
+        after: `next` value of the previous page (None for the first page).
+        limit: Page size (defaults to HISTORY_PAGE_SIZE).
+
+    Returns:
+        dict: {'rows': [...], 'next': key of the following page or None}.
+    """
+    limit = limit or HISTORY_PAGE_SIZE
+    # the first page grows with every new execution; older pages never change
+    key = ('headers', after, limit)
+    if after is not None:
+        found, page = _cache.get(key)
+        if found:
+            return page
+
+    page = _page(select_page('execution_headers', columns=HEADER_COLUMNS,
+                             after=after, limit=limit, desc=True), limit)
+    if after is not None:
+        _cache.set(key, page)
+    return page
+
+
+def execution_complete(header_id):
+    """
+    True once every detail row of the execution is in Supabase: the pipeline
+    has closed it (rest_app.writes.close_execution) and none of its rows are
+    left in the spool. Executions the pipeline never marked (older ones)
+    count as complete.
+    """
+    header_id = str(header_id)
+    return not (OpenExecution.objects.filter(header_id=header_id).exists()
+                or PendingWrite.objects.filter(header_id=header_id).exists())
+
+
+def execution_details(header_id, columns=DETAIL_SUMMARY_COLUMNS, after=None, limit=None):
+    """
+    One page of the detail rows of an execution, in insertion order.
+
+    Args:
+        header_id: The execution.
+        columns: PostgREST column list to fetch; must include `id`.
+        after / limit: Keyset pagination as for list_executions.
+
+    Returns:
+        dict: {'rows': [...], 'next': key of the following page or None}.
+    """
+    limit = limit or HISTORY_PAGE_SIZE
+    key = ('details', str(header_id), columns, after, limit)
+    found, page = _cache.get(key)
+    if found:
+        return page
+
+    # checked before the query: a complete execution can't change under it
+    complete = execution_complete(header_id)
+    page = _page(select_page('execution_details', {'header_id': header_id}, columns,
+                             after=after, limit=limit), limit)
+    if complete:
+        _cache.set(key, page)
+    return page
+
+
+def tile_markers(rows, image_size=IMAGE_SIZE):
+    """
+    Map markers of detail rows: centre and footprint ([lat, lon] points) of
+    every tile with a geotransform, with its building count and cost.
+
+    All tiles go through one vectorized transform.
+    """
+    rows = [row for row in rows if row.get('geo_params')]
+    if not rows:
+        return []
+    width, height = image_size
+    points = np.array([(width / 2, height / 2), (0, 0), (width, 0), (width, height), (0, height)])
+    params = np.asarray([row['geo_params'] for row in rows], dtype=float)
+    latlon = np.round(pixels_to_latlon(params, np.broadcast_to(points, (len(rows), 5, 2))), 6)
+    buildings, _, costs = DamageTable.from_rows(rows).image_totals()
+
+    return [{'id':        row.get('id'),
+             'name':      image_base(row['pre_image_name']),
+             'center':    tile[0],
+             'footprint': tile[1:],
+             'buildings': int(n),
+             'cost':      round(cost, 2)}
+            for row, tile, n, cost in zip(rows, latlon.tolist(), buildings.tolist(),
+                                          costs.tolist())]
+
+
+def execution_map(header_id):
+    """
+    Every tile of an execution as a map marker (see tile_markers), with the
+    execution's totals: {'tiles': [...], 'summary': {tiles, buildings, cost},
+    'complete': no more rows will arrive (see execution_complete)}.
+    """
+    key = ('details', str(header_id), 'map')
+    found, result = _cache.get(key)
+    if found:
+        return result
+
+    complete = execution_complete(header_id)
+    markers = tile_markers(iter_rows('execution_details', {'header_id': header_id},
+                                     columns=MAP_COLUMNS))
+    result = {'tiles': markers,
+              'summary': {'tiles':     len(markers),
+                          'buildings': sum(m['buildings'] for m in markers),
+                          'cost':      round(sum(m['cost'] for m in markers), 2)},
+              'complete': complete}
+    if complete:
+        _cache.set(key, result)
+    return result
+
+
+def invalidate_execution(header_id):
+    """
+    Forget every cached page of one execution's details in this process,
+    for rows added to an execution that was already complete.
+    """
+    return _cache.discard(lambda key: key[0] == 'details' and key[1] == str(header_id))
+
+
+def clear_history_cache():
+    _cache.clear()
+
+
+def history_cache_stats():
+    """Process-wide hit/miss counters and size of the history cache."""
+    return _cache.stats()
@@ -0,0 +1,241 @@
+"""
+Background inference jobs.
+
+`submit_inference_job` spools the uploaded files to a private directory,
+records an `InferenceJob` row in the local database and hands the batch to an
+in-process worker pool. Progress and results are written back to the row so
+any gunicorn worker can answer `/jobs/<id>/` polls, and every progress step is
+also stored as a `JobEvent`, which `/jobs/<id>/events/` sends to the
+browser as Server-Sent Events: streamed under ASGI, polled under WSGI.
+"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+from django.db import connection
+from django.utils import timezone
+
+from rest_app.models import InferenceJob, JobEvent, Report
+from rest_app.pipeline import run_inference_pipeline, PipelineError
+
+INFERENCE_JOB_WORKERS = int(os.getenv('INFERENCE_JOB_WORKERS', '2'))
+
+# How often an event stream checks for new events, how long it may stay
+# silent before a keep-alive comment, and how long one connection may last
+# (the browser reconnects and resumes from the last event it received)
+JOB_EVENTS_POLL_INTERVAL = float(os.getenv('JOB_EVENTS_POLL_INTERVAL', '0.5'))
+JOB_EVENTS_HEARTBEAT     = float(os.getenv('JOB_EVENTS_HEARTBEAT', '15'))
+JOB_EVENTS_MAX_SECONDS   = float(os.getenv('JOB_EVENTS_MAX_SECONDS', '300'))
+# Under WSGI: how long the browser waits before asking again
+JOB_EVENTS_RETRY         = float(os.getenv('JOB_EVENTS_RETRY', '2'))
+
+_executor = None
+
+
+def get_job_executor():
+    """Return the process-wide worker pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=INFERENCE_JOB_WORKERS,
+                                       thread_name_prefix='inference-job')
+    return _executor
+
+
+class SpooledFile(str):
+    """Path of a spooled upload that keeps the digest computed on arrival."""
+
+    def __new__(cls, path, digest=None):
+        spooled = super().__new__(cls, path)
+        # read by cache.file_digest, which then skips hashing the file again
+        spooled.digest = digest
+        return spooled
+
+
+def _spool_files(image_files):
+    """Copy the uploads to disk; Django discards them once the request ends."""
+    spool_dir = tempfile.mkdtemp(prefix='inference_job_')
+    image_map = {}
+    for f in image_files:
+        path = os.path.join(spool_dir, os.path.basename(f.name))
+        if hasattr(f, 'temporary_file_path'):
+            # already on disk: move it rather than copying it
+            shutil.move(f.temporary_file_path(), path)
+        else:
+            with open(path, 'wb') as out:
+                for chunk in f.chunks():
+                    out.write(chunk)
+        image_map[f.name] = SpooledFile(path, getattr(f, 'digest', None))
+    return spool_dir, image_map
+
+
+def submit_inference_job(image_files, json_data, base_names):
+    """
+    Queue a validated batch for background processing.
+
+    Returns:
+        InferenceJob: the newly created (queued) job.
+    """
+    spool_dir, image_map = _spool_files(image_files)
+    job = InferenceJob.objects.create(num_pairs=len(base_names))
+    get_job_executor().submit(run_job, job.id, image_map, json_data,
+                              base_names, spool_dir)
+    return job
+
+
+def _update_job(job_id, **fields):
+    InferenceJob.objects.filter(pk=job_id).update(updated_at=timezone.now(), **fields)
+
+
+def _finish_job(job_id, kind, data, **fields):
+    # the event goes first: a stream that sees the final status has its event
+    JobEvent.objects.create(job_id=job_id, kind=kind, data=data)
+    _update_job(job_id, **fields)
+
+
+def run_job(job_id, image_map, json_data, base_names, spool_dir=None):
+    """Worker entry point: run the pipeline and record the outcome on the job."""
+    def progress(stage, done, total, **detail):
+        _update_job(job_id, stage=stage, done=done, total=total)
+        JobEvent.objects.create(job_id=job_id, kind=stage,
+                                data={'done': done, 'total': total, **detail})
+
+    try:
+        _update_job(job_id, status=InferenceJob.RUNNING)
+        result = run_inference_pipeline(image_map, json_data, base_names,
+                                        progress=progress)
+        _finish_job(
+            job_id, InferenceJob.SUCCEEDED,
+            {'header_id': result['header_id'], 'report_url': result['report_url']},
+            status=InferenceJob.SUCCEEDED,
+            result={
+                'header_id':          result['header_id'],
+                'report_url':         result['report_url'],
+                'cloudinary_mapping': result['cloudinary_mapping'],
+                'mask_urls':          result['mask_urls'],
+                'damage_severities':  result['damage_severities'],
+                'reference_coords':   result['reference_coords'],
+                'upload_cache':       result['upload_cache'],
+                'inference_cache':    result['inference_cache'],
+            })
+    except PipelineError as exc:
+        _finish_job(job_id, InferenceJob.FAILED, {'error': exc.message},
+                    status=InferenceJob.FAILED, error=exc.message)
+    except Exception as exc:
+        error = f'Unexpected error: {exc}'
+        _finish_job(job_id, InferenceJob.FAILED, {'error': error},
+                    status=InferenceJob.FAILED, error=error)
+    finally:
+        if spool_dir:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+        # worker threads own their DB connection; don't leak it
+        connection.close()
+
+
+# --------------------------------------------------------------------------- #
+# Server-Sent Events                                                          #
+# --------------------------------------------------------------------------- #
+def sse_frame(event, data, event_id=None):
+    """One Server-Sent Events message."""
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+class JobEventCursor:
+    """
+    Reads a job's events from the database, from just after event `after`.
+
+    Once the job has finished and every event was read, the cursor waits for
+    the background PDF report and emits a final `report` event (ready or
+    failed, with its URL), then an `end` event.
+    """
+
+    BATCH = 500
+
+    def __init__(self, job_id, after=0):
+        self.job_id, self.after = job_id, after
+        self.header_id = None
+        self.phase = 'events'
+
+    @property
+    def finished(self):
+        return self.phase == 'finished'
+
+    def poll(self):
+        """Return the SSE frames available now."""
+        frames = []
+        if self.phase == 'events':
+            # status first: events written before it changed are then visible
+            status, result = (InferenceJob.objects.filter(pk=self.job_id)
+                              .values_list('status', 'result').get())
+            events = list(JobEvent.objects.filter(job_id=self.job_id, id__gt=self.after)
+                          [:self.BATCH])
+            for event in events:
+                frames.append(sse_frame(event.kind, event.data, event.id))
+                self.after = event.id
+            if status in (InferenceJob.SUCCEEDED, InferenceJob.FAILED) \
+                    and len(events) < self.BATCH:
+                self.header_id = (result or {}).get('header_id')
+                self.phase = 'report' if self.header_id is not None else 'end'
+
+        if self.phase == 'report':
+            report = Report.objects.filter(header_id=str(self.header_id)).first()
+            if report is None or report.status != Report.PENDING:
+                if report is not None:
+                    frames.append(sse_frame('report', {'status': report.status,
+                                                       'url': report.url or None,
+                                                       'volumes': report.volumes,
+                                                       'error': report.error or None}))
+                self.phase = 'end'
+
+        if self.phase == 'end':
+            frames.append(sse_frame('end', {}))
+            self.phase = 'finished'
+        return frames
+
+
+def job_events_snapshot(job_id, after=0, retry=None):
+    """
+    The job's events available now, as one Server-Sent Events body.
+
+    Sync (WSGI) workers must not be held by a long-lived stream: they answer
+    each request at once and the `retry` field makes EventSource reconnect
+    after JOB_EVENTS_RETRY seconds, resuming from its Last-Event-ID, until
+    the `end` event.
+    """
+    retry = retry or JOB_EVENTS_RETRY
+    cursor = JobEventCursor(job_id, after)
+    return f'retry: {int(retry * 1000)}\n\n' + ''.join(cursor.poll())
+
+
+async def astream_job_events(job_id, after=0, poll_interval=None, heartbeat=None,
+                             max_seconds=None):
+    """
+    Yield a job's events as Server-Sent Events until it is over, or until
+    `max_seconds` have passed (the client then reconnects with Last-Event-ID).
+    Only served under ASGI: it sleeps on the event loop, not in a worker.
+    """
+    poll_interval = poll_interval or JOB_EVENTS_POLL_INTERVAL
+    heartbeat     = heartbeat or JOB_EVENTS_HEARTBEAT
+    deadline      = time.monotonic() + (max_seconds or JOB_EVENTS_MAX_SECONDS)
+    cursor = JobEventCursor(job_id, after)
+    poll = sync_to_async(cursor.poll)
+    yield f'retry: {int(poll_interval * 2000)}\n\n'
+    last_sent = time.monotonic()
+
+    while time.monotonic() < deadline:
+        frames = await poll()
+        if frames:
+            yield ''.join(frames)
+            last_sent = time.monotonic()
+        if cursor.finished:
+            return
+        if time.monotonic() - last_sent >= heartbeat:
+            yield ': keep-alive\n\n'
+            last_sent = time.monotonic()
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from rest_app.cache import INFERENCE_MODEL_VERSION, invalidate_inference_cache
+
+
+class Command(BaseCommand):
+    help = ("Delete memoized inference results that were produced by a model "
+            "version other than INFERENCE_MODEL_VERSION.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Delete every memoized result, including the current version.')
+
+    def handle(self, *args, **options):
+        deleted = invalidate_inference_cache(everything=options['all'])
+        self.stdout.write(f"Deleted {deleted} cached result(s); "
+                          f"current model version is '{INFERENCE_MODEL_VERSION}'.")
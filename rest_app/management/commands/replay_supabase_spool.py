@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_app.writes import flush_spool
+
+
+class Command(BaseCommand):
+    help = ("Send the rows spooled locally while Supabase was unreachable, "
+            "oldest first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retries', type=int, default=None,
+                            help='Retries per batch (defaults to SUPABASE_WRITE_RETRIES).')
+
+    def handle(self, *args, **options):
+        res = flush_spool(retries=options['retries'])
+        self.stdout.write(f"Wrote {res['written']} batch(es); {res['remaining']} still spooled.")
+        if res['error']:
+            raise CommandError(res['error'])
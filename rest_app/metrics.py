@@ -0,0 +1,280 @@
+"""
+Stage timings and Prometheus metrics.
+
+`timed(stage)` is both a context manager and a decorator (for plain and
+async functions). Every timed block is observed in the
+`app_stage_duration_seconds` histogram, and counted in
+`app_stage_errors_total` when it raises. `/metrics` serves everything in the
+Prometheus text format.
+
+With LOG_STAGE_TIMINGS=1, `StageTimingMiddleware` also logs one line per
+request with the time spent in each stage, and returns the same breakdown in
+a `Server-Timing` header. Only stages run by the request's own thread (or
+task) are part of the breakdown; work done on worker pools, e.g. the
+individual Cloudinary uploads, shows up in the histograms only.
+
+The registry is per process: scrape each worker, or run one worker per
+container.
+"""
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ContextDecorator
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+LOG_STAGE_TIMINGS = os.getenv('LOG_STAGE_TIMINGS', '0') == '1'
+
+# Upper bounds (seconds) of the latency histograms
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------------------------------------- #
+# Metric types                                                                #
+# --------------------------------------------------------------------------- #
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\')
+                                      .replace('"', r'\"').replace('\n', r'\n'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """Monotonic counter, one series per label value tuple."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, labelvalues)} {value}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label value tuple."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # labelvalues → [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def count(self, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            return sum(series[0]) if series else 0
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        names = self.labelnames + ('le',)
+        with self._lock:
+            for labelvalues, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += n
+                    lines.append(f'{self.name}_bucket{_labels(names, labelvalues + (bound,))} '
+                                 f'{cumulative}')
+                labels = _labels(self.labelnames, labelvalues)
+                lines.append(f'{self.name}_sum{labels} {total}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+STAGE_DURATION = Histogram('app_stage_duration_seconds',
+                           'Time spent in each stage of request handling.', ['stage'])
+STAGE_ERRORS = Counter('app_stage_errors_total',
+                       'Stages that ended with an exception.', ['stage'])
+REQUEST_DURATION = Histogram('app_request_duration_seconds',
+                             'Time to respond, by view and status code.', ['view', 'status'])
+
+
+# --------------------------------------------------------------------------- #
+# Timing                                                                      #
+# --------------------------------------------------------------------------- #
+# (stage, seconds) of the current request, when it is being traced
+_breakdown = contextvars.ContextVar('stage_breakdown', default=None)
+
+
+class timed(ContextDecorator):
+    """
+    Time a stage: `with timed('upload'): ...` or `@timed('pdf.render')`.
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def _recreate_cm(self):
+        # a fresh timer per decorated call, so calls can overlap
+        return type(self)(self.stage)
+
+    def __call__(self, func):
+        if not iscoroutinefunction(func):
+            return super().__call__(func)
+
+        @functools.wraps(func)
+        async def inner(*args, **kwargs):
+            with self._recreate_cm():
+                return await func(*args, **kwargs)
+        return markcoroutinefunction(inner)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        _record(self.stage, self.elapsed, failed=exc_type is not None)
+        return False
+
+
+def _record(stage, elapsed, failed=False):
+    STAGE_DURATION.observe(elapsed, stage)
+    if failed:
+        STAGE_ERRORS.inc(stage)
+    stages = _breakdown.get()
+    if stages is not None:
+        stages.append((stage, elapsed))
+
+
+def start_stage(request, stage):
+    """
+    Start timing `stage` of `request` by hand, for stages that don't fit in one
+    `with` block; end it with end_stage. StageTimingMiddleware ends the stages
+    still open when the request is done, as failed.
+    """
+    if not hasattr(request, '_open_stages'):
+        request._open_stages = {}
+    request._open_stages[stage] = time.perf_counter()
+
+
+def end_stage(request, stage, failed=False):
+    """Observe a stage started with start_stage; a no-op if it isn't open."""
+    start = getattr(request, '_open_stages', {}).pop(stage, None)
+    if start is not None:
+        _record(stage, time.perf_counter() - start, failed)
+
+
+def summarize(stages):
+    """Total seconds and call count per stage, in order of first completion."""
+    totals = {}
+    for stage, seconds in stages:
+        total, calls = totals.get(stage, (0.0, 0))
+        totals[stage] = (total + seconds, calls + 1)
+    return totals
+
+
+# --------------------------------------------------------------------------- #
+# Middleware and exposition                                                   #
+# --------------------------------------------------------------------------- #
+class StageTimingMiddleware:
+    """Record request latency, and the stage breakdown when LOG_STAGE_TIMINGS is on."""
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start, token = self._begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            stages = self._end(request, token)
+        return self._finish(request, response, start, stages)
+
+    async def __acall__(self, request):
+        start, token = self._begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stages = self._end(request, token)
+        return self._finish(request, response, start, stages)
+
+    def _begin(self):
+        return time.perf_counter(), (_breakdown.set([]) if LOG_STAGE_TIMINGS else None)
+
+    def _end(self, request, token):
+        # e.g. `receive` when the upload was cut off mid-parse
+        for stage in list(getattr(request, '_open_stages', {})):
+            end_stage(request, stage, failed=True)
+        if token is None:
+            return None
+        stages = _breakdown.get()
+        _breakdown.reset(token)
+        return stages
+
+    def _finish(self, request, response, start, stages):
+        elapsed = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        REQUEST_DURATION.observe(elapsed, view, response.status_code)
+
+        if stages is not None:
+            totals = summarize(stages)
+            parts = ' '.join([f'total={elapsed:.3f}s']
+                             + [f'{stage}={total:.3f}s' + (f'(x{calls})' if calls > 1 else '')
+                                for stage, (total, calls) in totals.items()])
+            logger.info("%s %s %s %s", request.method, request.path,
+                        response.status_code, parts)
+            response['Server-Timing'] = ', '.join(
+                [f'{stage};dur={total * 1000:.1f}' for stage, (total, _) in totals.items()]
+                + [f'total;dur={elapsed * 1000:.1f}'])
+        return response
+
+
+def _cache_counters():
+    # imported here: these modules are themselves instrumented with timed()
+    from rest_app.cache import upload_cache_stats, inference_cache_stats
+    from rest_app.history import history_cache_stats
+
+    lines = ['# HELP app_cache_requests_total Cache lookups by cache and result.',
+             '# TYPE app_cache_requests_total counter']
+    for cache, stats in (('upload', upload_cache_stats()),
+                         ('inference', inference_cache_stats()),
+                         ('history', history_cache_stats())):
+        for result in ('hits', 'misses'):
+            lines.append(f'app_cache_requests_total{_labels(("cache", "result"), (cache, result))} '
+                         f'{stats[result]}')
+    return lines
+
+
+def render_metrics():
+    """Every metric of this process in the Prometheus text exposition format."""
+    lines = []
+    for metric in (STAGE_DURATION, STAGE_ERRORS, REQUEST_DURATION):
+        lines += metric.expose()
+    lines += _cache_counters()
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadedAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64)),
+                ('folder', models.CharField(blank=True, max_length=255)),
+                ('secure_url', models.URLField(max_length=1024)),
+                ('public_id', models.CharField(max_length=512)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('digest', 'folder'), name='uploaded_asset_digest_folder')],
+            },
+        ),
+    ]
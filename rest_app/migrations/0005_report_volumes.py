@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_app', '0004_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='volumes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -1,3 +1,158 @@
+import uuid
+
 from django.db import models
 
 # Create your models here.
+
+
+class InferenceJob(models.Model):
+    """A batch queued for the background inference pipeline (see rest_app.jobs)."""
+
+    QUEUED    = 'queued'
+    RUNNING   = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED    = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED,    'Queued'),
+        (RUNNING,   'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED,    'Failed'),
+    ]
+
+    id         = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status     = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    stage      = models.CharField(max_length=32, blank=True)
+    done       = models.PositiveIntegerField(default=0)
+    total      = models.PositiveIntegerField(default=0)
+    num_pairs  = models.PositiveIntegerField(default=0)
+    result     = models.JSONField(null=True, blank=True)
+    error      = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
+
+    def as_dict(self):
+        return {
+            'job_id':     str(self.id),
+            'status':     self.status,
+            'stage':      self.stage,
+            'progress':   {'done': self.done, 'total': self.total},
+            'num_pairs':  self.num_pairs,
+            'result':     self.result,
+            'error':      self.error or None,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+        }
+
+
+class JobEvent(models.Model):
+    """One progress event of an InferenceJob, streamed by /jobs/<id>/events/."""
+
+    job        = models.ForeignKey(InferenceJob, on_delete=models.CASCADE, related_name='events')
+    kind       = models.CharField(max_length=32)
+    data       = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.job_id} #{self.id} {self.kind}"
+
+
+class UploadedAsset(models.Model):
+    """Content digest → Cloudinary asset, used to skip re-uploading identical files."""
+
+    digest       = models.CharField(max_length=64)
+    folder       = models.CharField(max_length=255, blank=True)
+    secure_url   = models.URLField(max_length=1024)
+    public_id    = models.CharField(max_length=512)
+    created_at   = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['digest', 'folder'], name='uploaded_asset_digest_folder'),
+        ]
+
+    def __str__(self):
+        return f"{self.digest[:12]} → {self.public_id}"
+
+
+class InferenceResult(models.Model):
+    """Memoized /predict output for one pre/post pair, keyed by content and model version."""
+
+    key           = models.CharField(max_length=64, unique=True)
+    model_version = models.CharField(max_length=64, db_index=True)
+    pre_mask_url  = models.URLField(max_length=1024)
+    post_mask_url = models.URLField(max_length=1024)
+    damage        = models.JSONField()
+    created_at    = models.DateTimeField(auto_now_add=True)
+    last_used_at  = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.key[:12]} ({self.model_version})"
+
+
+class Report(models.Model):
+    """State of the background PDF report of one execution (see rest_app.reports)."""
+
+    PENDING = 'pending'
+    READY   = 'ready'
+    FAILED  = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (READY,   'Ready'),
+        (FAILED,  'Failed'),
+    ]
+
+    header_id  = models.CharField(max_length=64, unique=True)
+    status     = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    url        = models.URLField(max_length=1024, blank=True)
+    volumes    = models.JSONField(default=list, blank=True)   # every volume URL when split
+    error      = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"report {self.header_id} ({self.status})"
+
+
+class PendingWrite(models.Model):
+    """A batch of rows spooled locally until Supabase accepts it (see rest_app.writes)."""
+
+    table_name = models.CharField(max_length=64)
+    rows       = models.JSONField()
+    # execution the rows belong to, when they all belong to one
+    header_id  = models.CharField(max_length=64, blank=True, db_index=True)
+    # flush that is sending the batch (see rest_app.writes.claim_spool)
+    claimed_by = models.CharField(max_length=64, blank=True, db_index=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts   = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{len(self.rows)} row(s) for {self.table_name}"
+
+
+class OpenExecution(models.Model):
+    """
+    An execution whose detail rows are still being produced. Its history
+    pages must not be cached until the marker is gone (see rest_app.history).
+    """
+
+    header_id  = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"execution {self.header_id} (open)"
@@ -0,0 +1,120 @@
+"""
+Streaming concatenation of PDF files.
+
+pypdf's PdfWriter keeps every appended page, with its fonts and images, in
+memory until the merged file is written: about twice the size of the result
+(benchmarks/bench_report_merge.py). `merge_pdf_parts` instead writes the
+objects of each part to the output as soon as that part is read, renumbered
+after those of the parts before it, so only one part is held at a time. The
+page tree, the catalog and the cross-reference table are written last.
+"""
+import gc
+
+from pypdf import PdfReader
+from pypdf.generic import (ArrayObject, DictionaryObject, IndirectObject, NameObject,
+                           NullObject, NumberObject)
+
+
+class _Output:
+    """A PDF body being written: object numbers handed out, and their offsets."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.offsets = []           # byte offset of object n at offsets[n - 1]
+
+    def reserve(self):
+        """A new object number, to be written later."""
+        self.offsets.append(None)
+        return len(self.offsets)
+
+    def write(self, number, obj):
+        self.offsets[number - 1] = self.stream.tell()
+        self.stream.write(f"{number} 0 obj\n".encode())
+        obj.write_to_stream(self.stream)
+        self.stream.write(b"\nendobj\n")
+
+    def write_trailer(self, root):
+        xref = self.stream.tell()
+        self.stream.write(f"xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n".encode())
+        for offset in self.offsets:
+            self.stream.write(f"{offset:010d} 00000 n \n".encode())
+        self.stream.write(f"trailer\n<< /Size {len(self.offsets) + 1} /Root {root} 0 R >>\n"
+                          f"startxref\n{xref}\n%%EOF\n".encode())
+
+
+def _ref(number):
+    return IndirectObject(number, 0, None)
+
+
+def _copy_part(reader, out, pages_number):
+    """
+    Write every object the pages of `reader` use to `out`.
+
+    Returns:
+        list: references to the copied pages, in order.
+    """
+    numbers, pending = {}, []
+
+    def renumber(indirect):
+        key = (indirect.idnum, indirect.generation)
+        if key not in numbers:
+            numbers[key] = out.reserve()
+            pending.append(indirect)
+        return _ref(numbers[key])
+
+    def remap(obj):
+        # the part's objects are discarded afterwards: rewrite them in place
+        if isinstance(obj, IndirectObject):
+            return renumber(obj)
+        if isinstance(obj, DictionaryObject):      # streams included
+            for key, value in list(obj.items()):
+                obj[key] = remap(value)
+        elif isinstance(obj, ArrayObject):
+            for i, value in enumerate(obj):
+                obj[i] = remap(value)
+        return obj
+
+    # inherited attributes are already copied into each page by pypdf
+    kids = [renumber(page.indirect_reference) for page in reader.pages]
+    page_keys = set(numbers)
+    while pending:
+        indirect = pending.pop()
+        obj = reader.get_object(indirect)
+        if obj is None:
+            obj = NullObject()
+        is_page = (indirect.idnum, indirect.generation) in page_keys
+        if is_page:
+            # the part's own page tree is replaced by the merged one
+            obj.pop(NameObject("/Parent"), None)
+        obj = remap(obj)
+        if is_page:
+            obj[NameObject("/Parent")] = _ref(pages_number)
+        out.write(numbers[(indirect.idnum, indirect.generation)], obj)
+    return kids
+
+
+def merge_pdf_parts(part_paths, dest_path):
+    """Concatenate PDF files into `dest_path`, holding one part in memory at a time."""
+    with open(dest_path, "wb") as stream:
+        stream.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        out = _Output(stream)
+        catalog, pages = out.reserve(), out.reserve()
+
+        kids = []
+        for path in part_paths:
+            # read from the file rather than a copy of it in memory
+            with open(path, "rb") as part:
+                kids += _copy_part(PdfReader(part), out, pages)
+            # a reader and its objects refer to each other: free them now
+            gc.collect()
+
+        out.write(pages, DictionaryObject({
+            NameObject("/Type"):  NameObject("/Pages"),
+            NameObject("/Kids"):  ArrayObject(kids),
+            NameObject("/Count"): NumberObject(len(kids)),
+        }))
+        out.write(catalog, DictionaryObject({
+            NameObject("/Type"):  NameObject("/Catalog"),
+            NameObject("/Pages"): _ref(pages),
+        }))
+        out.write_trailer(catalog)
@@ -0,0 +1,191 @@
+"""
+PDF rendering in worker processes.
+
+pisa.CreatePDF is pure Python and CPU bound. Run on a thread of a gunicorn
+worker it holds the GIL for seconds at a time, stalling every other request
+of that worker, and reports never use more than one core. Renders are
+submitted to a small ProcessPoolExecutor instead:
+
+- its workers import xhtml2pdf and load the report templates when they
+  start, and run at a lower CPU priority (PDF_RENDER_NICE) than the web
+  workers. The pool starts with the first report of each web worker, so a
+  service runs at most (web workers x PDF_RENDER_WORKERS) render processes,
+  and only in the workers that render; with PDF_RENDER_WARM_UP=1 the WSGI /
+  ASGI entry points start every worker's pool at start-up instead;
+- at most PDF_RENDER_MAX_PENDING renders are queued or running per process;
+  callers beyond that wait for a slot, up to PDF_RENDER_TIMEOUT;
+- a render still running after PDF_RENDER_TIMEOUT seconds is abandoned. The
+  only way to stop a worker process is to tear its pool down, so renders
+  sharing that pool fail too; the next render starts a fresh pool.
+
+PDF_RENDER_WORKERS=0 renders in the calling thread, as before.
+"""
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from django.template.loader import get_template
+from xhtml2pdf import pisa
+
+PDF_RENDER_WORKERS       = int(os.getenv('PDF_RENDER_WORKERS', str(min(2, os.cpu_count() or 1))))
+PDF_RENDER_MAX_PENDING   = int(os.getenv('PDF_RENDER_MAX_PENDING',
+                                         str(2 * max(PDF_RENDER_WORKERS, 1))))
+PDF_RENDER_TIMEOUT       = int(os.getenv('PDF_RENDER_TIMEOUT', '300'))
+PDF_RENDER_NICE          = int(os.getenv('PDF_RENDER_NICE', '10'))
+PDF_RENDER_WARM_UP       = os.getenv('PDF_RENDER_WARM_UP', '0') == '1'
+# 'spawn' by default: forking a threaded web worker can copy held locks
+PDF_RENDER_START_METHOD  = os.getenv('PDF_RENDER_START_METHOD', 'spawn')
+
+# templates the workers load up front
+PRELOADED_TEMPLATES = ('report.html',)
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(PDF_RENDER_MAX_PENDING, 1))
+
+
+class PdfRenderError(Exception):
+    """A render could not run or did not finish in time."""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+# --------------------------------------------------------------------------- #
+# Worker side                                                                 #
+# --------------------------------------------------------------------------- #
+def _init_worker(templates, nice):
+    """Process initializer: lower the priority, set Django up, load templates."""
+    if nice:
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+    import django
+    django.setup()
+    for name in templates:
+        get_template(name)
+    # the first CreatePDF call loads reportlab's fonts and parsers
+    pisa.CreatePDF('<p></p>', dest=io.BytesIO())
+
+
+def _ping():
+    return os.getpid()
+
+
+def render_template_to_file(template_name, context):
+    """Render a template to a temporary PDF; returns its path, or None if pisa failed."""
+    html = get_template(template_name).render(context)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        pisa_status = pisa.CreatePDF(html, dest=tmp)
+        pdf_path = tmp.name
+
+    if pisa_status.err:
+        os.remove(pdf_path)
+        return None
+    return pdf_path
+
+
+def render_template_to_bytes(template_name, context):
+    """
+    Render a template to PDF in memory.
+
+    Returns:
+        (bytes, str): the PDF, and the HTML when pisa reported errors (else None).
+    """
+    html = get_template(template_name).render(context)
+    out = io.BytesIO()
+    pisa_status = pisa.CreatePDF(html, dest=out)
+    return out.getvalue(), (html if pisa_status.err else None)
+
+
+# --------------------------------------------------------------------------- #
+# Pool                                                                        #
+# --------------------------------------------------------------------------- #
+def get_render_pool():
+    """Return this process's render pool, creating it on first use (and after a fork)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        # a pool inherited through fork (gunicorn --preload) has no live workers
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context(PDF_RENDER_START_METHOD),
+                initializer=_init_worker,
+                initargs=(PRELOADED_TEMPLATES, PDF_RENDER_NICE))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def warm_up_render_pool():
+    """Start every render worker now rather than on the first report; returns their futures."""
+    if PDF_RENDER_WORKERS <= 0:
+        return []
+    pool = get_render_pool()
+    return [pool.submit(_ping) for _ in range(PDF_RENDER_WORKERS)]
+
+
+def _discard_pool(pool):
+    """Stop the workers of `pool` (even mid-render) and forget it."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    # ProcessPoolExecutor can't cancel a running call: end its processes
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_render_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def run_render(fn, *args, timeout=None):
+    """
+    Call fn(*args) in the render pool and return its result.
+
+    `fn` must be a module-level function and its arguments picklable.
+
+    Raises:
+        PdfRenderError: no slot freed up, or the render didn't finish,
+                        within `timeout` (default PDF_RENDER_TIMEOUT) seconds,
+                        or its worker died.
+    """
+    if PDF_RENDER_WORKERS <= 0:
+        return fn(*args)
+
+    timeout = timeout or PDF_RENDER_TIMEOUT
+    deadline = time.monotonic() + timeout
+    if not _slots.acquire(timeout=timeout):
+        raise PdfRenderError(f'No PDF render slot became free within {timeout}s.')
+    try:
+        pool = get_render_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except RuntimeError:
+            # another render's timeout just discarded this pool (or it broke)
+            _discard_pool(pool)
+            pool = get_render_pool()
+            future = pool.submit(fn, *args)
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            _discard_pool(pool)
+            raise PdfRenderError(f'PDF rendering took longer than {timeout}s.')
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise PdfRenderError('The PDF render worker stopped unexpectedly.')
+    finally:
+        _slots.release()
@@ -0,0 +1,477 @@
+"""
+The inference pipeline shared by the synchronous `inference` view and the
+background job workers:
+
+    upload to Cloudinary → Flask /predict → Supabase → PDF report (background)
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+import json
+import os
+
+from django.urls import reverse
+
+from rest_app.cache import (upload_files_deduplicated, lookup_inference_results,
+                            pair_key, store_inference_results)
+from rest_app.config.inference import get_inference_client
+from rest_app.geo import batch_reference_coords
+from rest_app.metrics import timed
+from rest_app.reports import schedule_report
+from rest_app.uploads import release_upload
+from rest_app.damage import AREA_COLUMNS, COST_COLUMNS, NUM_COLUMNS, SEVERITY_ORDER
+from rest_app.utils import split_filename_and_extension
+from rest_app.validation import (batch_index, build_batch_index, check_geotransforms,
+                                 index_images)
+from rest_app.writes import (close_execution, insert_with_retry, open_execution, write_rows,
+                             SupabaseWriteError)
+
+# Image pairs per /predict call, calls in flight, and retries per failed chunk
+INFERENCE_CHUNK_SIZE        = int(os.getenv('INFERENCE_CHUNK_SIZE', '8'))
+INFERENCE_CHUNK_CONCURRENCY = int(os.getenv('INFERENCE_CHUNK_CONCURRENCY', '4'))
+INFERENCE_CHUNK_RETRIES     = int(os.getenv('INFERENCE_CHUNK_RETRIES', '1'))
+
+
+class PipelineError(Exception):
+    """
+    A pipeline stage failed; `status` is the HTTP status to report and
+    `errors` the per-file problems ({'file', 'error'}), if any.
+    """
+
+    def __init__(self, message, status=500, errors=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.errors = errors or []
+
+    def as_response(self):
+        """Body of the JSON error response."""
+        body = {'status': 'error', 'message': self.message}
+        if self.errors:
+            body['errors'] = self.errors
+        return body
+
+
+def _notify(progress, stage, done=0, total=0, **detail):
+    if progress:
+        progress(stage, done, total, **detail)
+
+
+def pair_summary(row):
+    """What a progress listener needs of a finished pair: images and totals."""
+    return {
+        'pre_image_name':  row['pre_image_name'],
+        'post_image_url':  row['post_image_url'],
+        'damage_mask_url': row['damage_mask_url'],
+        'buildings':       sum(row[col] for col in NUM_COLUMNS),
+        'total_cost':      sum(row[col] for col in COST_COLUMNS),
+    }
+
+
+def validate_inference_request(image_files, json_file, rejected=None):
+    """
+    Validate the uploaded image pairs and geotransform JSON.
+
+    Args:
+        rejected: Messages for uploads refused while streaming
+                  (see rest_app.uploads.rejected_uploads).
+
+    Returns:
+        (dict, BatchIndex): The parsed geotransform JSON and the index of
+                            the image pairs (base name → pre, post, geo).
+
+    Raises:
+        PipelineError: (status 400) describing the first failed check, with
+                       every problem of that check in `errors`.
+    """
+    if rejected:
+        raise PipelineError(' '.join(rejected), status=400)
+
+    pairs, errors = index_images([image.name for image in image_files])
+    if errors or not pairs:
+        raise PipelineError('Image pairs (pre/post) are incomplete or mismatched.',
+                            status=400, errors=errors)
+
+    if json_file is None:
+        raise PipelineError('Missing geotransform JSON file.', status=400)
+
+    try:
+        json_data = json.load(json_file)
+    except json.JSONDecodeError:
+        raise PipelineError('Invalid JSON format.', status=400)
+
+    errors = check_geotransforms(json_data, pairs)
+    if errors:
+        raise PipelineError('Invalid JSON structure or image name mismatch.',
+                            status=400, errors=errors)
+    return json_data, build_batch_index(pairs, json_data)
+
+
+def collect_uploads(image_map, index):
+    """Ordered (file name, file) list of every pre/post image of the batch."""
+    uploads = []
+    for img_name in index.image_names():
+        if img_name not in image_map:
+            raise PipelineError(f'Missing file: {img_name}', status=400)
+        uploads.append((img_name, image_map[img_name]))
+    return uploads
+
+
+def create_execution_header():
+    """Insert the `execution_headers` row of a new batch and return its id."""
+    try:
+        return insert_with_retry('execution_headers',
+                                 {'upload_time': datetime.utcnow().isoformat()}
+                                 )[0]['id']
+    except SupabaseWriteError as exc:
+        raise PipelineError(str(exc), status=503)
+
+
+def prediction_names(entry, pre_digest, post_digest):
+    """
+    The (pre, post) names a pair is sent to /predict under.
+
+    The model names its masks after the image names it is given, so they are
+    derived from the pair's content and the model version (the inference
+    cache key): memoized mask URLs can't be overwritten by a later batch that
+    reuses a file name for other content.
+    """
+    key = pair_key(pre_digest, post_digest)
+    return (f"{key}_pre_disaster{split_filename_and_extension(entry.pre)[1]}",
+            f"{key}_post_disaster{split_filename_and_extension(entry.post)[1]}")
+
+
+class BatchResults:
+    """Collects the per-pair results of a batch as inference chunks land."""
+
+    def __init__(self, header_id, index, upload_res, json_data):
+        self.header_id = header_id
+        self.index = index
+        self.base_names = list(index)
+        self.upload_res = upload_res
+        self.json_data = json_data
+        self.cloudinary_mapping = {img_name: res['secure_url']
+                                   for img_name, res in upload_res['results'].items()}
+        self.sent_names = {base: prediction_names(index[base], *digests)
+                           for base, digests in self.digests().items()}
+        # sent names → bases of the pairs with that content, first one first
+        self.copies = {}
+        for base, names in self.sent_names.items():
+            self.copies.setdefault(names, []).append(base)
+        self.detail_by_base, self.mask_urls, self.damage_severities = {}, {}, {}
+
+    def payload(self, base):
+        """The {pre_name: url, post_name: url} pair sent to /predict."""
+        entry = self.index[base]
+        pre_name, post_name = self.sent_names[base]
+        return {pre_name:  self.cloudinary_mapping[entry.pre],
+                post_name: self.cloudinary_mapping[entry.post]}
+
+    def to_predict(self, cached):
+        """
+        (base, payload) of every pair content not in `cached`, once: copies
+        of a pair within the batch share its prediction (see predicted_chunk).
+        """
+        return [(bases[0], self.payload(bases[0])) for bases in self.copies.values()
+                if bases[0] not in cached]
+
+    def base_by_pre(self):
+        """Pre-disaster name sent to /predict → base name."""
+        return {pre_name: bases[0] for (pre_name, _), bases in self.copies.items()}
+
+    def digests(self):
+        """base → (pre digest, post digest), the inference cache key."""
+        results = self.upload_res['results']
+        return {base: (results[entry.pre]['digest'], results[entry.post]['digest'])
+                for base, entry in self.index.items()}
+
+    def add(self, chunk_results):
+        """Record {base: (masks, damage)}; returns the detail rows to persist."""
+        rows = []
+        for base, (masks, damage) in chunk_results.items():
+            entry = self.index[base]
+            pre_img, post_img = entry.pre, entry.post
+
+            self.mask_urls[base] = {pre_img: masks[pre_img], post_img: masks[post_img]}
+            self.damage_severities[base] = damage
+            self.detail_by_base[base] = build_detail_entry(
+                self.header_id, pre_img, post_img, self.cloudinary_mapping,
+                masks[pre_img], masks[post_img], damage, self.json_data)
+            rows.append(self.detail_by_base[base])
+        return rows
+
+    def predicted_chunk(self, chunk_results):
+        """
+        Key the masks of merged /predict results by the uploaded file names,
+        adding an entry for every copy of each predicted pair.
+        """
+        renamed = {}
+        for base, (masks, damage) in chunk_results.items():
+            pre_name, post_name = self.sent_names[base]
+            for copy in self.copies[self.sent_names[base]]:
+                entry = self.index[copy]
+                renamed[copy] = ({entry.pre: masks[pre_name], entry.post: masks[post_name]},
+                                 damage)
+        return renamed
+
+    def cached_chunk(self, cached):
+        """
+        Turn lookup_inference_results hits into chunk results for add(), for
+        every copy of each cached pair.
+        """
+        chunk = {}
+        for base, (pre_mask, post_mask, damage) in cached.items():
+            for copy in self.copies[self.sent_names[base]]:
+                entry = self.index[copy]
+                chunk[copy] = ({entry.pre: pre_mask, entry.post: post_mask}, damage)
+        return chunk
+
+    def memo_entries(self, digests, chunk_results):
+        """Entries for store_inference_results from fresh chunk results."""
+        return {base: (*digests[base],
+                       masks[self.index[base].pre], masks[self.index[base].post],
+                       damage)
+                for base, (masks, damage) in chunk_results.items()}
+
+    def finish(self, cached):
+        """Schedule the report and return the pipeline result (see run_inference_pipeline)."""
+        base_names = self.base_names
+        detail_entries = [self.detail_by_base[base] for base in base_names]
+        schedule_report(self.header_id, detail_entries)
+        report_url = reverse('view_report', args=[self.header_id])
+
+        # corner / centre coordinates of every tile in one transform
+        reference_coords = dict(zip(base_names, batch_reference_coords(
+            [self.index[base].geo[0] for base in base_names])))
+
+        return {
+            'header_id':          self.header_id,
+            'detail_entries':     detail_entries,
+            'cloudinary_mapping': self.cloudinary_mapping,
+            'mask_urls':          {base: self.mask_urls[base] for base in base_names},
+            'damage_severities':  {base: self.damage_severities[base] for base in base_names},
+            'report_url':         report_url,
+            'reference_coords':   reference_coords,
+            'upload_cache':       {'hits': self.upload_res['hits'],
+                                   'misses': self.upload_res['misses']},
+            'inference_cache':    {'hits': len(cached),
+                                   'misses': len(base_names) - len(cached)},
+        }
+
+
+def run_inference_pipeline(image_map, json_data, base_names, progress=None):
+    """
+    Run every stage after validation for a batch of image pairs.
+
+    Args:
+        image_map (dict): File name → uploaded file (or path on disk).
+        json_data (dict): The validated geotransform JSON.
+        base_names (BatchIndex): The validated image pairs, as returned by
+            validate_inference_request (a list of base names also works).
+        progress (callable): Optional callback(stage, done, total, **detail);
+            `detail` names the uploaded `file`, or lists the `pairs`
+            (pair_summary per base name) whose inference just finished.
+
+    Returns:
+        dict: header_id, detail_entries, cloudinary_mapping, mask_urls,
+              damage_severities (per base name, in base_names order), report_url
+              (the report/view/ URL; the PDF itself is rendered in the background),
+              reference_coords (per base name, see geo.reference_coords) and the
+              upload_cache / inference_cache hit/miss counts for this batch.
+
+    Raises:
+        PipelineError: when a stage fails.
+    """
+    index = batch_index(base_names, json_data)
+    base_names = list(index)
+
+    # ------------------------------------------------------------------ #
+    # 1)  upload originals to Cloudinary (bounded concurrency)          #
+    # ------------------------------------------------------------------ #
+    uploads = collect_uploads(image_map, index)
+    _notify(progress, 'upload', 0, len(uploads))
+    uploaded = []
+
+    def _on_upload(img_name, res):
+        # sent (or already known): its temporary file can go
+        release_upload(image_map[img_name])
+        uploaded.append(img_name)
+        _notify(progress, 'upload', len(uploaded), len(uploads),
+                file=img_name, cached=res.get('cached', False))
+
+    with timed('upload'):
+        upload_res = upload_files_deduplicated(uploads, folder='inputs',
+                                               on_complete=_on_upload)
+    if not upload_res['success']:
+        raise PipelineError(f'Failed to upload {upload_res["failed"]}: '
+                            f'{upload_res["error"]}')
+
+    # ------------------------------------------------------------------ #
+    # 2)  create the execution header                                    #
+    # ------------------------------------------------------------------ #
+    header_id = create_execution_header()
+    open_execution(header_id)
+
+    # ------------------------------------------------------------------ #
+    # 3)  chunked inference; each chunk is persisted as soon as it lands #
+    # ------------------------------------------------------------------ #
+    batch = BatchResults(header_id, index, upload_res, json_data)
+    _notify(progress, 'inference', 0, len(base_names))
+
+    def _on_chunk(chunk_results):
+        rows = batch.add(chunk_results)
+        _notify(progress, 'inference', len(batch.detail_by_base), len(base_names),
+                pairs={base: pair_summary(batch.detail_by_base[base]) for base in chunk_results})
+        # spooled locally and sent to Supabase by the writer thread
+        write_rows('execution_details', rows)
+        _notify(progress, 'persist', len(batch.detail_by_base), len(base_names))
+
+    def _on_predicted(chunk_results):
+        chunk_results = batch.predicted_chunk(chunk_results)
+        _on_chunk(chunk_results)
+        store_inference_results(batch.memo_entries(digests, chunk_results))
+
+    try:
+        with timed('inference'):
+            # pairs seen before under the same model version skip /predict
+            digests = batch.digests()
+            cached = lookup_inference_results(digests)
+            if cached:
+                _on_chunk(batch.cached_chunk(cached))
+
+            to_predict = batch.to_predict(cached)
+            failed = predict_in_chunks(to_predict, _on_predicted, batch.base_by_pre())
+    finally:
+        # every row that will ever come is spooled, even when a chunk failed:
+        # history may cache the execution once they're sent
+        close_execution(header_id)
+    if failed:
+        raise PipelineError(f'Flask call failed for {len(failed)} chunk(s): '
+                            f'{failed[0][1]}')
+
+    # ------------------------------------------------------------------ #
+    # 4)  render the PDF report in the background                        #
+    # ------------------------------------------------------------------ #
+    _notify(progress, 'report')
+    with timed('finish'):
+        return batch.finish(cached)
+
+
+def merge_chunk_response(chunk, flask_data, base_by_pre):
+    """
+    Key a /predict response for `chunk` by base name.
+
+    `base_by_pre` maps the pre-disaster name sent for each pair to its base
+    name (BatchResults.base_by_pre).
+    """
+    # the response lists are only aligned with each other, so look the base
+    # name up from the image names used as keys of each mask dict
+    results = {}
+    for masks, damage in zip(flask_data['mask_image_urls'],
+                             flask_data['damage_severities']):
+        pre_img = next((k for k in masks if k in base_by_pre), None)
+        if pre_img is not None:
+            results[base_by_pre[pre_img]] = (masks, damage)
+
+    missing = [base for base, _ in chunk if base not in results]
+    if missing:
+        raise PipelineError(f'Flask response is missing {", ".join(missing)}')
+    return {base: results[base] for base, _ in chunk}
+
+
+def _predict_chunk(client, chunk, base_by_pre):
+    """POST one chunk of (base, pair) entries and key the answer by base name."""
+    return merge_chunk_response(chunk, client.predict([pair for _, pair in chunk]),
+                                base_by_pre)
+
+
+def predict_in_chunks(pairs, on_chunk, base_by_pre, chunk_size=None, concurrency=None,
+                      retries=None, client=None):
+    """
+    Call the inference API with `pairs` split into chunks, several at once.
+
+    Args:
+        pairs (list): (base name, {pre_name: url, post_name: url}) tuples.
+        on_chunk (callable): Called in the caller's thread with
+            {base: (mask_urls, damage)} as soon as each chunk succeeds.
+        base_by_pre (dict): pre_name → base name of every pair.
+        chunk_size / concurrency / retries: Override INFERENCE_CHUNK_SIZE,
+            INFERENCE_CHUNK_CONCURRENCY and INFERENCE_CHUNK_RETRIES.
+        client: InferenceClient to use (defaults to the shared one).
+
+    Returns:
+        list: (chunk, error message) for every chunk that still failed after
+              its retries; the other chunks have already been handed to on_chunk.
+    """
+    chunk_size  = chunk_size  or INFERENCE_CHUNK_SIZE
+    concurrency = concurrency or INFERENCE_CHUNK_CONCURRENCY
+    retries     = INFERENCE_CHUNK_RETRIES if retries is None else retries
+    client      = client or get_inference_client()
+
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    if not chunks:
+        return []
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks)),
+                            thread_name_prefix='inference-chunk') as pool:
+        attempts = {}
+        pending  = {}
+        for chunk in chunks:
+            future = pool.submit(_predict_chunk, client, chunk, base_by_pre)
+            pending[future], attempts[id(chunk)] = chunk, 1
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = pending.pop(future)
+                try:
+                    chunk_results = future.result()
+                except Exception as exc:
+                    # retry only the chunk that failed
+                    if attempts[id(chunk)] <= retries:
+                        attempts[id(chunk)] += 1
+                        pending[pool.submit(_predict_chunk, client, chunk, base_by_pre)] = chunk
+                    else:
+                        failed.append((chunk, getattr(exc, 'message', str(exc))))
+                    continue
+                on_chunk(chunk_results)
+    return failed
+
+
+def build_detail_entry(header_id, pre_img, post_img, cloudinary_mapping,
+                       pre_mask_url, post_mask_url, damage, json_data):
+    """Return the `execution_details` row for one image pair."""
+    # ---- area / cost summaries ----------------------------------- #
+    # classes absent from the breakdowns (no clusters of that type) are 0
+    area_br  = damage.get('area_breakdown',  {})
+    cost_br  = damage.get('cost_breakdown',  {})
+
+    # ---- geo‑transform params ------------------------------------ #
+    geo_key    = pre_img          # key inside the uploaded json
+    geo_params = (json_data.get(geo_key, []) or [None])[0]
+
+    return {
+        'header_id': header_id,
+
+        'pre_image_name':  pre_img,
+        'pre_image_url':   cloudinary_mapping[pre_img],
+        'post_image_name': post_img,
+        'post_image_url':  cloudinary_mapping[post_img],
+
+        'localisation_mask_name':
+            f"{split_filename_and_extension(pre_img)[0]}_mask"
+            f"{split_filename_and_extension(pre_img)[1]}",
+        'localisation_mask_url': pre_mask_url,
+
+        'damage_mask_name':
+            f"{split_filename_and_extension(post_img)[0]}_mask"
+            f"{split_filename_and_extension(post_img)[1]}",
+        'damage_mask_url': post_mask_url,
+
+        # --- counts, areas (pixels) and costs (USD) per class -------
+        **{col: damage.get(col, 0) for col in NUM_COLUMNS},
+        **{col: float(area_br.get(cat, 0)) for col, cat in zip(AREA_COLUMNS, SEVERITY_ORDER)},
+        **{col: float(cost_br.get(cat, 0)) for col, cat in zip(COST_COLUMNS, SEVERITY_ORDER)},
+
+        'geo_params': geo_params,
+    }
@@ -0,0 +1,149 @@
+"""
+Local copies of the images embedded in PDF reports.
+
+xhtml2pdf downloads every <img> one after another at full resolution. The
+report instead prefetches them concurrently, downscales them to the width the
+template displays, and keeps the results in a small on-disk LRU cache so the
+renderer only ever opens local files.
+"""
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image
+
+LOGO_URL = "https://res.cloudinary.com/promptvisionai/image/upload/v1744890678/logo_uh6wxn.png"
+
+REPORT_IMAGE_WIDTH          = 340    # matches `.image-row img` in report.html
+REPORT_IMAGE_CACHE_DIR      = os.getenv('REPORT_IMAGE_CACHE_DIR',
+                                        os.path.join(tempfile.gettempdir(), 'deployforce_report_images'))
+REPORT_IMAGE_CACHE_MAX_MB   = int(os.getenv('REPORT_IMAGE_CACHE_MAX_MB', '512'))
+REPORT_PREFETCH_CONCURRENCY = int(os.getenv('REPORT_PREFETCH_CONCURRENCY', '8'))
+REPORT_PREFETCH_TIMEOUT     = (5, 60)
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=REPORT_PREFETCH_CONCURRENCY)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def cached_image_path(url, width=None):
+    """Location of the cached copy of `url` resized to `width` (None = original size)."""
+    name = hashlib.sha256(f"{url}|{width}".encode()).hexdigest()
+    return os.path.join(REPORT_IMAGE_CACHE_DIR, f"{name}.png")
+
+
+def read_source(url):
+    """Bytes of the image at `url` (http(s), or file:// from the offline uploader)."""
+    if url.startswith('file://'):
+        # the offline upload backend (CLOUDINARY_BACKEND=local)
+        with open(url[len('file://'):], 'rb') as f:
+            return f.read()
+    resp = _get_session().get(url, timeout=REPORT_PREFETCH_TIMEOUT)
+    resp.raise_for_status()
+    return resp.content
+
+
+def fetch_image(url, width=None, resample=Image.Resampling.LANCZOS):
+    """
+    Download `url`, shrink it to at most `width` pixels wide and cache it.
+
+    Returns:
+        str: Path of the local PNG, or the original URL if it could not be
+             fetched (the renderer then falls back to downloading it itself).
+    """
+    path = cached_image_path(url, width)
+    if os.path.exists(path):
+        os.utime(path)      # mark as recently used
+        return path
+
+    try:
+        with Image.open(io.BytesIO(read_source(url))) as img:
+            img.load()
+            if width and img.width > width:
+                height = max(1, round(img.height * width / img.width))
+                img = img.resize((width, height), resample)
+            if img.mode not in ('RGB', 'RGBA', 'L', 'P'):
+                img = img.convert('RGBA')
+
+            buf = io.BytesIO()
+            img.save(buf, format='PNG', optimize=True)
+
+        # write then rename, so concurrent renders never see a partial file
+        os.makedirs(REPORT_IMAGE_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=REPORT_IMAGE_CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as out:
+            out.write(buf.getvalue())
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        logger.warning("Report image prefetch failed for %s: %s", url, e)
+        return url
+
+
+def prefetch_images(urls, width=REPORT_IMAGE_WIDTH, masks=()):
+    """
+    Fetch several images concurrently.
+
+    Args:
+        urls: Image URLs (duplicates are fetched once).
+        width: Target width in pixels.
+        masks: URLs of segmentation masks; these are resized with
+               nearest-neighbour sampling so class colours stay exact.
+
+    Returns:
+        dict: url → local path (or the url itself on failure).
+    """
+    unique = list(dict.fromkeys(urls))
+    masks = set(masks)
+    if not unique:
+        return {}
+
+    def _fetch(url):
+        resample = Image.Resampling.NEAREST if url in masks else Image.Resampling.LANCZOS
+        return fetch_image(url, width, resample)
+
+    with ThreadPoolExecutor(max_workers=min(REPORT_PREFETCH_CONCURRENCY, len(unique)),
+                            thread_name_prefix='report-prefetch') as pool:
+        paths = dict(zip(unique, pool.map(_fetch, unique)))
+
+    evict_image_cache()
+    return paths
+
+
+def evict_image_cache(max_bytes=None, directory=None, suffixes=('.png',)):
+    """Delete the least recently used cached images beyond the size cap."""
+    max_bytes = max_bytes if max_bytes is not None else REPORT_IMAGE_CACHE_MAX_MB * 1024 * 1024
+    try:
+        entries = [e for e in os.scandir(directory or REPORT_IMAGE_CACHE_DIR)
+                   if e.is_file() and e.name.endswith(suffixes)]
+    except FileNotFoundError:
+        return
+
+    stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries]
+    total = sum(size for _, size, _ in stats)
+    for _, size, path in sorted(stats):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
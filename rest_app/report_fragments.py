@@ -0,0 +1,47 @@
+"""
+Pre-rendered, constant parts of the PDF report.
+
+The stylesheet and the unit-cost table never change within a process, and
+the header (logo and title) only changes with the logo's local path. They
+are rendered from templates/report/ once and passed to report.html as safe
+strings, instead of being re-rendered for the cover and each part of every
+report. The generation time, which differs per report, stays in report.html.
+"""
+import functools
+
+from django.template.loader import render_to_string
+
+from rest_app.damage import COST_PER_PIXEL, SEVERITY_LABELS, SEVERITY_ORDER
+
+
+@functools.lru_cache(maxsize=None)
+def report_styles():
+    return render_to_string("report/styles.html")
+
+
+@functools.lru_cache(maxsize=None)
+def unit_cost_table():
+    unit_costs = [{"category": SEVERITY_LABELS[c], "unit_cost": COST_PER_PIXEL[c]}
+                  for c in SEVERITY_ORDER]
+    return render_to_string("report/unit_costs.html", {"unit_costs": unit_costs})
+
+
+# the logo's local path only changes when its cached copy is replaced
+@functools.lru_cache(maxsize=4)
+def report_header(logo_src):
+    return render_to_string("report/header.html", {"logo_src": logo_src})
+
+
+def report_fragments(logo_src):
+    """Template context entries holding the pre-rendered fragments."""
+    return {
+        "report_styles":   report_styles(),
+        "report_header":   report_header(logo_src),
+        "unit_cost_table": unit_cost_table(),
+    }
+
+
+def clear_report_fragments():
+    """Forget the rendered fragments, e.g. after changing the templates or costs."""
+    for fragment in (report_styles, unit_cost_table, report_header):
+        fragment.cache_clear()
@@ -0,0 +1,79 @@
+"""
+Background PDF reports.
+
+The pipeline calls `schedule_report` once the detail rows are saved and
+returns straight away; a small worker pool renders and uploads the PDF and
+records the outcome in the `Report` table, which `report/view/<header_id>`
+reads.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.utils import timezone
+
+from rest_app.models import Report
+from rest_app.pdf_render import PDF_RENDER_WORKERS
+from rest_app.utils import generate_pdf_report, generate_pdf_volumes, build_summary
+
+# Reports built at once; the threads mostly wait on the render processes
+# (rest_app.pdf_render), so one per render worker keeps every core busy
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', str(max(PDF_RENDER_WORKERS, 1))))
+# Images per PDF volume; 0 keeps every report in a single PDF
+REPORT_VOLUME_SIZE = int(os.getenv('REPORT_VOLUME_SIZE', '0'))
+
+_executor = None
+
+
+def get_report_executor():
+    """Return the process-wide report worker pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS,
+                                       thread_name_prefix='pdf-report')
+    return _executor
+
+
+def _update_report(header_id, **fields):
+    Report.objects.filter(header_id=header_id).update(updated_at=timezone.now(), **fields)
+
+
+def schedule_report(header_id, detail_entries):
+    """
+    Queue the PDF report of an execution.
+
+    Returns:
+        Future: completes once the report row is ready or failed.
+    """
+    Report.objects.update_or_create(header_id=str(header_id),
+                                    defaults={'status': Report.PENDING, 'url': '',
+                                              'volumes': [], 'error': ''})
+    return get_report_executor().submit(build_report, str(header_id), detail_entries)
+
+
+def build_report(header_id, detail_entries):
+    """Worker entry point: render, upload and record the report."""
+    try:
+        summary_stats, grand_area, grand_cost, total_clusters = build_summary(detail_entries)
+        summary = dict(summary_stats=summary_stats,
+                       grand_area=grand_area,
+                       grand_cost=grand_cost,
+                       total_clusters=total_clusters)
+
+        if REPORT_VOLUME_SIZE and len(detail_entries) > REPORT_VOLUME_SIZE:
+            volumes, err = generate_pdf_volumes(header_id, detail_entries,
+                                                volume_size=REPORT_VOLUME_SIZE, **summary)
+            report_url = volumes[0] if volumes else None
+        else:
+            report_url, err = generate_pdf_report(header_id, detail_entries, **summary)
+            volumes = [report_url] if report_url else []
+
+        if report_url:
+            _update_report(header_id, status=Report.READY, url=report_url, volumes=volumes)
+        else:
+            _update_report(header_id, status=Report.FAILED, error=err or 'Unknown error')
+    except Exception as exc:
+        _update_report(header_id, status=Report.FAILED, error=f'Unexpected error: {exc}')
+    finally:
+        # worker threads own their DB connection; don't leak it
+        connection.close()
@@ -3,4 +3,35 @@
 document.addEventListener("DOMContentLoaded", function () {
   console.log("DOM fully loaded and parsed");
   // Add any additional JavaScript functionality here
+
+  document.querySelectorAll("[data-report-status]").forEach(pollReport);
 });
+
+// Reports are rendered in the background: keep report links disabled until
+// report/view/<header_id>?format=json says the PDF is ready.
+function pollReport(link) {
+  const label = link.innerHTML;
+  const statusUrl = link.getAttribute("href") + "?format=json";
+
+  link.classList.add("disabled");
+  link.setAttribute("aria-disabled", "true");
+  link.textContent = "Preparing Report…";
+
+  const check = () => {
+    fetch(statusUrl)
+      .then((resp) => resp.json())
+      .then((data) => {
+        if (data.status === "ready") {
+          link.innerHTML = label;
+          link.classList.remove("disabled");
+          link.removeAttribute("aria-disabled");
+        } else if (data.status === "failed") {
+          link.textContent = "Report Failed";
+        } else {
+          setTimeout(check, 3000);
+        }
+      })
+      .catch(() => setTimeout(check, 5000));
+  };
+  check();
+}
@@ -0,0 +1,177 @@
+"""Local stand-ins for the external services, shared by the tests and the benchmarks."""
+import asyncio
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rest_app.config.offline import LocalUploader
+
+
+class StubInferenceService:
+    """A local stand-in for the Flask /predict endpoint."""
+
+    def __init__(self, fail_first_for=None, delay=0, mask_url='https://masks.test/{name}'):
+        """
+        `fail_first_for`: image names whose first request gets a 502.
+        `delay`: seconds every prediction takes.
+        `mask_url`: template of the returned mask URLs.
+        """
+        self.requests = []
+        self.connections = 0
+        self.fail_first_for = set(fail_first_for or ())
+        self.force_status = None    # answer every request with this status
+        self.delay = delay
+        self.mask_url = mask_url
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'   # keep-alive
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                images = body['images']
+                names = [name for pair in images for name in pair]
+                with stub._lock:
+                    stub.requests.append(names)
+                    fail = stub.fail_first_for & set(names)
+                    stub.fail_first_for -= fail
+                if fail or stub.force_status:
+                    self.send_response(stub.force_status or 502)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                time.sleep(stub.delay)
+                # answer in reverse order: the client must merge by name
+                masks, damages = [], []
+                for pair in reversed(images):
+                    masks.append({name: stub.mask_url.format(name=name) for name in pair})
+                    pre = next(name for name in pair if '_pre_disaster' in name)
+                    damages.append({'num_destroyed': len(pre),
+                                    'area_breakdown': {'destroyed': 10},
+                                    'cost_breakdown': {'destroyed': 7.5}})
+                payload = json.dumps({'mask_image_urls': masks,
+                                      'damage_severities': damages}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/predict"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubImageServer:
+    """Serves generated PNGs at /<width>x<height>.png and counts requests."""
+
+    def __init__(self):
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                from PIL import Image   # only the image tests need Pillow
+
+                stub.requests.append(self.path)
+                try:
+                    width, height = map(int, self.path.strip('/').split('.')[0].split('x'))
+                except ValueError:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                buf = io.BytesIO()
+                Image.new('RGB', (width, height), (200, 40, 40)).save(buf, format='PNG')
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(buf.tell()))
+                self.end_headers()
+                self.wfile.write(buf.getvalue())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def url(self, width, height):
+        return f"{self.base_url}/{width}x{height}.png"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SlowUploader(LocalUploader):
+    """LocalUploader that takes `delay` seconds per file, like a slow network."""
+
+    def __init__(self, root, delay):
+        super().__init__(root)
+        self.delay = delay
+
+    def upload(self, file, **options):
+        time.sleep(self.delay)
+        return super().upload(file, **options)
+
+
+async def asgi_post(application, path, data):
+    """
+    POST multipart `data` straight to an ASGI application.
+
+    Django's AsyncClient handles one request at a time, so concurrency tests
+    and benchmarks call the ASGI app directly instead.
+
+    Returns:
+        (status, body bytes)
+    """
+    from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+    body = encode_multipart(BOUNDARY, data)
+    csrf = 'benchmark0csrf0secret0token00000'   # same value as cookie and header
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'POST', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '', 'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+        'headers': [(b'host', b'testserver'),
+                    (b'content-type', MULTIPART_CONTENT.encode()),
+                    (b'content-length', str(len(body)).encode()),
+                    (b'cookie', f'csrftoken={csrf}'.encode()),
+                    (b'x-csrftoken', csrf.encode())],
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent, finished = [], asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Django treats an early disconnect as a cancelled request
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    try:
+        await application(scope, receive, send)
+    finally:
+        finished.set()
+    status = next(m['status'] for m in sent if m['type'] == 'http.response.start')
+    return status, b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
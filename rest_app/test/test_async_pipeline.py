@@ -0,0 +1,125 @@
+import asyncio
+import tempfile
+import time
+from unittest import mock
+
+from django.core.asgi import get_asgi_application
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_app import async_pipeline, cache, pipeline
+from rest_app.config import cloudinary as cloudinary_config
+from rest_app.config.inference import AsyncInferenceClient
+from rest_app.test.support import SlowUploader, StubInferenceService, asgi_post
+from rest_app.test.test_jobs import _batch
+from rest_app.test.test_pipeline import GEO
+
+
+class AsyncPipelineTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(cloudinary_config.set_uploader,
+                        cloudinary_config.set_uploader(SlowUploader(self.tmp.name, 0.1)))
+
+        self.service = StubInferenceService(delay=0.1)
+        self.addCleanup(self.service.close)
+        self.written = []
+
+        patches = [
+            mock.patch.object(pipeline, 'insert_with_retry', return_value=[{'id': 42}]),
+            mock.patch.object(pipeline, 'schedule_report'),
+            mock.patch.object(async_pipeline, 'write_rows',
+                              side_effect=lambda table, rows: self.written.append(rows)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _client(self):
+        return AsyncInferenceClient(url=self.service.url, max_retries=0)
+
+    async def test_batch_fans_out_uploads_and_chunks(self):
+        bases = [f"tile_{i:03d}" for i in range(8)]
+        image_map = {f"{b}_{kind}_disaster.png": SimpleUploadedFile('x.png', f"{b}{kind}".encode())
+                     for b in bases for kind in ('pre', 'post')}
+        json_data = {name: GEO for name in image_map}
+
+        client = self._client()
+        start = time.monotonic()
+        with mock.patch.object(async_pipeline, 'get_async_inference_client', return_value=client), \
+             mock.patch.multiple(async_pipeline, INFERENCE_CHUNK_SIZE=2,
+                                 CLOUDINARY_UPLOAD_CONCURRENCY=16):
+            result = await async_pipeline.run_inference_pipeline_async(image_map, json_data, bases)
+        elapsed = time.monotonic() - start
+        await client.close()
+
+        # 16 uploads and 4 chunks of 0.1 s each, but concurrently
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(len(self.service.requests), 4)
+        self.assertEqual(sorted(len(rows) for rows in self.written), [2, 2, 2, 2])
+        self.assertEqual([r['pre_image_name'] for r in result['detail_entries']],
+                         [f"{b}_pre_disaster.png" for b in bases])
+        self.assertEqual(result['upload_cache'], {'hits': 0, 'misses': 16})
+        self.assertTrue(result['cloudinary_mapping']['tile_003_post_disaster.png'].startswith('file://'))
+
+    async def test_failed_upload_fails_the_batch(self):
+        def broken(file, **options):
+            raise OSError('disk full')
+
+        cloudinary_config.set_uploader(mock.Mock(upload=broken))
+        before = cache.upload_cache_stats()
+        with self.assertRaisesRegex(pipeline.PipelineError, 'disk full'):
+            await async_pipeline.upload_files_deduplicated_async(
+                [('a_pre_disaster.png', SimpleUploadedFile('a.png', b'a'))], folder='inputs')
+        self.assertEqual(cache.upload_cache_stats()['misses'], before['misses'] + 1)
+
+    async def test_failed_upload_awaits_the_other_uploads(self):
+        finished = []
+
+        async def upload(file, **options):
+            if options['public_id'] == first:
+                return {'success': False, 'error': 'disk full'}
+            await asyncio.sleep(0.05)
+            finished.append(options['public_id'])
+            return {'success': True, 'secure_url': 'https://cdn.test/x', 'public_id': 'x'}
+
+        files = [(f'{c}_pre_disaster.png', SimpleUploadedFile(f'{c}.png', c.encode()))
+                 for c in 'abc']
+        first = cache.file_digest(files[0][1])
+        with mock.patch.object(async_pipeline, '_io', return_value=upload), \
+                mock.patch.object(async_pipeline, 'record_uploads'):
+            with self.assertRaisesRegex(pipeline.PipelineError, 'disk full'):
+                await async_pipeline.upload_files_deduplicated_async(files, folder='inputs')
+            running = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        # the two slow uploads were cancelled and awaited, not left running
+        self.assertEqual(finished, [])
+        self.assertFalse([t for t in running if not t.done()])
+
+    async def test_async_view_renders_the_single_pair_result(self):
+        client = self._client()
+        with mock.patch.object(async_pipeline, 'get_async_inference_client', return_value=client):
+            resp = await self.async_client.post(reverse('inference_async'), _batch())
+        await client.close()
+
+        self.assertEqual(resp.status_code, 200)
+        # the mask is shown through the thumbnail service
+        self.assertRegex(resp.content.decode(),
+                         r'url=https%3A%2F%2Fmasks.test%2F[0-9a-f]{64}_post_disaster.png')
+
+
+    async def test_concurrent_requests_share_one_event_loop(self):
+        client = self._client()
+        application = get_asgi_application()
+        with mock.patch.object(async_pipeline, 'get_async_inference_client', return_value=client):
+            start = time.monotonic()
+            responses = await asyncio.gather(*(
+                asgi_post(application, reverse('inference_async'), _batch(f"tile_{i}"))
+                for i in range(6)))
+            elapsed = time.monotonic() - start
+        await client.close()
+
+        self.assertEqual([status for status, _ in responses], [200] * 6)
+        # six requests of ~0.2 s each (uploads, then one prediction) overlap
+        self.assertLess(elapsed, 0.8)
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_app import cache
+from rest_app.config import cloudinary as cloudinary_config
+from rest_app.models import UploadedAsset
+
+
+def _fake_upload(file, **options):
+    return {
+        'secure_url': f"https://cdn.test/{options['public_id']}",
+        'public_id': f"{options['folder']}/{options['public_id']}",
+        'resource_type': 'image',
+        'created_at': '2025-01-01T00:00:00Z',
+    }
+
+
+class FileDigestTest(TestCase):
+    def test_paths_uploads_and_file_objects_hash_alike(self):
+        content = os.urandom(3 * cache.HASH_CHUNK_SIZE + 17)
+        expected = hashlib.sha256(content).hexdigest()
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            tmp.write(content)
+        self.addCleanup(os.remove, tmp.name)
+
+        upload = SimpleUploadedFile('tile_pre_disaster.png', content)
+        self.assertEqual(cache.file_digest(tmp.name), expected)
+        self.assertEqual(cache.file_digest(upload), expected)
+        # rewound so the upload still sends every byte
+        self.assertEqual(upload.read(), content)
+
+
+class UploadDeduplicationTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(cloudinary_config.cloudinary.uploader, 'upload',
+                                    side_effect=_fake_upload)
+        self.upload = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _files(self, *contents):
+        return [(f"tile_{i}_pre_disaster.png", SimpleUploadedFile('x.png', c))
+                for i, c in enumerate(contents)]
+
+    def test_known_content_skips_the_upload(self):
+        first = cache.upload_files_deduplicated(self._files(b'a', b'b'), folder='inputs')
+        self.assertEqual((first['hits'], first['misses']), (0, 2))
+
+        second = cache.upload_files_deduplicated(self._files(b'b', b'a'), folder='inputs')
+        self.assertEqual((second['hits'], second['misses']), (2, 0))
+        self.assertEqual(self.upload.call_count, 2)
+        self.assertEqual(second['results']['tile_0_pre_disaster.png']['secure_url'],
+                         f"https://cdn.test/{hashlib.sha256(b'b').hexdigest()}")
+        self.assertTrue(second['results']['tile_0_pre_disaster.png']['cached'])
+
+    def test_new_content_under_a_known_name_gets_its_own_asset(self):
+        first = cache.upload_files_deduplicated(self._files(b'a'), folder='inputs')
+        second = cache.upload_files_deduplicated(self._files(b'b'), folder='inputs')
+
+        # uploaded under the digest, so the first asset is not overwritten
+        self.assertEqual([call.kwargs['public_id'] for call in self.upload.call_args_list],
+                         [hashlib.sha256(c).hexdigest() for c in (b'a', b'b')])
+        self.assertNotEqual(first['results']['tile_0_pre_disaster.png']['secure_url'],
+                            second['results']['tile_0_pre_disaster.png']['secure_url'])
+        self.assertEqual(UploadedAsset.objects.count(), 2)
+
+    def test_duplicates_within_a_batch_upload_once(self):
+        res = cache.upload_files_deduplicated(self._files(b'same', b'same'), folder='inputs')
+
+        self.assertEqual(self.upload.call_count, 1)
+        urls = {r['secure_url'] for r in res['results'].values()}
+        self.assertEqual(len(urls), 1)
+        self.assertEqual(list(res['results']), ['tile_0_pre_disaster.png', 'tile_1_pre_disaster.png'])
+
+    def test_expired_entries_are_uploaded_again(self):
+        cache.upload_files_deduplicated(self._files(b'a'), folder='inputs')
+        UploadedAsset.objects.update(
+            created_at=timezone.now() - timedelta(seconds=cache.UPLOAD_CACHE_TTL + 1))
+
+        res = cache.upload_files_deduplicated(self._files(b'a'), folder='inputs')
+        self.assertEqual(res['misses'], 1)
+        self.assertEqual(UploadedAsset.objects.count(), 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        with mock.patch.object(cache, 'UPLOAD_CACHE_MAX_ENTRIES', 2):
+            cache.upload_files_deduplicated(self._files(b'a'), folder='inputs')
+            cache.upload_files_deduplicated(self._files(b'b'), folder='inputs')
+            cache.upload_files_deduplicated(self._files(b'a'), folder='inputs')   # touch a
+            cache.upload_files_deduplicated(self._files(b'c'), folder='inputs')
+
+        kept = set(UploadedAsset.objects.values_list('digest', flat=True))
+        self.assertEqual(kept, {hashlib.sha256(b'a').hexdigest(),
+                                hashlib.sha256(b'c').hexdigest()})
+
+    def test_counters_track_hits_and_misses(self):
+        before = cache.upload_cache_stats()
+        cache.upload_files_deduplicated(self._files(b'a'), folder='inputs')
+        cache.upload_files_deduplicated(self._files(b'a'), folder='inputs')
+        after = cache.upload_cache_stats()
+
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
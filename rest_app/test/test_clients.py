@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from rest_app.config import cloudinary as cloudinary_config
+from rest_app.config import supabase
+from rest_app.config.offline import InMemorySupabase, LocalUploader
+
+
+class LazySupabaseClientTest(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(supabase.set_supabase_client, supabase.set_supabase_client(None))
+
+    def test_client_is_created_once_per_process(self):
+        with mock.patch.object(supabase, 'SUPABASE_BACKEND', 'memory'):
+            first = supabase.get_supabase_client()
+            self.assertIs(supabase.get_supabase_client(), first)
+
+            # what the at-fork hook does in the child
+            supabase._reset_after_fork()
+            self.assertIsNot(supabase.get_supabase_client(), first)
+
+    def test_missing_credentials_fail_on_first_use_not_import(self):
+        with mock.patch.dict(os.environ, {'SUPABASE_HOST_URL': '', 'SUPABASE_API_SECRET': ''}):
+            with self.assertRaisesRegex(RuntimeError, 'SUPABASE_BACKEND=memory'):
+                supabase.get_supabase_client()
+
+    def test_helpers_use_the_swapped_client(self):
+        db = InMemorySupabase()
+        supabase.set_supabase_client(db)
+
+        header = supabase.insert_row('execution_headers', {'upload_time': 'now'})
+        supabase.insert_multiple_rows('execution_details', [{'header_id': header[0]['id']}] * 2)
+
+        self.assertEqual(len(supabase.get_rows_by_filters('execution_details',
+                                                          {'header_id': header[0]['id']})), 2)
+
+    def test_importing_the_urlconf_needs_no_credentials(self):
+        env = {k: v for k, v in os.environ.items() if not k.startswith(('SUPABASE', 'CLOUDINARY'))}
+        env['DJANGO_SETTINGS_MODULE'] = 'app_service.settings'
+        code = 'import django; django.setup(); import app_service.urls'
+        proc = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+                              capture_output=True, text=True, timeout=60)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+
+
+class LazyUploaderTest(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(cloudinary_config.set_uploader, cloudinary_config.set_uploader(None))
+
+    def test_cloudinary_is_configured_on_first_upload_only(self):
+        with mock.patch.object(cloudinary_config, 'initialize_cloudinary') as init:
+            cloudinary_config.get_uploader()
+            cloudinary_config.get_uploader()
+        init.assert_called_once()
+
+    def test_local_backend_stores_files_offline(self):
+        with tempfile.TemporaryDirectory() as root:
+            cloudinary_config.set_uploader(LocalUploader(root))
+            res = cloudinary_config.upload_file(SimpleUploadedFile('a.png', b'png-bytes'),
+                                                folder='inputs', public_id='a_pre_disaster')
+
+            self.assertTrue(res['success'])
+            path = res['secure_url'][len('file://'):]
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'png-bytes')
+            self.assertTrue(cloudinary_config.delete_file(res['public_id'])['success'])
+            self.assertFalse(os.path.exists(path))
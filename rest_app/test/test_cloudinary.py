@@ -0,0 +1,67 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from rest_app.config import cloudinary as cloudinary_config
+
+
+def _slow_uploader(delay, fail_on=None):
+    """Return a fake cloudinary.uploader.upload that sleeps `delay` seconds."""
+    calls = []
+    lock = threading.Lock()
+
+    def upload(file, **options):
+        with lock:
+            calls.append(options['public_id'])
+        time.sleep(delay)
+        if options['public_id'] == fail_on:
+            raise RuntimeError('boom')
+        return {
+            'secure_url': f"https://cdn.test/{options['public_id']}",
+            'public_id': options['public_id'],
+            'resource_type': 'image',
+            'format': 'png',
+            'created_at': '2025-01-01T00:00:00Z',
+        }
+
+    return upload, calls
+
+
+class UploadFilesConcurrentlyTest(SimpleTestCase):
+    def _files(self, n):
+        return [(f"tile_{i:03d}_pre_disaster.png", b"png") for i in range(n)]
+
+    def test_results_keep_input_order(self):
+        upload, _ = _slow_uploader(0.01)
+        files = self._files(12)
+        with mock.patch.object(cloudinary_config.cloudinary.uploader, 'upload', upload):
+            res = cloudinary_config.upload_files_concurrently(files, folder='inputs', max_workers=4)
+
+        self.assertTrue(res['success'])
+        self.assertEqual(list(res['results']), [name for name, _ in files])
+        self.assertEqual(res['results']['tile_005_pre_disaster.png']['secure_url'],
+                         'https://cdn.test/tile_005_pre_disaster.png')
+
+    def test_uploads_run_in_parallel(self):
+        upload, _ = _slow_uploader(0.1)
+        with mock.patch.object(cloudinary_config.cloudinary.uploader, 'upload', upload):
+            start = time.perf_counter()
+            res = cloudinary_config.upload_files_concurrently(self._files(8), max_workers=8)
+            elapsed = time.perf_counter() - start
+
+        self.assertTrue(res['success'])
+        # 8 serial uploads would take 0.8s
+        self.assertLess(elapsed, 0.4)
+
+    def test_first_failure_cancels_pending_uploads(self):
+        files = self._files(20)
+        upload, calls = _slow_uploader(0.05, fail_on=files[0][0])
+        with mock.patch.object(cloudinary_config.cloudinary.uploader, 'upload', upload):
+            res = cloudinary_config.upload_files_concurrently(files, max_workers=2)
+
+        self.assertFalse(res['success'])
+        self.assertEqual(res['failed'], files[0][0])
+        self.assertIn('boom', res['error'])
+        self.assertLess(len(calls), len(files))
@@ -0,0 +1,57 @@
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from rest_app import utils
+from rest_app.damage import DamageTable
+from rest_app.test.test_reports import ROW
+
+EMPTY = {'post_image_url': 'https://cdn.test/empty.png',
+         'damage_mask_url': 'https://cdn.test/empty_mask.png'}
+
+
+class DamageTableTest(SimpleTestCase):
+    def test_summary_totals_and_prices_the_areas(self):
+        summary, grand_area, grand_cost, buildings = utils.build_summary([ROW, ROW, EMPTY])
+
+        self.assertEqual(grand_area, 30.0)
+        self.assertEqual(buildings, 6)
+        self.assertAlmostEqual(grand_cost, 10 * 0.75)
+        self.assertEqual([s['category'] for s in summary],
+                         ['no_damage', 'minor_damage', 'major_damage', 'destroyed'])
+        self.assertEqual(summary[3], {'category': 'destroyed', 'count': 4, 'area': 10.0,
+                                      'unit_cost': 0.75, 'percentage': 100 * 10 / 30,
+                                      'total_cost': 7.5})
+
+    def test_empty_batches_have_zero_totals(self):
+        summary, grand_area, grand_cost, buildings = utils.build_summary([])
+
+        self.assertEqual((grand_area, grand_cost, buildings), (0.0, 0.0, 0))
+        self.assertEqual([s['percentage'] for s in summary], [0.0] * 4)
+
+    def test_per_image_breakdown_skips_empty_classes(self):
+        with mock.patch.object(utils, 'prefetch_images',
+                               side_effect=lambda urls, **kw: {u: u for u in urls}):
+            full, empty = utils._report_image_data([ROW, EMPTY])
+
+        self.assertEqual([b['category'] for b in full['breakdown']], ['No Damage', 'Destroyed'])
+        self.assertEqual(full['breakdown'][1], {'category': 'Destroyed', 'count': 2, 'area': 5.0,
+                                                'total_cost': 3.75, 'percentage': 100 * 5 / 15})
+        self.assertEqual(full['totals'], {'count': 3, 'area': 15.0, 'cost': 3.75})
+        self.assertEqual((empty['breakdown'], empty['totals']),
+                         ([], {'count': 0, 'area': 0.0, 'cost': 0.0}))
+
+    def test_group_totals_sum_images_per_execution(self):
+        rng = np.random.default_rng(0)
+        n = 100_000
+        table = DamageTable(rng.integers(0, 5, (n, 4)).astype(float),
+                            rng.random((n, 4)) * 100, rng.random((n, 4)) * 50)
+        labels = rng.integers(0, 200, n)
+
+        keys, totals = table.group_totals(labels)
+
+        self.assertEqual(len(keys), 200)
+        self.assertEqual(len(totals), 200)
+        np.testing.assert_allclose(totals.areas.sum(axis=0), table.areas.sum(axis=0))
+        np.testing.assert_allclose(totals.counts[7], table.counts[labels == keys[7]].sum(axis=0))
@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+from django.urls import reverse
+from PIL import Image
+
+from rest_app import exports
+from rest_app.config import cloudinary as cloudinary_config
+from rest_app.config import supabase
+from rest_app.config.offline import InMemorySupabase, LocalUploader
+from rest_app.test.test_reports import ROW
+
+
+class ExportTest(SimpleTestCase):
+    def setUp(self):
+        rows = [dict(ROW, id=i, header_id=9, pre_image_name=f"tile_{i}_pre_disaster.png",
+                     geo_params=[-90.0, 0.0001, 0.0, 30.0, 0.0, -0.0001])
+                for i in range(1, 8)]
+        rows.append(dict(ROW, id=100, header_id=10))
+        rows[0]['geo_params'] = None
+        self.db = InMemorySupabase({'execution_details': rows})
+        self.addCleanup(supabase.set_supabase_client, supabase.set_supabase_client(self.db))
+        patcher = mock.patch.object(supabase, 'SUPABASE_PAGE_SIZE', 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _body(self, response):
+        self.assertFalse(hasattr(response, 'content'))   # streamed, not buffered
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_streams_every_row_of_the_execution(self):
+        resp = self.client.get(reverse('export_csv', args=[9]))
+
+        self.assertEqual(resp['Content-Type'], 'text/csv')
+        records = list(csv.DictReader(io.StringIO(self._body(resp))))
+        self.assertEqual([r['pre_image_name'] for r in records],
+                         [f"tile_{i}_pre_disaster.png" for i in range(1, 8)])
+        self.assertEqual(records[0]['footprint'], '')
+        self.assertEqual(len(json.loads(records[1]['footprint'])), 5)
+        self.assertEqual(float(records[1]['total_cost']),
+                         sum(float(ROW[f'cost_{c}']) for c in
+                             ('no_damage', 'minor_damage', 'major_damage', 'destroyed')))
+        # 7 rows in three keyset pages of 3
+        self.assertEqual([q[1] for q in self.db.queries], [(0, 2)] * 3)
+
+    def test_geojson_is_one_feature_per_tile(self):
+        resp = self.client.get(reverse('export_geojson', args=[9]))
+
+        fc = json.loads(self._body(resp))
+        self.assertEqual(fc['type'], 'FeatureCollection')
+        self.assertEqual(len(fc['features']), 7)
+        self.assertIsNone(fc['features'][0]['geometry'])
+        ring = fc['features'][1]['geometry']['coordinates'][0]
+        self.assertEqual(ring[0], ring[-1])
+        self.assertEqual(fc['features'][1]['properties']['num_destroyed'], ROW['num_destroyed'])
+
+
+class BuildingExportTest(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        uploader = LocalUploader(os.path.join(tmp.name, 'uploads'))
+        self.addCleanup(cloudinary_config.set_uploader, cloudinary_config.set_uploader(uploader))
+
+        mask = np.zeros((64, 64, 3), dtype=np.uint8)
+        mask[4:12, 4:12] = (255, 0, 0)          # destroyed
+        mask[20:30, 40:50] = (0, 250, 5)        # no_damage, slightly off-palette
+        mask[50, 50] = (255, 255, 0)            # speckle
+        buf = io.BytesIO()
+        Image.fromarray(mask).save(buf, format='PNG')
+        buf.seek(0)
+        url = uploader.upload(buf, public_id='mask.png')['secure_url']
+
+        geo_params = [-90.0, 0.0001, 0.0, 30.0, 0.0, -0.0001]
+        rows = [dict(ROW, id=1, header_id=9, damage_mask_url=url, geo_params=geo_params),
+                dict(ROW, id=2, header_id=9, damage_mask_url=url, geo_params=None),
+                dict(ROW, id=3, header_id=9, damage_mask_url='https://evil.test/m.png',
+                     geo_params=geo_params)]
+        self.db = InMemorySupabase({'execution_details': rows})
+        self.addCleanup(supabase.set_supabase_client, supabase.set_supabase_client(self.db))
+
+    def test_one_polygon_per_building_of_a_mask(self):
+        resp = self.client.get(reverse('export_buildings', args=[9]))
+
+        self.assertFalse(hasattr(resp, 'content'))
+        fc = json.loads(b''.join(resp.streaming_content))
+        self.assertEqual(fc['properties'], {'header_id': '9'})
+        by_class = {f['properties']['class']: f for f in fc['features']}
+        self.assertEqual(sorted(by_class), ['destroyed', 'no_damage'])
+        self.assertEqual(by_class['destroyed']['properties']['area_px'], 64)
+        ring = by_class['destroyed']['geometry']['coordinates'][0]
+        self.assertEqual(len(ring), 5)
+        np.testing.assert_allclose(ring[0], [-90.0 + 4 * 0.0001, 30.0 - 4 * 0.0001])
+
+    def test_single_channel_masks_hold_class_ids(self):
+        labels = np.array([[0, 1, 4], [2, 3, 0]], dtype=np.uint8)
+        np.testing.assert_array_equal(exports.mask_labels(Image.fromarray(labels)), labels)
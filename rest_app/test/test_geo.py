@@ -0,0 +1,109 @@
+import time
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from rest_app import geo
+from rest_app.utils import transform_five_reference_coords
+
+GEO = [-90.0, 0.0001, 0.00002, 30.0, -0.00003, -0.0001]
+
+
+def _scalar_lonlat(params, x, y):
+    lon0, pw, rx, lat0, ry, ph = params
+    return lon0 + x * pw + y * rx, lat0 + x * ry + y * ph
+
+
+class TransformTest(SimpleTestCase):
+    def test_matches_the_scalar_geotransform(self):
+        pts = np.array([(0, 0), (511, 0), (256, 256), (17, 400)])
+        out = geo.pixels_to_lonlat(GEO, pts)
+        for (x, y), (lon, lat) in zip(pts, out):
+            self.assertAlmostEqual(lon, _scalar_lonlat(GEO, x, y)[0], places=12)
+            self.assertAlmostEqual(lat, _scalar_lonlat(GEO, x, y)[1], places=12)
+
+    def test_stacked_transforms_agree_with_single_ones(self):
+        stack = [GEO, [10.0, 0.5, 0.0, -5.0, 0.0, -0.5]]
+        coords = geo.batch_reference_coords(stack)
+        self.assertEqual(coords, [geo.reference_coords(p) for p in stack])
+
+    def test_legacy_helper_keeps_its_output(self):
+        coords = transform_five_reference_coords((512, 512), {'a_pre_disaster.png': [GEO, 'EPSG:4326']})
+        lon, lat = _scalar_lonlat(GEO, 256, 256)
+        self.assertEqual(set(coords), {'top_left', 'top_right', 'center',
+                                       'bottom_left', 'bottom_right'})
+        self.assertAlmostEqual(coords['center'][0], lat)
+        self.assertAlmostEqual(coords['center'][1], lon)
+
+    def test_footprint_is_a_closed_ring(self):
+        ring = geo.tile_footprint(GEO, (4, 2))
+        self.assertEqual(len(ring), 5)
+        self.assertEqual(ring[0], ring[-1])
+        self.assertAlmostEqual(ring[2][0], _scalar_lonlat(GEO, 4, 2)[0])
+
+    def test_every_pixel_of_a_tile_stays_within_budget(self):
+        ys, xs = np.mgrid[0:geo.IMAGE_SIZE[1], 0:geo.IMAGE_SIZE[0]]
+        pixels = np.column_stack([xs.ravel(), ys.ravel()])
+
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            lonlat = geo.pixels_to_lonlat(GEO, pixels)
+            timings.append(time.perf_counter() - start)
+        # about 8 ms for the 262,144 pixels
+        self.assertLess(min(timings), 0.05)
+        np.testing.assert_allclose(lonlat[-1], _scalar_lonlat(GEO, 511, 511))
+
+
+class PolygonTest(SimpleTestCase):
+    def setUp(self):
+        self.labels = np.zeros((8, 8), dtype=np.int64)
+        self.labels[1:3, 1:4] = 2
+        self.labels[3, 4] = 2          # touches the block diagonally only
+        self.labels[6, 6] = 1
+
+    def test_components_are_eight_connected_regions_of_one_class(self):
+        ids, comp_class = geo.component_map(self.labels)
+        self.assertEqual(sorted(comp_class.tolist()), [1, 2])
+        self.assertEqual(ids[3, 4], ids[1, 1])
+        self.assertEqual(ids[0, 0], -1)
+
+    def test_rings_follow_the_pixel_edges(self):
+        polygons = geo.mask_polygons(self.labels)
+
+        by_class = {p['class']: p for p in polygons}
+        self.assertEqual(by_class[1]['ring'].tolist(), [[6, 6], [7, 6], [7, 7], [6, 7], [6, 6]])
+        self.assertEqual(by_class[2]['area_px'], 7)
+        self.assertEqual(by_class[2]['ring'].tolist(),
+                         [[1, 1], [4, 1], [4, 3], [5, 3], [5, 4], [4, 4], [4, 3], [1, 3], [1, 1]])
+
+    def test_small_regions_are_dropped(self):
+        self.assertEqual([p['class'] for p in geo.mask_polygons(self.labels, min_area=2)], [2])
+
+    def test_features_carry_the_class_and_lonlat_ring(self):
+        features = geo.polygons_to_features(GEO, geo.mask_polygons(self.labels),
+                                            {1: 'no_damage', 2: 'minor_damage'}, {'tile': 't'})
+
+        feature = next(f for f in features if f['properties']['class'] == 'no_damage')
+        ring = feature['geometry']['coordinates'][0]
+        self.assertEqual(feature['geometry']['type'], 'Polygon')
+        self.assertEqual(feature['properties']['tile'], 't')
+        self.assertEqual(ring[0], ring[-1])
+        np.testing.assert_allclose(ring[2], _scalar_lonlat(GEO, 7, 7))
+
+    def test_a_tile_of_buildings_stays_within_budget(self):
+        rng = np.random.default_rng(0)
+        labels = np.zeros((geo.IMAGE_SIZE[1], geo.IMAGE_SIZE[0]), dtype=np.int64)
+        for x, y, w, h, cls in zip(*(rng.integers(0, 500, 300) for _ in range(2)),
+                                   *(rng.integers(3, 12, 300) for _ in range(2)),
+                                   rng.integers(1, 5, 300)):
+            labels[y:y + h, x:x + w] = cls
+
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            features = geo.polygons_to_features(GEO, geo.mask_polygons(labels))
+            timings.append(time.perf_counter() - start)
+        # about 35 ms for the ~290 buildings
+        self.assertLess(min(timings), 0.25)
+        self.assertGreater(len(features), 250)
@@ -0,0 +1,141 @@
+from unittest import mock
+
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from rest_app import history, writes
+from rest_app.config import supabase
+from rest_app.config.offline import InMemorySupabase
+from rest_app.validation import BatchIndex
+from rest_app.views.home_views import _render_result
+
+# 0.001° per pixel from (10°E, 20°N), north up
+GEO_PARAMS = [10.0, 0.001, 0.0, 20.0, 0.0, -0.001]
+
+
+class HistoryTest(TestCase):
+    def setUp(self):
+        self.db = InMemorySupabase({
+            'execution_headers': [{'id': i, 'upload_time': f"2025-01-{i:02d}"} for i in range(1, 6)],
+            'execution_details': [{'id': i, 'header_id': 1 + i % 2, 'geo_params': [0] * 6,
+                                   'pre_image_name': f"tile_{i}_pre_disaster.png",
+                                   'num_destroyed': i} for i in range(1, 8)],
+        })
+        self.addCleanup(supabase.set_supabase_client, supabase.set_supabase_client(self.db))
+        history.clear_history_cache()
+        self.addCleanup(history.clear_history_cache)
+
+    def test_details_are_projected_and_keyset_paginated(self):
+        first = history.execution_details(2, limit=2)
+        self.assertEqual([r['id'] for r in first['rows']], [1, 3])
+        self.assertNotIn('geo_params', first['rows'][0])
+
+        second = history.execution_details(2, after=first['next'], limit=2)
+        self.assertEqual([r['id'] for r in second['rows']], [5, 7])
+        last = history.execution_details(2, after=second['next'], limit=2)
+        self.assertEqual((last['rows'], last['next']), ([], None))
+
+    def test_repeated_pages_are_served_from_the_cache(self):
+        history.execution_details(1)
+        history.execution_details(1)
+        self.assertEqual(len(self.db.queries), 1)
+
+        with mock.patch.object(history._cache, 'ttl', 0):
+            history.execution_details(1, limit=3)
+            history.execution_details(1, limit=3)
+        self.assertEqual(len(self.db.queries), 3)
+
+    def test_flushed_detail_rows_invalidate_their_execution(self):
+        self.assertEqual(len(history.execution_details(1)['rows']), 3)
+        history.execution_details(2)
+
+        writes.spool_rows('execution_details', [{'header_id': 1, 'pre_image_name': 'new'}])
+        writes.flush_spool()
+
+        self.assertEqual(len(history.execution_details(1)['rows']), 4)
+        history.execution_details(2)   # untouched execution stays cached
+        self.assertEqual(len(self.db.queries), 3)
+
+    def test_executions_in_progress_are_never_cached(self):
+        writes.open_execution(1)
+        history.execution_details(1)
+        history.execution_details(1)
+        self.assertEqual(len(self.db.queries), 2)
+
+        # closed, but rows still spooled: not complete either
+        writes.close_execution(1)
+        writes.spool_rows('execution_details', [{'header_id': 1, 'geo_params': [0] * 6,
+                                                 'pre_image_name': 'late_pre_disaster.png'}])
+        history.execution_map(1)
+        history.execution_map(1)
+        self.assertEqual(len(self.db.queries), 4)
+
+        writes.flush_spool()
+        self.assertEqual(history.execution_map(1)['summary']['tiles'], 4)
+        history.execution_map(1)
+        self.assertEqual(len(self.db.queries), 5)     # complete: read once, then cached
+
+    def test_history_endpoint_pages_newest_first(self):
+        body = self.client.get(reverse('execution_history'), {'limit': 2}).json()
+        self.assertEqual([e['id'] for e in body['executions']], [5, 4])
+
+        body = self.client.get(reverse('execution_history'), {'after': body['next']}).json()
+        self.assertEqual([e['id'] for e in body['executions']], [3, 2, 1])
+        self.assertIsNone(body['next'])
+
+        resp = self.client.get(reverse('execution_history_details', args=[1]), {'limit': 'x'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class BatchResultsTest(TestCase):
+    def setUp(self):
+        self.db = InMemorySupabase({'execution_details': [
+            {'id': i, 'header_id': 3, 'pre_image_name': f"tile_{i}_pre_disaster.png",
+             'geo_params': GEO_PARAMS if i < 3 else None,
+             'num_no_damage': 1, 'num_destroyed': i, 'cost_destroyed': 1.234 * i}
+            for i in range(1, 4)]})
+        # a base that itself contains the suffix
+        self.db.tables['execution_details'][1]['pre_image_name'] = \
+            'site_pre_disaster.png_2_pre_disaster.png'
+        self.addCleanup(supabase.set_supabase_client, supabase.set_supabase_client(self.db))
+        history.clear_history_cache()
+        self.addCleanup(history.clear_history_cache)
+
+    def test_markers_place_every_tile_with_a_geotransform(self):
+        body = self.client.get(reverse('batch_results_map', args=[3])).json()
+
+        self.assertEqual(body['summary'], {'tiles': 2, 'buildings': 5, 'cost': 3.7})
+        self.assertTrue(body['complete'])
+        first = body['tiles'][0]
+        self.assertEqual((first['id'], first['name'], first['buildings'], first['cost']),
+                         (1, 'tile_1', 2, 1.23))
+        self.assertEqual(body['tiles'][1]['name'], 'site_pre_disaster.png_2')
+        self.assertEqual(first['center'], [19.744, 10.256])
+        self.assertEqual(first['footprint'], [[20.0, 10.0], [20.0, 10.512],
+                                              [19.488, 10.512], [19.488, 10.0]])
+
+    def test_map_is_cached_until_new_rows_land(self):
+        history.execution_map(3)
+        history.execution_map(3)
+        self.assertEqual(len(self.db.queries), 1)
+
+        writes.spool_rows('execution_details', [{'header_id': 3, 'geo_params': GEO_PARAMS,
+                                                 'pre_image_name': 'tile_9_pre_disaster.png'}])
+        writes.flush_spool()
+        self.assertEqual(history.execution_map(3)['summary']['tiles'], 3)
+
+    def test_page_loads_tiles_lazily(self):
+        resp = self.client.get(reverse('batch_results', args=[3]), {'pairs': 5})
+
+        self.assertContains(resp, 'data-expected="5"')
+        self.assertContains(resp, reverse('execution_history_details', args=[3]))
+        self.assertContains(resp, 'loading="lazy"')
+        self.assertEqual(self.db.queries, [])   # rows are fetched by the page's scripts
+
+    def test_multi_pair_batches_redirect_to_their_results(self):
+        index = BatchIndex.from_base_names(['a', 'b'], {})
+        resp = _render_result(RequestFactory().post('/inference/'), index,
+                              {'header_id': 3, 'cloudinary_mapping': {}, 'report_url': ''})
+
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(resp.url, reverse('batch_results', args=[3]) + '?pairs=2')
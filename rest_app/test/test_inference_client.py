@@ -0,0 +1,137 @@
+import socket
+import threading
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from django.test import SimpleTestCase
+
+from rest_app.config.inference import (CircuitBreaker, CircuitOpenError, InferenceClient,
+                                       InferenceError, get_async_inference_client)
+from rest_app.test.support import StubInferenceService
+
+PAIR = {'tile_pre_disaster.png': 'https://cdn.test/a', 'tile_post_disaster.png': 'https://cdn.test/b'}
+
+
+class InferenceClientTest(SimpleTestCase):
+    def setUp(self):
+        self.service = StubInferenceService()
+        self.addCleanup(self.service.close)
+
+    def _client(self, **kwargs):
+        client = InferenceClient(url=self.service.url, backoff=0, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_connections_are_kept_alive(self):
+        client = self._client()
+        for _ in range(5):
+            client.predict([PAIR])
+
+        self.assertEqual(len(self.service.requests), 5)
+        self.assertEqual(self.service.connections, 1)
+
+    def test_gateway_errors_are_retried(self):
+        self.service.fail_first_for = {'tile_pre_disaster.png'}
+        data = self._client(max_retries=2).predict([PAIR])
+
+        self.assertEqual(len(self.service.requests), 2)
+        self.assertIn('tile_pre_disaster.png', data['mask_image_urls'][0])
+
+    def test_other_errors_are_not_retried(self):
+        self.service.force_status = 500
+        with self.assertRaises(InferenceError) as ctx:
+            self._client(max_retries=3).predict([PAIR])
+
+        self.assertEqual(ctx.exception.status_code, 500)
+        self.assertEqual(len(self.service.requests), 1)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        self.service.force_status = 503
+        client = self._client(max_retries=0,
+                              breaker=CircuitBreaker(threshold=2, reset_timeout=60))
+        for _ in range(2):
+            with self.assertRaises(InferenceError):
+                client.predict([PAIR])
+
+        with self.assertRaises(CircuitOpenError):
+            client.predict([PAIR])
+        self.assertEqual(len(self.service.requests), 2)
+
+    def test_half_open_circuit_closes_on_success(self):
+        breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'half-open')
+
+        self._client(breaker=breaker).predict([PAIR])
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_half_open_circuit_lets_one_trial_through(self):
+        breaker = CircuitBreaker(threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        breaker.before_call()                       # the trial
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()                   # everyone else, meanwhile
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+
+
+class ConnectionFailureTest(SimpleTestCase):
+    def _listener(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.addCleanup(sock.close)
+        return sock, f"http://127.0.0.1:{sock.getsockname()[1]}/predict"
+
+    def _client(self, url):
+        client = InferenceClient(url=url, backoff=0, max_retries=2)
+        self.addCleanup(client.close)
+        return client
+
+    def test_refused_connections_are_retried(self):
+        sock, url = self._listener()
+        sock.close()                                # nothing listens: refused
+        client = self._client(url)
+        with mock.patch.object(client, '_sleep') as sleep, \
+                self.assertRaisesRegex(InferenceError, 'unreachable'):
+            client.predict([PAIR])
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_connection_dropped_after_sending_is_not_retried(self):
+        sock, url = self._listener()
+        sock.listen()
+        accepted = []
+
+        def drop():
+            # read the request, then hang up without answering
+            while True:
+                try:
+                    conn, _ = sock.accept()
+                except OSError:
+                    return
+                accepted.append(conn)
+                conn.recv(65536)
+                conn.close()
+        threading.Thread(target=drop, daemon=True).start()
+
+        with self.assertRaisesRegex(InferenceError, 'Inference call failed'):
+            self._client(url).predict([PAIR])
+        self.assertEqual(len(accepted), 1)
+
+
+class AsyncClientLifetimeTest(SimpleTestCase):
+    def test_each_loop_gets_a_client_closed_with_the_loop(self):
+        async def clients():
+            return get_async_inference_client(), get_async_inference_client()
+
+        # async_to_sync runs each call on a fresh event loop, as under WSGI
+        first, again = async_to_sync(clients)()
+        other, _ = async_to_sync(clients)()
+
+        self.assertIs(first, again)
+        self.assertIsNot(first, other)
+        self.assertTrue(first.session.is_closed)
+        self.assertTrue(other.session.is_closed)
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, TransactionTestCase
+from django.urls import reverse
+
+from rest_app import jobs
+from rest_app.cache import file_digest
+from rest_app.models import InferenceJob, JobEvent, Report
+from rest_app.pipeline import PipelineError
+
+GEO = [[-90.0, 0.0001, 0.0, 30.0, 0.0, -0.0001], "EPSG:4326"]
+
+
+def _batch(base="tile_001"):
+    files = [
+        SimpleUploadedFile(f"{base}_pre_disaster.png", b"\x89PNG\r\n\x1a\n pre"),
+        SimpleUploadedFile(f"{base}_post_disaster.png", b"\x89PNG\r\n\x1a\n post"),
+    ]
+    geo = json.dumps({f"{base}_pre_disaster.png": GEO,
+                      f"{base}_post_disaster.png": GEO}).encode()
+    return {'image_files': files,
+            'json_file': SimpleUploadedFile("geo.json", geo)}
+
+
+class InferenceJobTest(TransactionTestCase):
+    def _wait(self, job_id, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            body = self.client.get(reverse('job_status', args=[job_id])).json()
+            if body['status'] in (InferenceJob.SUCCEEDED, InferenceJob.FAILED):
+                return body
+            time.sleep(0.02)
+        self.fail('job did not finish')
+
+    def test_post_returns_job_id_and_status_reports_result(self):
+        seen = {}
+
+        def fake_pipeline(image_map, json_data, base_names, progress=None):
+            # the worker reads the spooled copies, not the request's uploads
+            seen['paths'] = {k: os.path.exists(v) for k, v in image_map.items()}
+            # with the digests hashed on arrival, so they aren't read again
+            seen['digests'] = {k: file_digest(v) for k, v in image_map.items()}
+            progress('upload', 2, 2)
+            return {'header_id': 7, 'report_url': 'https://cdn.test/7_report.pdf',
+                    'cloudinary_mapping': {}, 'mask_urls': {}, 'damage_severities': {},
+                    'reference_coords': {},
+                    'upload_cache': {'hits': 0, 'misses': 2},
+                    'inference_cache': {'hits': 0, 'misses': 1}}
+
+        with mock.patch('rest_app.jobs.run_inference_pipeline', fake_pipeline), \
+                mock.patch('rest_app.cache.open', side_effect=AssertionError, create=True):
+            resp = self.client.post(reverse('create_job'), _batch())
+            self.assertEqual(resp.status_code, 202)
+            body = self._wait(resp.json()['job_id'])
+
+        self.assertEqual(body['status'], InferenceJob.SUCCEEDED)
+        self.assertEqual(body['result']['header_id'], 7)
+        self.assertEqual(body['progress'], {'done': 2, 'total': 2})
+        self.assertEqual(seen['paths'], {'tile_001_pre_disaster.png': True,
+                                         'tile_001_post_disaster.png': True})
+        self.assertEqual(seen['digests'], {
+            'tile_001_pre_disaster.png': hashlib.sha256(b"\x89PNG\r\n\x1a\n pre").hexdigest(),
+            'tile_001_post_disaster.png': hashlib.sha256(b"\x89PNG\r\n\x1a\n post").hexdigest()})
+
+    def test_pipeline_failure_is_reported(self):
+        def failing_pipeline(*args, **kwargs):
+            raise PipelineError('Flask prediction failed')
+
+        with mock.patch('rest_app.jobs.run_inference_pipeline', failing_pipeline):
+            resp = self.client.post(reverse('create_job'), _batch())
+            body = self._wait(resp.json()['job_id'])
+
+        self.assertEqual(body['status'], InferenceJob.FAILED)
+        self.assertEqual(body['error'], 'Flask prediction failed')
+
+    def test_invalid_batch_is_rejected_without_a_job(self):
+        batch = _batch()
+        batch['image_files'] = batch['image_files'][:1]
+        resp = self.client.post(reverse('create_job'), batch)
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(InferenceJob.objects.exists())
+
+
+def _events(resp):
+    """(id, event, data) of every message in an event stream."""
+    body = b''.join(resp.streaming_content) if resp.streaming else resp.content
+    events = []
+    for message in body.decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.splitlines()
+                      if line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields.get('id'), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def _follow(client, url, last_event_id=None):
+    """Reconnect to a WSGI event endpoint, as EventSource does, until `end`."""
+    events, deadline = [], time.monotonic() + 10
+    while not events or events[-1][1] != 'end':
+        if time.monotonic() > deadline:
+            raise AssertionError(f'no end event after {events}')
+        headers = {'HTTP_LAST_EVENT_ID': last_event_id} if last_event_id else {}
+        resp = client.get(url, **headers)
+        new = _events(resp)
+        events += new
+        last_event_id = next((i for i, _, _ in reversed(new) if i), last_event_id)
+        time.sleep(0.01)
+    return events
+
+
+class JobEventsTest(TransactionTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(jobs, 'JOB_EVENTS_POLL_INTERVAL', 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _run(self, pipeline):
+        # patched until the job is over: the worker looks the pipeline up late
+        patcher = mock.patch('rest_app.jobs.run_inference_pipeline', pipeline)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        resp = self.client.post(reverse('create_job'), _batch())
+        self.assertEqual(resp.status_code, 202)
+        return resp.json()
+
+    def test_stage_events_are_streamed_in_order(self):
+        Report.objects.create(header_id='7', status=Report.READY,
+                              url='https://cdn.test/7_report.pdf')
+        pair = {'pre_image_name': 'tile_001_pre_disaster.png', 'buildings': 3}
+
+        def fake_pipeline(image_map, json_data, base_names, progress=None):
+            progress('upload', 1, 2, file='tile_001_pre_disaster.png', cached=False)
+            progress('upload', 2, 2, file='tile_001_post_disaster.png', cached=False)
+            progress('inference', 1, 1, pairs={'tile_001': pair})
+            progress('persist', 1, 1)
+            return {'header_id': 7, 'report_url': 'https://cdn.test/7_report.pdf',
+                    'cloudinary_mapping': {}, 'mask_urls': {}, 'damage_severities': {},
+                    'reference_coords': {}, 'upload_cache': {}, 'inference_cache': {}}
+
+        job = self._run(fake_pipeline)
+        resp = self.client.get(job['events_url'])
+
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        self.assertEqual(resp['Cache-Control'], 'no-cache')
+        # WSGI: answered at once, EventSource polls again after `retry`
+        self.assertFalse(resp.streaming)
+        self.assertTrue(resp.content.startswith(b'retry: 2000\n\n'))
+        events = _follow(self.client, job['events_url'])
+        self.assertEqual([kind for _, kind, _ in events],
+                         ['upload', 'upload', 'inference', 'persist',
+                          InferenceJob.SUCCEEDED, 'report', 'end'])
+        self.assertEqual(events[1][2], {'done': 2, 'total': 2,
+                                        'file': 'tile_001_post_disaster.png', 'cached': False})
+        self.assertEqual(events[2][2]['pairs'], {'tile_001': pair})
+        self.assertEqual(events[4][2]['header_id'], 7)
+        self.assertEqual(events[5][2], {'status': Report.READY, 'url': 'https://cdn.test/7_report.pdf',
+                                        'volumes': [], 'error': None})
+
+        # a reconnecting client only gets what it missed
+        self.assertEqual([kind for _, kind, _ in _follow(self.client, job['events_url'],
+                                                         events[2][0])],
+                         ['persist', InferenceJob.SUCCEEDED, 'report', 'end'])
+
+    def test_failure_ends_the_stream(self):
+        def failing_pipeline(image_map, json_data, base_names, progress=None):
+            progress('upload', 2, 2, file='tile_001_post_disaster.png', cached=True)
+            raise PipelineError('Flask prediction failed')
+
+        job = self._run(failing_pipeline)
+        events = _follow(self.client, job['events_url'])
+
+        self.assertEqual([kind for _, kind, _ in events], ['upload', InferenceJob.FAILED, 'end'])
+        self.assertEqual(events[1][2], {'error': 'Flask prediction failed'})
+        self.assertEqual(JobEvent.objects.count(), 2)
+
+    def test_asgi_stream_is_asynchronous(self):
+        def failing_pipeline(image_map, json_data, base_names, progress=None):
+            raise PipelineError('Flask prediction failed')
+
+        job = self._run(failing_pipeline)
+
+        async def stream():
+            resp = await AsyncClient().get(job['events_url'])
+            self.assertTrue(resp.is_async)
+            return b''.join([chunk async for chunk in resp.streaming_content])
+
+        body = async_to_sync(stream)().decode()
+        self.assertIn('event: failed', body)
+        self.assertTrue(body.rstrip().endswith('event: end\ndata: {}'))
+
+
+class UploadPageTest(TransactionTestCase):
+    def test_job_links_are_reversed(self):
+        page = self.client.get(reverse('upload')).content.decode()
+
+        self.assertIn(f'data-results-url="{reverse("batch_results", args=["HEADER_ID"])}"', page)
+        self.assertIn(f'data-csv-url="{reverse("export_csv", args=["HEADER_ID"])}"', page)
+        self.assertNotIn('`/results/', page)
@@ -0,0 +1,83 @@
+import asyncio
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_app import metrics
+from rest_app.metrics import Histogram, STAGE_DURATION, STAGE_ERRORS, timed
+
+
+class TimedTest(SimpleTestCase):
+    def test_context_manager_and_decorators_observe_the_stage(self):
+        before = STAGE_DURATION.count('test.stage')
+
+        with timed('test.stage'):
+            pass
+
+        @timed('test.stage')
+        def work(x):
+            return x * 2
+
+        @timed('test.stage')
+        async def async_work(x):
+            await asyncio.sleep(0)
+            return x * 3
+
+        self.assertEqual(work(2), 4)
+        self.assertEqual(asyncio.run(async_work(2)), 6)
+        self.assertEqual(STAGE_DURATION.count('test.stage'), before + 3)
+
+    def test_failures_are_counted_and_reraised(self):
+        before = STAGE_ERRORS.value('test.failing')
+        with self.assertRaises(ValueError):
+            with timed('test.failing'):
+                raise ValueError('boom')
+        self.assertEqual(STAGE_ERRORS.value('test.failing'), before + 1)
+
+    def test_histogram_exposition_is_cumulative(self):
+        hist = Histogram('demo_seconds', 'Demo.', ['stage'], buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            hist.observe(value, 'a"b')
+
+        self.assertEqual(hist.expose(), [
+            '# HELP demo_seconds Demo.',
+            '# TYPE demo_seconds histogram',
+            'demo_seconds_bucket{stage="a\\"b",le="0.1"} 1',
+            'demo_seconds_bucket{stage="a\\"b",le="1"} 3',
+            'demo_seconds_bucket{stage="a\\"b",le="+Inf"} 4',
+            'demo_seconds_sum{stage="a\\"b"} 6.05',
+            'demo_seconds_count{stage="a\\"b"} 4',
+        ])
+
+
+class MetricsEndpointTest(TestCase):
+    def test_metrics_are_served_in_prometheus_format(self):
+        self.client.get(reverse('execution_history'), {'limit': 'x'})
+        resp = self.client.get(reverse('metrics'))
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = resp.content.decode()
+        self.assertIn('# TYPE app_stage_duration_seconds histogram', body)
+        self.assertIn('app_request_duration_seconds_count{view="execution_history",status="400"}',
+                      body)
+        self.assertIn('app_cache_requests_total{cache="upload",result="hits"}', body)
+
+    def test_stage_breakdown_is_logged_when_enabled(self):
+        form = {'image_files': [SimpleUploadedFile('a_pre_disaster.png', b'not a png')],
+                'json_file': SimpleUploadedFile('geo.json', b'{}')}
+        with mock.patch.object(metrics, 'LOG_STAGE_TIMINGS', True), \
+                self.assertLogs('rest_app.metrics', 'INFO') as logs:
+            resp = self.client.post(reverse('inference'), form)
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual([part.split(';')[0] for part in resp['Server-Timing'].split(', ')],
+                         ['receive', 'validate', 'total'])
+        self.assertRegex(logs.output[0],
+                         r'POST /inference/ 400 total=\S+s receive=\S+s validate=\S+s')
+
+    def test_no_breakdown_by_default(self):
+        resp = self.client.post(reverse('inference'), {})
+        self.assertNotIn('Server-Timing', resp)
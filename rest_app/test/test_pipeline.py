@@ -0,0 +1,159 @@
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from rest_app import cache, pipeline
+from rest_app.config.inference import InferenceClient
+from rest_app.models import OpenExecution
+from rest_app.test.support import StubInferenceService
+from rest_app.validation import PairEntry
+
+GEO = [[-90.0, 0.0001, 0.0, 30.0, 0.0, -0.0001], "EPSG:4326"]
+
+
+def _sent(base):
+    """Names the pair of `base` is sent to /predict under (see _uploaded)."""
+    return pipeline.prediction_names(
+        PairEntry(f"{base}_pre_disaster.png", f"{base}_post_disaster.png", None),
+        f"digest-of-{base}_pre_disaster.png", f"digest-of-{base}_post_disaster.png")
+
+
+def _uploaded(files, folder=None, on_complete=None):
+    return {'success': True, 'hits': 0, 'misses': len(files),
+            'results': {name: {'success': True, 'secure_url': f"https://cdn.test/{name}",
+                               'digest': f"digest-of-{name}"}
+                        for name, _ in files}}
+
+
+class ChunkedInferenceTest(TestCase):
+    def setUp(self):
+        self.bases = [f"tile_{i:03d}" for i in range(10)]
+        self.image_map = {f"{b}_{kind}_disaster.png": b"png"
+                          for b in self.bases for kind in ('pre', 'post')}
+        self.json_data = {name: GEO for name in self.image_map}
+        self.inserted = []
+
+        patches = [
+            mock.patch.object(pipeline, 'upload_files_deduplicated', _uploaded),
+            mock.patch.object(pipeline, 'insert_with_retry', return_value=[{'id': 42}]),
+            mock.patch.object(pipeline, 'write_rows',
+                              side_effect=lambda table, rows: self.inserted.append(rows)),
+            mock.patch.object(pipeline, 'schedule_report'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _run(self, service, **chunking):
+        # client-level retries off, so chunk-level retries are exercised
+        client = InferenceClient(url=service.url, max_retries=0)
+        self.addCleanup(client.close)
+        with mock.patch.object(pipeline, 'get_inference_client', return_value=client), \
+             mock.patch.multiple(pipeline, **chunking):
+            return pipeline.run_inference_pipeline(self.image_map, self.json_data, self.bases)
+
+    def test_chunks_are_merged_by_base_name_and_persisted_per_chunk(self):
+        service = StubInferenceService()
+        self.addCleanup(service.close)
+        result = self._run(service, INFERENCE_CHUNK_SIZE=3, INFERENCE_CHUNK_CONCURRENCY=2)
+
+        self.assertEqual(len(service.requests), 4)
+        self.assertEqual(sorted(len(rows) for rows in self.inserted), [1, 3, 3, 3])
+        self.assertEqual([row['pre_image_name'] for row in result['detail_entries']],
+                         [f"{b}_pre_disaster.png" for b in self.bases])
+        row = result['detail_entries'][4]
+        self.assertEqual(row['damage_mask_name'], 'tile_004_post_disaster_mask.png')
+        # masks are named after the pair's content, not its file names
+        self.assertEqual(row['damage_mask_url'], f"https://masks.test/{_sent('tile_004')[1]}")
+        self.assertEqual(row['localisation_mask_url'], f"https://masks.test/{_sent('tile_004')[0]}")
+        # every row spooled: the execution may be cached once they are sent
+        self.assertFalse(OpenExecution.objects.exists())
+
+    def test_failed_chunk_is_retried_alone(self):
+        service = StubInferenceService(fail_first_for=[_sent('tile_007')[0]])
+        self.addCleanup(service.close)
+        result = self._run(service, INFERENCE_CHUNK_SIZE=4, INFERENCE_CHUNK_RETRIES=1)
+
+        # three chunks plus a single retry of the chunk holding tile_007
+        self.assertEqual(len(service.requests), 4)
+        sent = [name for request in service.requests for name in request]
+        self.assertEqual(sent.count(_sent('tile_007')[0]), 2)
+        self.assertEqual(sent.count(_sent('tile_009')[0]), 1)
+        self.assertEqual(len(result['detail_entries']), 10)
+
+    def test_chunk_failing_every_retry_fails_the_pipeline(self):
+        service = StubInferenceService(fail_first_for=[_sent('tile_000')[0]])
+        self.addCleanup(service.close)
+
+        with self.assertRaises(pipeline.PipelineError):
+            self._run(service, INFERENCE_CHUNK_SIZE=5, INFERENCE_CHUNK_RETRIES=0)
+        # the healthy chunk was still written, and the execution is closed so
+        # its results page stops waiting for the rest
+        self.assertEqual([len(rows) for rows in self.inserted], [5])
+        self.assertFalse(OpenExecution.objects.filter(header_id='42').exists())
+
+    def test_repeated_pairs_skip_inference(self):
+        service = StubInferenceService()
+        self.addCleanup(service.close)
+        first = self._run(service, INFERENCE_CHUNK_SIZE=4)
+        calls = len(service.requests)
+
+        second = self._run(service, INFERENCE_CHUNK_SIZE=4)
+        self.assertEqual(len(service.requests), calls)
+        self.assertEqual(second['inference_cache'], {'hits': 10, 'misses': 0})
+        self.assertEqual(second['detail_entries'][3]['damage_mask_url'],
+                         first['detail_entries'][3]['damage_mask_url'])
+
+    def test_repeated_identical_pairs_skip_inference(self):
+        def uploaded_by_content(files, folder=None, on_complete=None):
+            res = _uploaded(files)
+            for name, content in files:
+                res['results'][name]['digest'] = f"digest-of-{content.decode()}"
+            return res
+
+        self.bases = ['a', 'b']
+        self.image_map = {f"{b}_{kind}_disaster.png": kind.encode()
+                          for b in self.bases for kind in ('pre', 'post')}
+        self.json_data = {name: GEO for name in self.image_map}
+        service = StubInferenceService()
+        self.addCleanup(service.close)
+        with mock.patch.object(pipeline, 'upload_files_deduplicated', uploaded_by_content):
+            first = self._run(service, INFERENCE_CHUNK_SIZE=4)
+            self.inserted.clear()
+            second = self._run(service, INFERENCE_CHUNK_SIZE=4)
+
+        # one prediction for both copies, then none at all
+        self.assertEqual(len(service.requests), 1)
+        self.assertEqual([[row['pre_image_name'] for row in rows] for rows in self.inserted],
+                         [['a_pre_disaster.png', 'b_pre_disaster.png']])
+        self.assertEqual(second['inference_cache'], {'hits': 2, 'misses': 0})
+        self.assertEqual(second['mask_urls'], first['mask_urls'])
+
+    def test_model_version_change_invalidates_results(self):
+        service = StubInferenceService()
+        self.addCleanup(service.close)
+        self._run(service, INFERENCE_CHUNK_SIZE=10)
+
+        with mock.patch.object(cache, 'INFERENCE_MODEL_VERSION', 'v2'):
+            result = self._run(service, INFERENCE_CHUNK_SIZE=10)
+            self.assertEqual(result['inference_cache']['hits'], 0)
+            call_command('invalidate_inference_cache', stdout=mock.MagicMock())
+            self.assertEqual(set(cache.InferenceResult.objects.values_list(
+                'model_version', flat=True)), {'v2'})
+
+
+class MergeChunkResponseTest(TestCase):
+    def test_base_names_come_from_the_names_sent(self):
+        index = pipeline.batch_index(['site_pre_disaster_2', 'site'], {})
+        chunk = [(base, {entry.pre: 'u', entry.post: 'u'}) for base, entry in index.items()]
+        flask_data = {'mask_image_urls': [{name: f"m/{name}" for name in pair}
+                                          for _, pair in reversed(chunk)],
+                      'damage_severities': [{'num_destroyed': i} for i in (1, 2)]}
+
+        base_by_pre = {entry.pre: base for base, entry in index.items()}
+        merged = pipeline.merge_chunk_response(chunk, flask_data, base_by_pre)
+        self.assertEqual(list(merged), ['site_pre_disaster_2', 'site'])
+        self.assertEqual(merged['site_pre_disaster_2'][1], {'num_destroyed': 2})
+        self.assertEqual(merged['site'][0]['site_post_disaster.png'],
+                         'm/site_post_disaster.png')
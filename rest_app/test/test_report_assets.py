@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from rest_app import report_assets
+from rest_app.test.support import StubImageServer
+
+
+class PrefetchImagesTest(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+        patcher = mock.patch.object(report_assets, 'REPORT_IMAGE_CACHE_DIR', self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.server = StubImageServer()
+        self.addCleanup(self.server.close)
+
+    def test_images_are_downscaled_to_the_report_width(self):
+        big, small = self.server.url(1024, 512), self.server.url(100, 80)
+        paths = report_assets.prefetch_images([big, small, big], masks=[small])
+
+        self.assertEqual(len(self.server.requests), 2)
+        with Image.open(paths[big]) as img:
+            self.assertEqual(img.size, (340, 170))
+        with Image.open(paths[small]) as img:
+            self.assertEqual(img.size, (100, 80))
+
+    def test_cached_images_are_not_downloaded_again(self):
+        url = self.server.url(600, 600)
+        first = report_assets.prefetch_images([url])[url]
+        second = report_assets.prefetch_images([url])[url]
+
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith(self.cache_dir))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_local_uploads_are_read_from_disk(self):
+        # URLs of the offline upload backend
+        source = os.path.join(self.cache_dir, 'upload.png')
+        Image.new('RGB', (680, 100)).save(source)
+        url = f"file://{source}"
+        with Image.open(report_assets.prefetch_images([url])[url]) as img:
+            self.assertEqual(img.size, (340, 50))
+
+    def test_failed_download_falls_back_to_the_url(self):
+        url = f"{self.server.base_url}/missing.png"
+        with self.assertLogs('rest_app.report_assets', 'WARNING'):
+            self.assertEqual(report_assets.prefetch_images([url]), {url: url})
+
+    def test_least_recently_used_images_are_evicted(self):
+        old, new = self.server.url(50, 50), self.server.url(60, 60)
+        paths = report_assets.prefetch_images([old, new])
+        os.utime(paths[old], (0, 0))
+
+        report_assets.evict_image_cache(max_bytes=os.path.getsize(paths[new]))
+        self.assertFalse(os.path.exists(paths[old]))
+        self.assertTrue(os.path.exists(paths[new]))
@@ -0,0 +1,230 @@
+import importlib
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import SimpleTestCase, override_settings
+from pypdf import PdfReader, PdfWriter
+
+from rest_app import pdf_render, report_fragments, utils
+from rest_app.test.test_reports import ROW
+
+
+def _fake_create_pdf(rendered):
+    """Stand-in for pisa.CreatePDF: one blank page per rendered part."""
+    def create_pdf(html, dest):
+        rendered.append(html)
+        writer = PdfWriter()
+        writer.add_blank_page(width=595, height=842)
+        writer.write(dest)
+        return SimpleNamespace(err=0)
+    return create_pdf
+
+
+def _sleep(seconds):
+    """Stand-in render run in the pool: returns the worker's pid."""
+    time.sleep(seconds)
+    return os.getpid()
+
+
+class StreamingReportTest(SimpleTestCase):
+    def setUp(self):
+        self.rendered, self.uploaded = [], {}
+
+        def fake_upload(path, folder=None, public_id=None):
+            self.uploaded[public_id] = len(PdfReader(path).pages)
+            return {'success': True, 'secure_url': f"https://cdn.test/{public_id}.pdf"}
+
+        patches = [
+            # render in this process, where the fake pisa is
+            mock.patch.object(pdf_render, 'PDF_RENDER_WORKERS', 0),
+            mock.patch.object(pdf_render.pisa, 'CreatePDF', _fake_create_pdf(self.rendered)),
+            mock.patch.object(utils, 'upload_file', fake_upload),
+            mock.patch.object(utils, 'prefetch_images',
+                              side_effect=lambda urls, **kw: {u: u for u in urls}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.rows = [dict(ROW, post_image_url=f"https://cdn.test/post_{i}.png")
+                     for i in range(7)]
+        self.summary = dict(zip(('summary_stats', 'grand_area', 'grand_cost', 'total_clusters'),
+                                utils.build_summary(self.rows)))
+
+    def _image_numbers(self, html):
+        return [int(n) for n in re.findall(r'Image&nbsp;(\d+)', html)]
+
+    def test_small_batches_render_in_one_pass(self):
+        url, err = utils.generate_pdf_report(1, self.rows, **self.summary)
+
+        self.assertIsNone(err)
+        self.assertEqual(len(self.rendered), 1)
+        self.assertEqual(self._image_numbers(self.rendered[0]), list(range(1, 8)))
+        self.assertEqual(self.uploaded, {'1_report': 1})
+
+    def test_paged_reports_render_a_cover_and_one_part_per_page(self):
+        url, err = utils.generate_pdf_report(2, self.rows, page_size=3, **self.summary)
+
+        self.assertEqual(url, 'https://cdn.test/2_report.pdf')
+        cover, *pages = self.rendered
+        self.assertIn('Unit Repair Cost Table', cover.replace('\xa0', ' '))
+        self.assertEqual(self._image_numbers(cover), [])
+        self.assertEqual([self._image_numbers(p) for p in pages], [[1, 2, 3], [4, 5, 6], [7]])
+        self.assertNotIn('Cost Table', pages[0].replace('\xa0', ' '))
+        # cover + three parts merged into one upload
+        self.assertEqual(self.uploaded, {'2_report': 4})
+
+    def test_large_batches_stream_automatically(self):
+        with mock.patch.object(utils, 'REPORT_STREAM_THRESHOLD', 5), \
+             mock.patch.object(utils, 'REPORT_PAGE_SIZE', 4):
+            utils.generate_pdf_report(3, self.rows, **self.summary)
+
+        self.assertEqual(len(self.rendered), 3)
+
+    def test_volumes_keep_numbering_and_get_their_own_cover(self):
+        urls, err = utils.generate_pdf_volumes(4, self.rows, volume_size=4, page_size=2,
+                                               **self.summary)
+
+        self.assertEqual(urls, ['https://cdn.test/4_report_vol1.pdf',
+                                'https://cdn.test/4_report_vol2.pdf'])
+        self.assertEqual(self.uploaded, {'4_report_vol1': 3, '4_report_vol2': 3})
+        numbers = [n for html in self.rendered for n in self._image_numbers(html)]
+        self.assertEqual(numbers, list(range(1, 8)))
+
+
+class MergePdfPartsTest(SimpleTestCase):
+    def _part(self, tmp, text, pages):
+        from PIL import Image
+        from xhtml2pdf import pisa
+
+        image = os.path.join(tmp, f"{text}.png")
+        Image.new('RGB', (40, 30), (200, 40, 40)).save(image)
+        html = ''.join(f'<p>{text} page {i}</p><img src="{image}"/>'
+                       '<pdf:nextpage/>' for i in range(pages))
+        path = os.path.join(tmp, f"{text}.pdf")
+        with open(path, 'wb') as out:
+            self.assertFalse(pisa.CreatePDF(html, dest=out).err)
+        return path
+
+    def test_parts_are_concatenated_in_order(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            parts = [self._part(tmp, 'cover', 1), self._part(tmp, 'images', 3)]
+            dest = os.path.join(tmp, 'report.pdf')
+            utils.merge_pdf_parts(parts, dest)
+
+            merged = PdfReader(dest, strict=True)
+            texts = [page.extract_text() for page in merged.pages]
+            self.assertEqual(len(texts), 4)
+            self.assertIn('cover page 0', texts[0])
+            self.assertIn('images page 2', texts[3])
+            self.assertEqual(len(merged.pages[3].images), 1)
+            self.assertEqual(merged.pages[1].mediabox, PdfReader(parts[1]).pages[0].mediabox)
+
+
+class RenderPoolTest(SimpleTestCase):
+    def setUp(self):
+        patches = [mock.patch.object(pdf_render, 'PDF_RENDER_WORKERS', 2),
+                   mock.patch.object(pdf_render, '_pool', None)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(pdf_render.shutdown_render_pool)
+        for future in pdf_render.warm_up_render_pool():
+            future.result(60)
+
+    def test_renders_run_in_parallel_worker_processes(self):
+        results = []
+        start = time.perf_counter()
+        threads = [threading.Thread(target=lambda: results.append(
+            pdf_render.run_render(_sleep, 0.5))) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertLess(time.perf_counter() - start, 0.9)
+        self.assertEqual(len(set(results)), 2)
+        self.assertNotIn(os.getpid(), results)
+
+    def test_timed_out_render_is_abandoned_and_the_pool_replaced(self):
+        pool = pdf_render.get_render_pool()
+        with self.assertRaises(pdf_render.PdfRenderError):
+            pdf_render.run_render(_sleep, 30, timeout=1)
+
+        self.assertIsNot(pdf_render.get_render_pool(), pool)
+        self.assertIsInstance(pdf_render.run_render(_sleep, 0), int)
+
+
+class ReportFragmentsTest(SimpleTestCase):
+    def setUp(self):
+        report_fragments.clear_report_fragments()
+        self.addCleanup(report_fragments.clear_report_fragments)
+
+    def test_constant_fragments_render_once_per_process(self):
+        with mock.patch.object(report_fragments, 'render_to_string',
+                               wraps=report_fragments.render_to_string) as render:
+            first = report_fragments.report_fragments('logo.png')
+            again = report_fragments.report_fragments('logo.png')
+            report_fragments.report_fragments('other_logo.png')
+
+        self.assertEqual(first, again)
+        # styles and unit costs once, the header once per logo
+        self.assertEqual(render.call_count, 4)
+        self.assertIn('$0.75', first['unit_cost_table'])
+        self.assertIn('<img src="logo.png"', first['report_header'])
+
+    def _production_settings(self, **env):
+        sys.modules.pop('app_service.settings_production', None)
+        self.addCleanup(sys.modules.pop, 'app_service.settings_production', None)
+        with mock.patch.dict(os.environ, {k: v for k, v in env.items() if v is not None}):
+            for name in [k for k, v in env.items() if v is None]:
+                os.environ.pop(name, None)
+            return importlib.import_module('app_service.settings_production')
+
+    def test_production_settings_require_secret_key_and_hosts(self):
+        for missing in ('DJANGO_SECRET_KEY', 'ALLOWED_HOSTS'):
+            env = {'DJANGO_SECRET_KEY': 'k' * 50, 'ALLOWED_HOSTS': 'app.test', missing: None}
+            with self.subTest(missing=missing), \
+                    self.assertRaisesRegex(ImproperlyConfigured, missing):
+                self._production_settings(**env)
+
+        settings_production = self._production_settings(
+            DJANGO_SECRET_KEY='k' * 50, ALLOWED_HOSTS='app.test, api.test,')
+        self.assertEqual(settings_production.SECRET_KEY, 'k' * 50)
+        self.assertEqual(settings_production.ALLOWED_HOSTS, ['app.test', 'api.test'])
+        self.assertFalse(settings_production.DEBUG)
+
+    def test_production_settings_cache_compiled_templates(self):
+        from django.template import engines
+
+        settings_production = self._production_settings(
+            DJANGO_SECRET_KEY='k' * 50, ALLOWED_HOSTS='app.test')
+
+        with override_settings(DEBUG=False, TEMPLATES=settings_production.TEMPLATES):
+            loader, = engines['django'].engine.template_loaders
+            self.assertIsInstance(loader, CachedLoader)
+            html = engines['django'].get_template('report.html').render(
+                {**report_fragments.report_fragments('logo.png'), 'show_cover': True,
+                 'generation_date': '2025-01-01 00:00:00'})
+
+        self.assertIn('Unit Repair Cost Table', html.replace('\xa0', ' '))
+        self.assertIn('Generated&nbsp;at:&nbsp;2025-01-01 00:00:00', html)
+        self.assertNotIn('&lt;', html)      # fragments are not escaped again
+
+
+class WarmUpTest(SimpleTestCase):
+    def test_entry_points_start_the_pool_only_when_asked(self):
+        for module in ('app_service.wsgi', 'app_service.asgi'):
+            for enabled in (False, True):
+                with mock.patch.object(pdf_render, 'PDF_RENDER_WARM_UP', enabled), \
+                        mock.patch.object(pdf_render, 'warm_up_render_pool') as warm_up:
+                    importlib.reload(importlib.import_module(module))
+                self.assertEqual(warm_up.called, enabled)
@@ -0,0 +1,54 @@
+import threading
+from unittest import mock
+
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from rest_app import reports
+from rest_app.models import Report
+
+ROW = {
+    'post_image_url': 'https://cdn.test/post.png', 'damage_mask_url': 'https://cdn.test/mask.png',
+    'num_no_damage': 1, 'num_minor_damage': 0, 'num_major_damage': 0, 'num_destroyed': 2,
+    'area_no_damage': 10.0, 'area_minor_damage': 0.0, 'area_major_damage': 0.0, 'area_destroyed': 5.0,
+    'cost_no_damage': 0.0, 'cost_minor_damage': 0.0, 'cost_major_damage': 0.0, 'cost_destroyed': 3.75,
+}
+
+
+class BackgroundReportTest(TransactionTestCase):
+    def test_report_is_pending_until_rendered_then_redirects(self):
+        release = threading.Event()
+
+        def slow_report(header_id, detail_entries, **summary):
+            release.wait(5)
+            return f"https://cdn.test/{header_id}_report.pdf", None
+
+        url = reverse('view_report', args=[11])
+        with mock.patch.object(reports, 'generate_pdf_report', slow_report):
+            future = reports.schedule_report(11, [ROW])
+
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 202)
+            self.assertEqual(resp.json(), {'status': 'pending'})
+            self.assertEqual(resp['Retry-After'], '3')
+
+            release.set()
+            future.result(5)
+
+        resp = self.client.get(url)
+        self.assertRedirects(resp, 'https://cdn.test/11_report.pdf', fetch_redirect_response=False)
+        self.assertEqual(self.client.get(url, {'format': 'json'}).json(),
+                         {'status': 'ready', 'url': 'https://cdn.test/11_report.pdf',
+                          'volumes': ['https://cdn.test/11_report.pdf']})
+
+    def test_failed_report_is_reported(self):
+        with mock.patch.object(reports, 'generate_pdf_report',
+                               return_value=(None, 'Failed to generate PDF')):
+            reports.schedule_report(12, [ROW]).result(5)
+
+        resp = self.client.get(reverse('view_report', args=[12]))
+        self.assertEqual(resp.status_code, 500)
+        self.assertEqual(Report.objects.get(header_id='12').error, 'Failed to generate PDF')
+
+    def test_unknown_report_is_404(self):
+        self.assertEqual(self.client.get(reverse('view_report', args=[404])).status_code, 404)
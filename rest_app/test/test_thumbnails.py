@@ -0,0 +1,131 @@
+import io
+import math
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+from django.urls import reverse
+from PIL import Image
+
+from rest_app import thumbnails
+from rest_app.config import cloudinary as cloudinary_config
+from rest_app.config.offline import LocalUploader
+from rest_app.metrics import STAGE_DURATION
+
+# 512 px tile of ~5.7 m pixels; the mask has one red building in its centre
+GEO = [-90.0, 0.00005, 0.0, 30.0, 0.0, -0.00005]
+
+
+def _png(pixels):
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def _xyz(lon, lat, z):
+    n = 2 ** z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+class ThumbnailViewTest(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        uploader = LocalUploader(os.path.join(tmp.name, 'uploads'))
+        self.addCleanup(cloudinary_config.set_uploader, cloudinary_config.set_uploader(uploader))
+        patcher = mock.patch.object(thumbnails, 'THUMBNAIL_CACHE_DIR', os.path.join(tmp.name, 'thumbs'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        thumbnails._source_image.cache_clear()
+
+        photo = np.random.default_rng(0).integers(0, 255, (512, 512, 3), dtype=np.uint8)
+        mask = np.zeros((512, 512, 3), dtype=np.uint8)
+        mask[240:272, 240:272] = (255, 0, 0)
+        self.photo_url = uploader.upload(io.BytesIO(_png(photo)), public_id='post.png')['secure_url']
+        self.mask_url = uploader.upload(io.BytesIO(_png(mask)), public_id='mask.png')['secure_url']
+
+    def test_previews_are_downscaled_and_cached(self):
+        before = STAGE_DURATION.count('thumbnail.render')
+        resp = self.client.get(reverse('thumbnail'), {'url': self.photo_url, 'w': 200})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], thumbnails.PHOTO_FORMAT[1])
+        self.assertEqual(resp['Cache-Control'], f'public, max-age={thumbnails.THUMBNAIL_MAX_AGE}')
+        with Image.open(io.BytesIO(b''.join(resp.streaming_content))) as img:
+            self.assertEqual(img.size, (256, 256))
+
+        # same preview: served from disk, and not at all when the client has it
+        again = self.client.get(reverse('thumbnail'), {'url': self.photo_url, 'w': 256})
+        self.assertEqual(again['ETag'], resp['ETag'])
+        cached = self.client.get(reverse('thumbnail'), {'url': self.photo_url, 'w': 256},
+                                 HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(STAGE_DURATION.count('thumbnail.render'), before + 1)
+
+    def test_masks_keep_exact_colours(self):
+        resp = self.client.get(reverse('thumbnail'), {'url': self.mask_url, 'w': 128, 'mask': 1})
+
+        self.assertEqual(resp['Content-Type'], 'image/png')
+        with Image.open(io.BytesIO(b''.join(resp.streaming_content))) as img:
+            colours = {c for _, c in img.convert('RGB').getcolors()}
+        self.assertEqual(colours, {(0, 0, 0), (255, 0, 0)})
+
+    def test_only_allowed_sources_are_fetched(self):
+        for url in ('https://example.test/a.png', 'file:///etc/passwd', ''):
+            resp = self.client.get(reverse('thumbnail'), {'url': url})
+            self.assertEqual(resp.status_code, 400, url)
+
+        with mock.patch.object(thumbnails, 'THUMBNAIL_ALLOWED_HOSTS', ('images.test',)), \
+                mock.patch.object(thumbnails, 'read_source', return_value=_png(
+                    np.zeros((8, 8, 3), dtype=np.uint8))):
+            resp = self.client.get(reverse('thumbnail'), {'url': 'https://images.test/a.png'})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_mask_tiles_follow_the_geotransform(self):
+        gt = ','.join(map(str, GEO))
+        centre = (GEO[0] + 256 * GEO[1], GEO[3] + 256 * GEO[5])
+        x, y = _xyz(*centre, 18)
+
+        resp = self.client.get(reverse('mask_tile', args=[18, x, y]),
+                               {'url': self.mask_url, 'gt': gt})
+        self.assertEqual(resp.status_code, 200)
+        with Image.open(io.BytesIO(b''.join(resp.streaming_content))) as img:
+            pixels = np.asarray(img)
+        opaque = pixels[pixels[..., 3] > 0]
+        self.assertTrue(len(opaque))
+        self.assertEqual({tuple(p) for p in opaque}, {(255, 0, 0, 255)})
+
+        far = self.client.get(reverse('mask_tile', args=[18, x + 50, y]),
+                              {'url': self.mask_url, 'gt': gt})
+        with Image.open(io.BytesIO(b''.join(far.streaming_content))) as img:
+            self.assertEqual(img.getextrema()[3], (0, 0))
+
+        # only the tile with some of the mask on it is cached on its own
+        self.assertEqual(len(os.listdir(os.path.join(thumbnails.THUMBNAIL_CACHE_DIR, 'tiles'))), 2)
+
+        self.assertEqual(self.client.get(reverse('mask_tile', args=[2, 9, 0]),
+                                         {'url': self.mask_url, 'gt': gt}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('mask_tile', args=[18, x, y]),
+                                         {'url': self.mask_url, 'gt': '1,2'}).status_code, 400)
+
+    def test_tiles_are_evicted_apart_from_the_previews(self):
+        gt = ','.join(map(str, GEO))
+        x, y = _xyz(GEO[0] + 256 * GEO[1], GEO[3] + 256 * GEO[5], 18)
+        preview = self.client.get(reverse('thumbnail'), {'url': self.photo_url, 'w': 128})
+        self.assertEqual(preview.status_code, 200)
+
+        with mock.patch.object(thumbnails, '_EVICT_EVERY', 1), \
+                mock.patch.object(thumbnails, 'TILE_CACHE_MAX_MB', 0):
+            for dx in range(3):
+                resp = self.client.get(reverse('mask_tile', args=[18, x, y + dx]),
+                                       {'url': self.mask_url, 'gt': gt})
+                self.assertEqual(resp.status_code, 200)
+
+        # only the last tile is left, and the preview was never touched
+        self.assertEqual(len(os.listdir(os.path.join(thumbnails.THUMBNAIL_CACHE_DIR, 'tiles'))), 1)
+        self.assertEqual(len([e for e in os.scandir(thumbnails.THUMBNAIL_CACHE_DIR)
+                              if e.is_file()]), 1)
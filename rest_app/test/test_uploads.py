@@ -0,0 +1,132 @@
+import hashlib
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from rest_app import cache, pipeline
+from rest_app.config import cloudinary as cloudinary_config
+from rest_app.config.inference import InferenceClient
+from rest_app.config.offline import LocalUploader
+from rest_app.metrics import STAGE_DURATION, STAGE_ERRORS
+from rest_app.models import InferenceJob
+from rest_app.test.support import StubInferenceService
+from rest_app.test.test_jobs import _batch
+from rest_app.test.test_pipeline import GEO
+from rest_app.uploads import (PNG_SIGNATURE, HashedUploadedFile, HashingUploadHandler,
+                              rejected_uploads)
+
+PRE = PNG_SIGNATURE + b'pre pixels'
+POST = PNG_SIGNATURE + b'post pixels'
+
+
+def _parse(files):
+    request = RequestFactory().post('/', {'image_files': files})
+    return request, request.FILES.getlist('image_files')
+
+
+class HashingUploadHandlerTest(TestCase):
+    def test_uploads_are_spooled_to_disk_with_their_digest(self):
+        request, files = _parse([SimpleUploadedFile('a_pre_disaster.png', PRE),
+                                 SimpleUploadedFile('a_post_disaster.png', POST)])
+
+        self.assertEqual(rejected_uploads(request), [])
+        self.assertEqual([f.name for f in files], ['a_pre_disaster.png', 'a_post_disaster.png'])
+        pre = files[0]
+        self.assertIsInstance(pre, HashedUploadedFile)
+        self.assertTrue(os.path.exists(pre.temporary_file_path()))
+        self.assertEqual(pre.digest, hashlib.sha256(PRE).hexdigest())
+        self.assertEqual(pre.read(), PRE)
+
+        # the digest is reused rather than computed again
+        with mock.patch.object(cache.hashlib, 'sha256') as sha256:
+            self.assertEqual(cache.file_digest(pre), pre.digest)
+        sha256.assert_not_called()
+
+    def test_misnamed_and_non_png_files_are_rejected(self):
+        request, files = _parse([SimpleUploadedFile('a_pre_disaster.png', PRE),
+                                 SimpleUploadedFile('a_post.png', POST),
+                                 SimpleUploadedFile('a_post_disaster.png', b'GIF89a...'),
+                                 SimpleUploadedFile('b_pre_disaster.png', b'')])
+
+        self.assertEqual([f.name for f in files], ['a_pre_disaster.png'])
+        self.assertEqual(rejected_uploads(request), [
+            'a_post.png must be named <base>_pre_disaster.png or <base>_post_disaster.png.',
+            'a_post_disaster.png is not a PNG image.',
+            'b_pre_disaster.png is not a PNG image.',
+        ])
+
+    def test_signature_split_across_chunks(self):
+        with mock.patch.object(HashingUploadHandler, 'chunk_size', 4):
+            request, files = _parse([SimpleUploadedFile('a_pre_disaster.png', PRE),
+                                     SimpleUploadedFile('a_post_disaster.png', b'\x89PNG\r\nxx')])
+
+        self.assertEqual([f.name for f in files], ['a_pre_disaster.png'])
+        self.assertEqual(files[0].digest, hashlib.sha256(PRE).hexdigest())
+        self.assertEqual(rejected_uploads(request), ['a_post_disaster.png is not a PNG image.'])
+
+    def test_rejected_upload_fails_the_request(self):
+        batch = _batch()
+        batch['image_files'][1] = SimpleUploadedFile('tile_001_post_disaster.png', b'not a png')
+        resp = self.client.post(reverse('create_job'), batch)
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['message'], 'tile_001_post_disaster.png is not a PNG image.')
+        self.assertFalse(InferenceJob.objects.exists())
+
+    @override_settings(DATA_UPLOAD_MAX_NUMBER_FIELDS=1)
+    def test_receive_is_timed_when_the_parse_fails(self):
+        observed, failed = STAGE_DURATION.count('receive'), STAGE_ERRORS.value('receive')
+        resp = self.client.post(reverse('create_job'), dict(_batch(), a='1', b='2'))
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(STAGE_DURATION.count('receive'), observed + 1)
+        self.assertEqual(STAGE_ERRORS.value('receive'), failed + 1)
+
+        # a successful parse is timed once, and not as a failure
+        _parse([SimpleUploadedFile('a_pre_disaster.png', PRE)])
+        self.assertEqual(STAGE_DURATION.count('receive'), observed + 2)
+        self.assertEqual(STAGE_ERRORS.value('receive'), failed + 1)
+
+
+class ReleaseAfterUploadTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(cloudinary_config.set_uploader,
+                        cloudinary_config.set_uploader(LocalUploader(tmp.name)))
+        self.service = service = StubInferenceService()
+        self.addCleanup(service.close)
+        client = InferenceClient(url=service.url, max_retries=0)
+        self.addCleanup(client.close)
+
+        patches = [
+            mock.patch.object(pipeline, 'get_inference_client', return_value=client),
+            mock.patch.object(pipeline, 'insert_with_retry', return_value=[{'id': 42}]),
+            mock.patch.object(pipeline, 'write_rows'),
+            mock.patch.object(pipeline, 'schedule_report'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_temporary_files_are_deleted_once_uploaded(self):
+        # b is a copy of a: uploaded once, released all the same
+        _, files = _parse([SimpleUploadedFile('a_pre_disaster.png', PRE),
+                           SimpleUploadedFile('a_post_disaster.png', POST),
+                           SimpleUploadedFile('b_pre_disaster.png', PRE),
+                           SimpleUploadedFile('b_post_disaster.png', POST)])
+        paths = [f.temporary_file_path() for f in files]
+        image_map = {f.name: f for f in files}
+
+        result = pipeline.run_inference_pipeline(image_map, {n: GEO for n in image_map}, ['a', 'b'])
+
+        self.assertEqual(result['upload_cache'], {'hits': 2, 'misses': 2})
+        # and predicted once, each copy showing the same masks
+        self.assertEqual(len(self.service.requests), 1)
+        self.assertEqual(result['mask_urls']['a']['a_post_disaster.png'],
+                         result['mask_urls']['b']['b_post_disaster.png'])
+        self.assertEqual([p for p in paths if os.path.exists(p)], [])
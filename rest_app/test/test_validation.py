@@ -0,0 +1,97 @@
+import io
+import json
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_app.pipeline import PipelineError, validate_inference_request
+from rest_app.test.test_jobs import GEO, _batch
+from rest_app.validation import BatchIndex, PairEntry, check_geotransforms, index_images
+
+
+class _Named:
+    def __init__(self, name):
+        self.name = name
+
+
+def _request(names, geo):
+    return [_Named(n) for n in names], io.BytesIO(json.dumps(geo).encode())
+
+
+class ValidateInferenceRequestTest(SimpleTestCase):
+    def test_pairs_are_indexed_in_upload_order(self):
+        names = ['b_post_disaster.png', 'b_pre_disaster.png',
+                 'a_pre_disaster.png', 'a_post_disaster.png']
+        json_data, index = validate_inference_request(*_request(names, {n: GEO for n in names}))
+
+        self.assertIsInstance(index, BatchIndex)
+        self.assertEqual(list(index), ['b', 'a'])
+        self.assertEqual(index['a'], PairEntry('a_pre_disaster.png', 'a_post_disaster.png', GEO))
+        self.assertEqual(index.image_names(), ['b_pre_disaster.png', 'b_post_disaster.png',
+                                               'a_pre_disaster.png', 'a_post_disaster.png'])
+
+    def test_every_unmatched_file_is_reported(self):
+        pairs, errors = index_images(['a_pre_disaster.png', 'b_post_disaster.png',
+                                      'c_pre_disaster.png', 'c_pre_disaster.png',
+                                      'c_post_disaster.png', 'notes.txt'])
+
+        self.assertEqual(errors, [
+            {'file': 'c_pre_disaster.png', 'error': 'uploaded more than once'},
+            {'file': 'notes.txt', 'error': 'must be named <base>_pre_disaster.png or '
+                                           '<base>_post_disaster.png'},
+            {'file': 'a_pre_disaster.png', 'error': 'has no matching post-disaster image'},
+            {'file': 'b_post_disaster.png', 'error': 'has no matching pre-disaster image'},
+        ])
+        with self.assertRaises(PipelineError) as ctx:
+            validate_inference_request(*_request(['a_pre_disaster.png'], {}))
+        self.assertEqual(ctx.exception.message,
+                         'Image pairs (pre/post) are incomplete or mismatched.')
+
+    def test_geotransform_errors_name_their_file(self):
+        pairs, _ = index_images(['a_pre_disaster.png', 'a_post_disaster.png',
+                                 'b_pre_disaster.png', 'b_post_disaster.png',
+                                 'c_pre_disaster.png', 'c_post_disaster.png'])
+        errors = check_geotransforms({'a_pre_disaster.png': GEO,
+                                      'a_post_disaster.png': [[1, 2, 3], 'EPSG:4326'],
+                                      'b_pre_disaster.png': [[1, 2, 3, 4, 5, 'x'], 'EPSG:4326'],
+                                      'c_pre_disaster.png': [[1, 2, 3, 4, 5, '7'], 'EPSG:4326'],
+                                      'c_post_disaster.png': [[1, 2, 3, 4, True, 1e400],
+                                                              'EPSG:4326'],
+                                      'extra.png': GEO}, pairs)
+
+        self.assertEqual(errors, [
+            {'file': 'b_post_disaster.png', 'error': 'has no geotransform entry'},
+            {'file': 'extra.png', 'error': 'is not one of the uploaded images'},
+            {'file': 'a_post_disaster.png',
+             'error': 'geotransform must be [[6 numbers], "<projection>"]'},
+        ] + [{'file': name, 'error': 'geotransform parameters must be finite numbers'}
+             for name in ('b_pre_disaster.png', 'c_pre_disaster.png', 'c_post_disaster.png')])
+
+    def test_large_batches_validate_quickly(self):
+        names = [f'tile_{i:05d}_{kind}_disaster.png' for i in range(5000) for kind in ('pre', 'post')]
+        files, json_file = _request(names, {n: GEO for n in names})
+
+        start = time.perf_counter()
+        _, index = validate_inference_request(files, json_file)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(index), 5000)
+        self.assertLess(elapsed, 1.0)
+
+
+class ValidationResponseTest(TestCase):
+    def test_errors_are_returned_per_file(self):
+        batch = _batch()
+        batch['json_file'] = SimpleUploadedFile('geo.json', json.dumps(
+            {'tile_001_pre_disaster.png': GEO}).encode())
+        resp = self.client.post(reverse('create_job'), batch)
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json(), {
+            'status': 'error',
+            'message': 'Invalid JSON structure or image name mismatch.',
+            'errors': [{'file': 'tile_001_post_disaster.png',
+                        'error': 'has no geotransform entry'}],
+        })
@@ -0,0 +1,133 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from rest_app import writes
+from rest_app.config import supabase
+from rest_app.config.offline import InMemorySupabase
+from rest_app.models import PendingWrite
+
+
+class FlakySupabase(InMemorySupabase):
+    """InMemorySupabase whose inserts fail while `down` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.inserts = []
+
+    def table(self, name):
+        query = super().table(name)
+        execute = query.execute
+
+        def flaky_execute():
+            if query.action == 'insert':
+                if self.down:
+                    raise ConnectionError('supabase unreachable')
+                self.inserts.append(len(query.payload))
+            return execute()
+        query.execute = flaky_execute
+        return query
+
+
+class _WritesMixin:
+    def setUp(self):
+        self.db = FlakySupabase()
+        self.addCleanup(supabase.set_supabase_client, supabase.set_supabase_client(self.db))
+        patcher = mock.patch.multiple(writes, SUPABASE_WRITE_BACKOFF=0, SUPABASE_WRITE_RETRIES=2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _rows(self, n):
+        return [{'header_id': 1, 'pre_image_name': f"tile_{i}_pre_disaster.png"} for i in range(n)]
+
+
+class SpoolTest(_WritesMixin, TestCase):
+    def test_rows_are_sent_in_bounded_batches(self):
+        writes.spool_rows('execution_details', self._rows(7), batch_size=3)
+        res = writes.flush_spool()
+
+        self.assertEqual(self.db.inserts, [3, 3, 1])
+        self.assertEqual((res['written'], res['remaining']), (3, 0))
+        self.assertEqual(len(self.db.tables['execution_details']), 7)
+
+    def test_unreachable_supabase_keeps_rows_until_replayed(self):
+        self.db.down = True
+        writes.spool_rows('execution_details', self._rows(4), batch_size=2)
+        res = writes.flush_spool()
+
+        self.assertEqual(res['written'], 0)
+        self.assertIn('supabase unreachable', res['error'])
+        # the first batch failed; the second was not tried out of order
+        self.assertEqual(list(PendingWrite.objects.values_list('attempts', flat=True)), [1, 0])
+
+        self.db.down = False
+        call_command('replay_supabase_spool', stdout=mock.Mock())
+        self.assertEqual(PendingWrite.objects.count(), 0)
+        self.assertEqual([r['pre_image_name'] for r in self.db.tables['execution_details']],
+                         [f"tile_{i}_pre_disaster.png" for i in range(4)])
+
+    def test_batches_claimed_by_another_flush_are_not_sent_twice(self):
+        writes.spool_rows('execution_details', self._rows(4), batch_size=2)
+        # another worker process is sending everything spooled so far
+        writes.claim_spool('other-process')
+        writes.spool_rows('execution_details', self._rows(1))
+
+        res = writes.flush_spool()
+
+        self.assertEqual(self.db.inserts, [1])
+        self.assertEqual((res['written'], res['remaining']), (1, 2))
+
+    def test_abandoned_claims_are_taken_over(self):
+        writes.spool_rows('execution_details', self._rows(2))
+        writes.claim_spool('dead-process')
+        PendingWrite.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(writes.flush_spool()['written'], 1)
+        self.assertEqual(PendingWrite.objects.count(), 0)
+
+    def test_flush_renews_its_claims_and_stops_once_taken_over(self):
+        *_, last = writes.spool_rows('execution_details', self._rows(3), batch_size=1)
+        insert = writes.insert_with_retry
+        claims = []
+
+        def slow_insert(table_name, rows, retries=None, backoff=None):
+            claims.append(list(PendingWrite.objects.values_list('claimed_at', flat=True)))
+            if len(claims) == 2:
+                # another worker takes over the last batch, as if this flush had stalled
+                PendingWrite.objects.filter(pk=last).update(claimed_by='other-process')
+            return insert(table_name, rows, retries, backoff)
+
+        with mock.patch.object(writes, 'insert_with_retry', slow_insert):
+            res = writes.flush_spool()
+
+        # the claims of the batches still to send were renewed before the second one
+        self.assertGreater(claims[1][-1], claims[0][-1])
+        self.assertEqual(self.db.inserts, [1, 1])
+        self.assertEqual((res['written'], res['remaining']), (2, 1))
+        self.assertEqual(list(PendingWrite.objects.values_list('claimed_by', flat=True)),
+                         ['other-process'])
+
+    def test_failed_flush_releases_its_claims(self):
+        self.db.down = True
+        writes.spool_rows('execution_details', self._rows(2))
+        writes.flush_spool()
+
+        self.assertEqual(list(PendingWrite.objects.values_list('claimed_by', flat=True)), [''])
+
+    def test_insert_with_retry_raises_after_the_last_attempt(self):
+        self.db.down = True
+        with self.assertRaises(writes.SupabaseWriteError):
+            writes.insert_with_retry('execution_headers', {'upload_time': 'now'})
+
+
+class BackgroundWriteTest(_WritesMixin, TransactionTestCase):
+    def test_write_rows_returns_before_supabase_is_written(self):
+        future = writes.write_rows('execution_details', self._rows(5), batch_size=2)
+
+        self.assertEqual(future.result(5)['written'], 3)
+        self.assertEqual(len(self.db.tables['execution_details']), 5)
+        self.assertEqual(PendingWrite.objects.count(), 0)
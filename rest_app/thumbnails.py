@@ -0,0 +1,273 @@
+"""
+Downscaled previews and map tiles of uploaded images and masks.
+
+The result viewer used to load every image at full resolution straight from
+Cloudinary. `/thumbs/` serves a preview at one of THUMBNAIL_WIDTHS instead
+(WebP for photos, PNG with nearest-neighbour sampling for masks), and
+`/tiles/<z>/<x>/<y>.png` reprojects a mask into Web Mercator XYZ tiles using
+its tile's geotransform, so Leaflet can overlay it on the map.
+
+Both are rendered once and kept in an on-disk LRU cache (see
+report_assets.evict_image_cache); tiles have a directory and size cap of
+their own (TILE_CACHE_MAX_MB), so panning a map can't evict the previews, and
+fully transparent tiles all share one file. Their content only depends on
+the request, so responses carry a strong ETag and a long Cache-Control max-age.
+
+Only images on THUMBNAIL_ALLOWED_HOSTS (and, with the offline uploader,
+files in its directory) are fetched, so the endpoints can't be used to make
+the server download arbitrary URLs.
+"""
+import functools
+import hashlib
+import io
+import math
+import os
+import tempfile
+import threading
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+from django.urls import reverse
+from PIL import Image, features
+
+from rest_app.config.cloudinary import get_uploader
+from rest_app.config.offline import LocalUploader
+from rest_app.metrics import timed
+from rest_app.report_assets import evict_image_cache, read_source
+
+THUMBNAIL_WIDTHS        = (128, 256, 512, 1024)
+THUMBNAIL_CACHE_DIR     = os.getenv('THUMBNAIL_CACHE_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'deployforce_thumbnails'))
+THUMBNAIL_CACHE_MAX_MB  = int(os.getenv('THUMBNAIL_CACHE_MAX_MB', '256'))
+# map tiles, kept in the `tiles` subdirectory of THUMBNAIL_CACHE_DIR
+TILE_CACHE_MAX_MB       = int(os.getenv('TILE_CACHE_MAX_MB', '64'))
+THUMBNAIL_MAX_AGE       = int(os.getenv('THUMBNAIL_MAX_AGE', '86400'))
+THUMBNAIL_ALLOWED_HOSTS = tuple(h.strip() for h in
+                                os.getenv('THUMBNAIL_ALLOWED_HOSTS', 'res.cloudinary.com').split(',')
+                                if h.strip())
+# Decoded source images kept in memory: every tile of a mask reuses one
+THUMBNAIL_SOURCE_CACHE  = int(os.getenv('THUMBNAIL_SOURCE_CACHE', '16'))
+
+TILE_SIZE = 256
+MAX_ZOOM  = 22
+
+PHOTO_FORMAT = ('WEBP', 'image/webp', '.webp') if features.check('webp') \
+    else ('JPEG', 'image/jpeg', '.jpg')
+MASK_FORMAT  = ('PNG', 'image/png', '.png')
+
+# evictions run every this many renders rather than after each one
+_EVICT_EVERY = 50
+_renders = {}                   # cache directory → files written to it
+_renders_lock = threading.Lock()
+
+
+class ThumbnailError(Exception):
+    """The image can't be served; `status` is the HTTP status to report."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+# --------------------------------------------------------------------------- #
+# Sources                                                                     #
+# --------------------------------------------------------------------------- #
+def check_source(url):
+    """Raise ThumbnailError unless `url` is an image this service may fetch."""
+    parts = urlsplit(url or '')
+    if parts.scheme in ('http', 'https') and parts.hostname in THUMBNAIL_ALLOWED_HOSTS:
+        return
+    if parts.scheme == 'file':
+        uploader = get_uploader()
+        if isinstance(uploader, LocalUploader):
+            root = os.path.realpath(uploader.root)
+            if os.path.realpath(parts.path).startswith(root + os.sep):
+                return
+    raise ThumbnailError('Image URL is not allowed.', status=400)
+
+
+@functools.lru_cache(maxsize=THUMBNAIL_SOURCE_CACHE)
+def _source_image(url):
+    try:
+        with Image.open(io.BytesIO(read_source(url))) as img:
+            img.load()
+            return img.convert('RGBA') if img.mode not in ('RGB', 'RGBA', 'L') else img.copy()
+    except Exception as exc:
+        raise ThumbnailError(f'Could not fetch the image: {exc}', status=502)
+
+
+# --------------------------------------------------------------------------- #
+# Disk cache                                                                  #
+# --------------------------------------------------------------------------- #
+def cache_key(*parts):
+    return hashlib.sha256('|'.join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _tile_dir():
+    return os.path.join(THUMBNAIL_CACHE_DIR, 'tiles')
+
+
+def _cached(key, suffix, render, directory=None, max_mb=None):
+    """
+    Path of the cached file for `key` in `directory` (THUMBNAIL_CACHE_DIR),
+    rendering it with render() on a miss. None, without writing anything,
+    when render() returns None.
+    """
+    directory = directory or THUMBNAIL_CACHE_DIR
+    path = os.path.join(directory, key + suffix)
+    if os.path.exists(path):
+        os.utime(path)      # mark as recently used
+        return path
+
+    content = render()
+    if content is None:
+        return None
+    with _renders_lock:
+        renders = _renders[directory] = _renders.get(directory, 0) + 1
+    if renders % _EVICT_EVERY == 0:
+        # before the new file lands, so it is never the one evicted
+        max_mb = THUMBNAIL_CACHE_MAX_MB if max_mb is None else max_mb
+        evict_image_cache(max_mb * 1024 * 1024, directory, suffixes=('.png', '.webp', '.jpg'))
+
+    # write then rename, so concurrent requests never see a partial file
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as out:
+        out.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _encode(img, fmt):
+    buf = io.BytesIO()
+    if fmt == 'PNG':
+        img.save(buf, format='PNG', optimize=True)
+    else:
+        img.convert('RGB').save(buf, format=fmt, quality=80)
+    return buf.getvalue()
+
+
+# --------------------------------------------------------------------------- #
+# Thumbnails                                                                  #
+# --------------------------------------------------------------------------- #
+def snap_width(width):
+    """The smallest THUMBNAIL_WIDTHS entry at least `width` wide (capped at the largest)."""
+    return next((w for w in THUMBNAIL_WIDTHS if w >= width), THUMBNAIL_WIDTHS[-1])
+
+
+def thumbnail(url, width, mask=False):
+    """
+    Cached preview of `url`, at most `width` (snapped) pixels wide.
+
+    Returns:
+        (str, str, str): path of the file, its content type and its ETag.
+    """
+    check_source(url)
+    width = snap_width(width)
+    fmt, content_type, suffix = MASK_FORMAT if mask else PHOTO_FORMAT
+    key = cache_key('thumb', url, width, mask)
+
+    @timed('thumbnail.render')
+    def render():
+        img = _source_image(url)
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.Resampling.NEAREST if mask
+                             else Image.Resampling.LANCZOS)
+        return _encode(img, fmt)
+
+    return _cached(key, suffix, render), content_type, f'"{key[:32]}"'
+
+
+# --------------------------------------------------------------------------- #
+# XYZ tiles                                                                   #
+# --------------------------------------------------------------------------- #
+def parse_geo_params(value):
+    """The 6 geotransform parameters from 'a,b,c,d,e,f'."""
+    try:
+        params = [float(v) for v in value.split(',')]
+    except (AttributeError, ValueError):
+        params = []
+    if len(params) != 6 or not all(map(math.isfinite, params)) \
+            or params[1] * params[5] - params[2] * params[4] == 0:
+        raise ThumbnailError('gt must be 6 comma-separated geotransform parameters.')
+    return params
+
+
+def _tile_lonlat(z, x, y):
+    """(lon, lat) of the centre of every pixel of an XYZ tile, each (TILE_SIZE, TILE_SIZE)."""
+    n = 2 ** z
+    steps = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    lon = (x + steps) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + steps) / n))))
+    return np.meshgrid(lon, lat)
+
+
+def render_tile(img, geo_params, z, x, y):
+    """
+    RGBA tile (z, x, y) of `img` placed with `geo_params`; black (no building)
+    and out-of-image pixels are transparent.
+    """
+    lon0, pw, rx, lat0, ry, ph = geo_params
+    lon, lat = _tile_lonlat(z, x, y)
+    # invert lon = lon0 + px*pw + py*rx, lat = lat0 + px*ry + py*ph
+    inverse = np.linalg.inv(np.array([[pw, rx], [ry, ph]]))
+    d_lon, d_lat = lon - lon0, lat - lat0
+    px = np.floor(inverse[0, 0] * d_lon + inverse[0, 1] * d_lat).astype(int)
+    py = np.floor(inverse[1, 0] * d_lon + inverse[1, 1] * d_lat).astype(int)
+
+    inside = (px >= 0) & (px < img.width) & (py >= 0) & (py < img.height)
+    tile = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    if inside.any():
+        src = np.asarray(img.convert('RGBA'))
+        pixels = src[py[inside], px[inside]]
+        # mask background is black: let the map show through
+        pixels[(pixels[:, :3] == 0).all(axis=1), 3] = 0
+        tile[inside] = pixels
+    return Image.fromarray(tile, 'RGBA')
+
+
+def mask_tile(url, geo_params, z, x, y):
+    """
+    Cached XYZ tile of the mask at `url`.
+
+    Returns:
+        (str, str, str): path of the PNG, its content type and its ETag.
+    """
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise ThumbnailError('Tile out of range.', status=404)
+    check_source(url)
+    key = cache_key('tile', url, ','.join(map(repr, geo_params)), z, x, y)
+
+    @timed('tile.render')
+    def render():
+        tile = render_tile(_source_image(url), geo_params, z, x, y)
+        # nothing of the mask on this tile: serve the shared empty one
+        return None if tile.getextrema()[3][1] == 0 else _encode(tile, 'PNG')
+
+    path = _cached(key, '.png', render, _tile_dir(), TILE_CACHE_MAX_MB) or _empty_tile()
+    return path, MASK_FORMAT[1], f'"{key[:32]}"'
+
+
+def _empty_tile():
+    """Path of the fully transparent tile that every empty mask tile is served as."""
+    def render():
+        return _encode(Image.new('RGBA', (TILE_SIZE, TILE_SIZE)), 'PNG')
+    return _cached('empty', '.png', render, _tile_dir(), TILE_CACHE_MAX_MB)
+
+
+# --------------------------------------------------------------------------- #
+# URLs for templates                                                          #
+# --------------------------------------------------------------------------- #
+def thumbnail_url(url, width, mask=False):
+    query = {'url': url, 'w': snap_width(width)}
+    if mask:
+        query['mask'] = 1
+    return f"{reverse('thumbnail')}?{urlencode(query)}"
+
+
+def tile_url_template(url, geo_params):
+    """Leaflet tileLayer URL template ({z}/{x}/{y}) of a mask."""
+    path = reverse('mask_tile', args=[0, 0, 0]).replace('/0/0/0.png', '/{z}/{x}/{y}.png')
+    return f"{path}?{urlencode({'url': url, 'gt': ','.join(map(repr, map(float, geo_params)))})}"
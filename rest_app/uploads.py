@@ -0,0 +1,107 @@
+"""
+Streaming upload handler for the inference forms.
+
+Django's default handlers keep small uploads in memory, so a batch of tiles
+stays resident until the whole request is done. `HashingUploadHandler` writes
+every file straight to a temporary file on disk instead, and while the chunks
+go by it:
+
+  * checks the name and PNG signature of each `image_files` upload, and
+  * computes the SHA-256 digest that `cache.file_digest` would otherwise
+    compute with a second pass over the file.
+
+Rejected files are skipped (never written to disk) and reported through
+`rejected_uploads(request)`. Once a file has been sent to Cloudinary the
+pipeline calls `release_upload`, which deletes its temporary file.
+"""
+import hashlib
+import re
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import (FileUploadHandler, SkipFile,
+                                             TemporaryFileUploadHandler)
+
+from rest_app.metrics import end_stage, start_stage
+
+IMAGE_FIELD   = 'image_files'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+IMAGE_NAME_RE = re.compile(r'^(?P<base>.+)_(?P<kind>pre|post)_disaster\.png$')
+
+
+class HashedUploadedFile(TemporaryUploadedFile):
+    """A TemporaryUploadedFile that knows the SHA-256 digest of its content."""
+
+    digest = None
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream uploads to disk, hashing and validating them on the way.
+
+    Must be the first entry of FILE_UPLOAD_HANDLERS: it consumes every chunk.
+    The whole multipart parse is timed as the `receive` stage, wherever it
+    happens (usually in CsrfViewMiddleware, which reads request.POST). Django
+    only calls upload_complete when the parse succeeds; when it raises (client
+    disconnect, too many fields...) StageTimingMiddleware ends the stage.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        start_stage(self.request, 'receive')
+
+    def upload_complete(self):
+        end_stage(self.request, 'receive')
+
+    def new_file(self, *args, **kwargs):
+        FileUploadHandler.new_file(self, *args, **kwargs)
+        # created before any check: on SkipFile Django closes (deletes) it
+        self.file = HashedUploadedFile(self.file_name, self.content_type, 0,
+                                       self.charset, self.content_type_extra)
+        self.hasher = hashlib.sha256()
+        self.head = b''
+        self.is_image = self.field_name == IMAGE_FIELD
+        if self.is_image and not IMAGE_NAME_RE.match(self.file_name):
+            self._reject('must be named <base>_pre_disaster.png or <base>_post_disaster.png')
+            raise SkipFile()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.is_image and len(self.head) < len(PNG_SIGNATURE):
+            # the signature may straddle chunks when the chunk size is tiny
+            self.head += raw_data[:len(PNG_SIGNATURE) - len(self.head)]
+            if not PNG_SIGNATURE.startswith(self.head):
+                self._reject('is not a PNG image')
+                raise SkipFile()
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.is_image and self.head != PNG_SIGNATURE:
+            # shorter than a PNG signature (or empty)
+            self._reject('is not a PNG image')
+            self.file.close()
+            return None
+        self.file.digest = self.hasher.hexdigest()
+        return super().file_complete(file_size)
+
+    def _reject(self, reason):
+        if not hasattr(self.request, '_rejected_uploads'):
+            self.request._rejected_uploads = []
+        self.request._rejected_uploads.append(f'{self.file_name} {reason}.')
+
+
+def image_base(name):
+    """`<base>` of an image named <base>_pre_disaster.png or <base>_post_disaster.png."""
+    match = IMAGE_NAME_RE.match(name)
+    return match['base'] if match else name
+
+
+def rejected_uploads(request):
+    """Messages for the files HashingUploadHandler refused in this request."""
+    # the handler only runs once the request body is parsed
+    request.FILES
+    return list(getattr(request, '_rejected_uploads', []))
+
+
+def release_upload(file):
+    """Delete the temporary file behind an upload that is no longer needed."""
+    if hasattr(file, 'temporary_file_path'):
+        file.close()
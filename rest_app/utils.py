@@ -1,25 +1,26 @@
-import numpy as np
-from django.template.loader import get_template
 from django.http import HttpResponse
-from xhtml2pdf import pisa
 import os
 from rest_app.config.cloudinary import upload_file
+from rest_app.report_assets import prefetch_images, LOGO_URL
+from rest_app.geo import reference_coords
+from rest_app.metrics import timed
+from rest_app.pdf_merge import merge_pdf_parts
+from rest_app.pdf_render import (PdfRenderError, render_template_to_bytes,
+                                 render_template_to_file, run_render)
+from rest_app.damage import SEVERITY_LABELS, SEVERITY_ORDER, DamageTable
+from rest_app.report_fragments import report_fragments
 import tempfile
 from datetime import datetime
 
 # --------------------------------------------------------------------------- #
 # CONSTANTS                                                                   #
 # --------------------------------------------------------------------------- #
-# --------------------------------------------------------------------------- #
-# 1.  Cost constants (USD per pixel) – tune as needed                         #
-# --------------------------------------------------------------------------- #
-COST_PER_PIXEL = {
-    "no_damage":      0,     # inspection only
-    "minor_damage":   0.12,  # ~ $120 / m² if 1 px ≈ 0.22 m²
-    "major_damage":   0.35,  # ~ $350 / m²
-    "destroyed":      0.75,  # ~ $750 / m²
-}
-SEVERITY_ORDER = ["no_damage", "minor_damage", "major_damage", "destroyed"]
+# Cost per pixel and class order live with the columnar results (rest_app.damage)
+
+# Reports with more images than REPORT_STREAM_THRESHOLD are rendered
+# REPORT_PAGE_SIZE images at a time and merged (see render_report_parts)
+REPORT_PAGE_SIZE        = int(os.getenv("REPORT_PAGE_SIZE", "25"))
+REPORT_STREAM_THRESHOLD = int(os.getenv("REPORT_STREAM_THRESHOLD", "50"))
 # --------------------------------------------------------------------------- #
 
 def transform_five_reference_coords(image_size, geo_transform):
@@ -33,247 +34,221 @@ def transform_five_reference_coords(image_size, geo_transform):
     Returns:
     - dict: A dictionary with keys for each reference point and values as (lat, lon) tuples.
     """
-    width, height = image_size
     geo_params = geo_transform[list(geo_transform.keys())[0]][0]
+    return reference_coords(geo_params, image_size)
+
+def _report_image_data(detail_entries):
+    """Per‑image section data for the report, with images prefetched locally."""
+    labels = [SEVERITY_LABELS[c] for c in SEVERITY_ORDER]
+
+    table = DamageTable.from_rows(detail_entries)
+    counts, areas, costs = (table.counts.astype(int).tolist(), table.areas.tolist(),
+                            table.costs.tolist())
+    percentages = table.image_percentages().tolist()
+    # keep classes that have at least one non‑zero value
+    present = ((table.counts != 0) | (table.areas != 0) | (table.costs != 0)).tolist()
+    tot_counts, tot_areas, tot_costs = table.image_totals()
+    tot_counts, tot_areas, tot_costs = (tot_counts.astype(int).tolist(), tot_areas.tolist(),
+                                        tot_costs.tolist())
 
-    lon_top_left, pixel_width, rotation_x, lat_top_left, rotation_y, pixel_height = geo_params
-
-    def pixel_to_geo(x, y):
-        lon = lon_top_left + x * pixel_width + y * rotation_x
-        lat = lat_top_left + x * rotation_y + y * pixel_height
-        return [lat, lon]
+    image_data = []
+    for i, d in enumerate(detail_entries):
+        image_data.append({
+            "post_image_url": d["post_image_url"],
+            "mask_image_url": d["damage_mask_url"],
+            "breakdown": [{"category":   label,
+                           "count":      counts[i][k],
+                           "area":       areas[i][k],
+                           "total_cost": costs[i][k],
+                           "percentage": percentages[i][k]}
+                          for k, label in enumerate(labels) if present[i][k]],
+            "totals": {
+                "count": tot_counts[i],
+                "area":  tot_areas[i],
+                "cost":  tot_costs[i],
+            },
+        })
 
-    reference_coords = {
-        "top_left": pixel_to_geo(0, 0),
-        "top_right": pixel_to_geo(width - 1, 0),
-        "center": pixel_to_geo(width // 2, height // 2),
-        "bottom_left": pixel_to_geo(0, height - 1),
-        "bottom_right": pixel_to_geo(width - 1, height - 1)
+    # download + downscale every image up front, concurrently; the template
+    # then only references local files
+    local = prefetch_images(
+        [url for item in image_data
+         for url in (item["post_image_url"], item["mask_image_url"])],
+        masks=[item["mask_image_url"] for item in image_data],
+    )
+    for item in image_data:
+        item["post_image_url"] = local[item["post_image_url"]]
+        item["mask_image_url"] = local[item["mask_image_url"]]
+    return image_data
+
+
+def _report_context(summary_stats, grand_area, grand_cost, total_clusters):
+    """Template context shared by every part of a report (no image sections)."""
+    logo_src        = prefetch_images([LOGO_URL], width=None)[LOGO_URL]
+    generation_date = datetime.utcnow().strftime("%Y‑%m‑%d %H:%M:%S")
+    return {
+        "summary_stats":   summary_stats,
+        "grand_area":      grand_area,
+        "grand_cost":      grand_cost,
+        "total_clusters":  total_clusters,
+        "generation_date": generation_date,
+        "logo_src":        logo_src,
+        # styles, header and unit-cost table, rendered once (rest_app.report_fragments)
+        **report_fragments(logo_src),
+        "show_cover":      True,
+        "image_data":      [],
+        "image_offset":    0,
     }
 
-    return reference_coords
 
-def validate_uploaded_images(image_files):
+@timed('pdf.render')
+def _render_pdf_file(context):
     """
-    Validate that each pre-disaster image has a corresponding post-disaster image.
+    Render report.html with `context` into a temporary PDF, in the render
+    pool (see rest_app.pdf_render); returns its path or None.
 
-    Args:
-        image_files (list): List of uploaded InMemoryUploadedFile objects.
+    Raises PdfRenderError when the render times out or can't be queued.
+    """
+    return run_render(render_template_to_file, "report.html", context)
 
-    Returns:
-        (bool, list): Tuple of validation status and a list of base names (without _pre/_post suffixes).
+
+def render_report_parts(detail_entries, context, page_size=None, first_index=0):
     """
-    pre_files = set()
-    post_files = set()
-    base_names = []
+    Render a report as a sequence of small PDFs: the cover (unit costs and
+    summary) followed by one part per `page_size` images.
 
-    for image in image_files:
-        filename = image.name
-        if "_pre_disaster" in filename:
-            base_name = filename.replace("_pre_disaster", "").replace(".png", "")
-            pre_files.add(base_name)
-        elif "_post_disaster" in filename:
-            base_name = filename.replace("_post_disaster", "").replace(".png", "")
-            post_files.add(base_name)
+    Only one page of image data, HTML and pisa state is alive at a time, and
+    merge_pdf_parts (rest_app.pdf_merge) then holds one part at a time, so
+    memory stays flat whatever the batch size. `first_index` is the number
+    of images that precede these ones (for continuous numbering).
 
-    matched = pre_files == post_files
-    base_names = list(pre_files & post_files)
+    Yields:
+        str: path of each temporary part, or None if a part failed to render.
+             The caller owns (and must delete) the files.
+    """
+    page_size = page_size or REPORT_PAGE_SIZE
+    yield _render_pdf_file(context)
+
+    for offset in range(0, len(detail_entries), page_size):
+        yield _render_pdf_file({
+            **context,
+            "show_cover":   False,
+            "image_data":   _report_image_data(detail_entries[offset:offset + page_size]),
+            "image_offset": first_index + offset,
+        })
 
-    return matched, base_names
 
+def _render_report_pdf(detail_entries, context, page_size=None, first_index=0):
+    """Render the parts of a report and merge them into one temporary PDF."""
+    parts = []
+    try:
+        for part in render_report_parts(detail_entries, context, page_size, first_index):
+            if part is None:
+                return None
+            parts.append(part)
 
-def validate_json_structure(json_data, expected_image_names):
-    """
-    Validate the geotransform JSON file structure.
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+            pdf_path = tmp.name
+        merge_pdf_parts(parts, pdf_path)
+        return pdf_path
+    finally:
+        for part in parts:
+            os.remove(part)
 
-    Args:
-        json_data (dict): Loaded JSON content.
-        expected_image_names (list): Expected image file names from uploaded images (with _pre and _post suffixes).
 
-    Returns:
-        bool: Whether the structure is valid.
-    """
-    if not isinstance(json_data, dict):
-        return False
-
-    required_count = len(expected_image_names) * 2  # pre and post for each
-
-    if len(json_data.keys()) != required_count:
-        return False
-
-    # Collect expected image keys
-    expected_keys = set()
-    for base_name in expected_image_names:
-        expected_keys.add(f"{base_name}_pre_disaster.png")
-        expected_keys.add(f"{base_name}_post_disaster.png")
-
-    for key, value in json_data.items():
-        if key not in expected_keys:
-            return False
-        if not isinstance(value, list) or len(value) != 2:
-            return False
-        if not isinstance(value[0], list) or len(value[0]) != 6:
-            return False
-        if not isinstance(value[1], str):
-            return False
-
-    return True
-
-def _image_breakdown(detail_row):
-    """Return per‑image breakdown list for the PDF."""
-    area_tot = sum(detail_row[f"area_{c}"] for c in SEVERITY_ORDER) or 1  # avoid ÷0
-    out = []
-    for cat in SEVERITY_ORDER:
-        area   = detail_row[f"area_{cat}"]
-        count  = detail_row[f"num_{cat}"]
-        pct    = 100 * area / area_tot
-        totcost = area * COST_PER_PIXEL[cat]
-        out.append({
-            "category": cat,
-            "count":    count,
-            "area":     area,
-            "percentage": pct,
-            "total_cost": totcost,
-        })
-    return out
+def _upload_report(pdf_path, public_id):
+    upload_res = upload_file(pdf_path,
+                             folder="reports",
+                             public_id=public_id)
+    os.remove(pdf_path)
+
+    if upload_res["success"]:
+        return upload_res["secure_url"], None
+    return None, upload_res["error"]
 
 
+@timed('pdf.report')
 def generate_pdf_report(header_id,
                         detail_entries,
                         summary_stats,
                         grand_area,
                         grand_cost,
-                        total_clusters):
+                        total_clusters,
+                        page_size=None):
     """
     Renders the report HTML to PDF, uploads it to Cloudinary, and
     returns (secure_url, None)  – or (None, error_msg) on failure.
-    """
-    # ---------------------------------------------------------------
-    # Build per‑image section data
-    # ---------------------------------------------------------------
-    damage_keys = [
-        ("no_damage",     "No Damage"),
-        ("minor_damage",  "Minor Damage"),
-        ("major_damage",  "Major Damage"),
-        ("destroyed",     "Destroyed"),
-    ]
-
-    image_data = []
-
-    for d in detail_entries:
-        # 1) reconstruct the breakdown list -----------------------------------
-        brk = []
-        for key, label in damage_keys:
-            count = d.get(f"num_{key}",   0)
-            area  = d.get(f"area_{key}",  0)
-            cost  = d.get(f"cost_{key}",  0)
-
-            # keep rows that have at least one non‑zero value
-            if any((count, area, cost)):
-                brk.append({
-                    "category":   label,
-                    "count":      count,
-                    "area":       area,
-                    "total_cost": cost,
-                })
-
-        # 2) per‑image totals --------------------------------------------------
-        tot_count = sum(b["count"]      for b in brk)
-        tot_area  = sum(b["area"]       for b in brk)
-        tot_cost  = sum(b["total_cost"] for b in brk)
-
-        # 3) add % share (safe for zero‑area images) ---------------------------
-        for b in brk:
-            b["percentage"] = (b["area"] / tot_area * 100) if tot_area else 0
-
-        # 4) assemble the structure used by the template ----------------------
-        image_data.append({
-            "post_image_url": d["post_image_url"],
-            "mask_image_url": d["damage_mask_url"],
-            "breakdown":      brk,
-            "totals": {
-                "count": tot_count,
-                "area":  tot_area,
-                "cost":  tot_cost,
-            },
-        })
-
-    unit_costs = [
-        {"category": "No Damage",    "unit_cost": COST_PER_PIXEL["no_damage"]},
-        {"category": "Minor Damage", "unit_cost": COST_PER_PIXEL["minor_damage"]},
-        {"category": "Major Damage", "unit_cost": COST_PER_PIXEL["major_damage"]},
-        {"category": "Destroyed",    "unit_cost": COST_PER_PIXEL["destroyed"]},
-    ]
-    # ---------------------------------------------------------------
-    # Render HTML with Jinja2 template
-    # ---------------------------------------------------------------
-    context = {
-        "summary_stats":   summary_stats,
-        "grand_area":      grand_area,
-        "grand_cost":      grand_cost,
-        "total_clusters":  total_clusters,
-        "image_data":      image_data,
-        "generation_date": datetime.utcnow().strftime("%Y‑%m‑%d %H:%M:%S"),
-        "unit_costs":       unit_costs,
-    }
 
-    template = get_template("report.html")        # Django’s loader
-    html     = template.render(context)
+    Batches larger than REPORT_STREAM_THRESHOLD images (or any batch when
+    `page_size` is given) are rendered in pages and merged, see
+    render_report_parts.
+    """
+    context = _report_context(summary_stats, grand_area, grand_cost, total_clusters)
+
+    try:
+        if page_size is None and len(detail_entries) <= REPORT_STREAM_THRESHOLD:
+            # small batch: a single pisa pass
+            pdf_path = _render_pdf_file({**context,
+                                         "image_data": _report_image_data(detail_entries)})
+        else:
+            pdf_path = _render_report_pdf(detail_entries, context, page_size)
+    except PdfRenderError as exc:
+        return None, exc.message
+
+    if pdf_path is None:
+        return None, "Failed to generate PDF"
 
-    # ---------------------------------------------------------------
-    # Create a temporary PDF
-    # ---------------------------------------------------------------
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        pisa_status = pisa.CreatePDF(html, dest=tmp)
-        pdf_path = tmp.name
+    return _upload_report(pdf_path, f"{header_id}_report")
 
-    if pisa_status.err:
-        return None, "Failed to generate PDF"
 
-    # ---------------------------------------------------------------
-    # Upload to Cloudinary
-    # ---------------------------------------------------------------
-    upload_res = upload_file(pdf_path,
-                             folder="reports",
-                             public_id=f"{header_id}_report")
-    os.remove(pdf_path)
+@timed('pdf.report')
+def generate_pdf_volumes(header_id,
+                         detail_entries,
+                         summary_stats,
+                         grand_area,
+                         grand_cost,
+                         total_clusters,
+                         volume_size,
+                         page_size=None):
+    """
+    Like generate_pdf_report, but split into volumes of `volume_size` images,
+    each with its own cover page.
 
-    if upload_res["success"]:
-        return upload_res["secure_url"], None
-    return None, upload_res["error"]
+    Returns:
+        (list, None): secure URLs of the volumes in order, or (None, error_msg).
+    """
+    context = _report_context(summary_stats, grand_area, grand_cost, total_clusters)
+    urls = []
+    for number, offset in enumerate(range(0, len(detail_entries), volume_size), start=1):
+        volume = detail_entries[offset:offset + volume_size]
+        # keep the image numbering continuous across volumes
+        try:
+            pdf_path = _render_report_pdf(volume, context, page_size, first_index=offset)
+        except PdfRenderError as exc:
+            return None, f"PDF volume {number}: {exc.message}"
+        if pdf_path is None:
+            return None, f"Failed to generate PDF volume {number}"
+
+        url, err = _upload_report(pdf_path, f"{header_id}_report_vol{number}")
+        if err:
+            return None, err
+        urls.append(url)
+    return urls, None
 
 def build_summary(detail_rows):
     """Return summary_stats list + grand totals for the PDF."""
-    by_cat = {cat: {"count": 0, "area": 0, "unit_cost": COST_PER_PIXEL[cat]}   # UNIT_COST = same dict you use in Flask
-              for cat in SEVERITY_ORDER}
-
-    for row in detail_rows:
-        for cat in SEVERITY_ORDER:
-            by_cat[cat]["count"] += row[f"num_{cat}"]
-            by_cat[cat]["area"]  += row[f"area_{cat}"]
-
-    grand_area = sum(v["area"] for v in by_cat.values())
-    grand_cost = 0
-    summary    = []
-    for cat in SEVERITY_ORDER:
-        v = by_cat[cat]
-        v["percentage"]  = 0 if grand_area == 0 else 100 * v["area"] / grand_area
-        v["total_cost"]  = v["area"] * v["unit_cost"]
-        grand_cost      += v["total_cost"]
-        summary.append({"category": cat, **v})
-
-    total_clusters = sum(v["count"] for v in by_cat.values())
-    return summary, grand_area, grand_cost, total_clusters
+    return DamageTable.from_rows(detail_rows).summary()
 
 
 def render_to_pdf(template_src, context_dict={}):
-    template = get_template(template_src)
-    html = template.render(context_dict)
-    response = HttpResponse(content_type='application/pdf')
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse('We had some errors <pre>' + html + '</pre>')
-    return response
+    """Render a template to a PDF response, in the render pool."""
+    try:
+        pdf, error_html = run_render(render_template_to_bytes, template_src, context_dict)
+    except PdfRenderError as exc:
+        return HttpResponse(exc.message, status=503)
+    if error_html is not None:
+        return HttpResponse('We had some errors <pre>' + error_html + '</pre>')
+    return HttpResponse(pdf, content_type='application/pdf')
 
 def split_filename_and_extension(filename: str) -> tuple[str, str]:
     """
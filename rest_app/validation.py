@@ -0,0 +1,121 @@
+"""
+Single-pass validation of an inference batch.
+
+`index_images` reads the uploaded file names once and groups them by base
+name; `check_geotransforms` then checks every geotransform entry against
+that index, the numeric parameters in one NumPy pass. Both return
+structured per-file errors ({'file': name, 'error': message}) rather than
+stopping at the first problem.
+
+The result is a `BatchIndex`: base name → PairEntry(pre, post, geo), in
+upload order. The pipeline looks pairs up in it instead of rebuilding or
+searching for file names.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from rest_app.uploads import IMAGE_NAME_RE
+
+PairEntry = namedtuple('PairEntry', ['pre', 'post', 'geo'])
+
+
+class BatchIndex(dict):
+    """base name → PairEntry of a validated batch, in upload order."""
+
+    @classmethod
+    def from_base_names(cls, base_names, json_data):
+        """Index pairs named the usual way (<base>_pre_disaster.png, ...)."""
+        index = cls()
+        for base in base_names:
+            pre, post = f"{base}_pre_disaster.png", f"{base}_post_disaster.png"
+            index[base] = PairEntry(pre, post, json_data.get(pre))
+        return index
+
+    def image_names(self):
+        """Every pre and post file name, pair by pair."""
+        return [name for entry in self.values() for name in (entry.pre, entry.post)]
+
+
+def batch_index(base_names, json_data):
+    """`base_names` as a BatchIndex (callers may still pass a plain list)."""
+    if isinstance(base_names, BatchIndex):
+        return base_names
+    return BatchIndex.from_base_names(base_names, json_data)
+
+
+def _error(name, message):
+    return {'file': name, 'error': message}
+
+
+def index_images(image_names):
+    """
+    Group uploaded file names into pre/post pairs.
+
+    Returns:
+        (dict, list): base → {'pre': name, 'post': name} in upload order,
+                      and the per-file errors.
+    """
+    pairs, errors = {}, []
+    for name in image_names:
+        match = IMAGE_NAME_RE.match(name)
+        if match is None:
+            errors.append(_error(name, 'must be named <base>_pre_disaster.png or '
+                                       '<base>_post_disaster.png'))
+            continue
+        slots = pairs.setdefault(match['base'], {})
+        if match['kind'] in slots:
+            errors.append(_error(name, 'uploaded more than once'))
+        slots[match['kind']] = name
+
+    for base, slots in pairs.items():
+        for have, missing in (('pre', 'post'), ('post', 'pre')):
+            if have in slots and missing not in slots:
+                errors.append(_error(slots[have], f'has no matching {missing}-disaster image'))
+    return pairs, errors
+
+
+def _malformed(value):
+    return not (isinstance(value, list) and len(value) == 2
+                and isinstance(value[0], list) and len(value[0]) == 6
+                and isinstance(value[1], str))
+
+
+def check_geotransforms(json_data, pairs):
+    """
+    Check the geotransform JSON against the indexed pairs: one
+    [[6 numbers], projection] entry per image, and nothing else.
+
+    Returns:
+        list: per-file errors; empty when the JSON is valid.
+    """
+    if not isinstance(json_data, dict):
+        return [_error(None, 'the geotransform JSON must be an object keyed by file name')]
+
+    expected = [name for slots in pairs.values() for name in slots.values()]
+    errors = [_error(name, 'has no geotransform entry')
+              for name in expected if name not in json_data]
+    known = set(expected)
+    errors += [_error(key, 'is not one of the uploaded images')
+               for key in json_data if key not in known]
+
+    present = [name for name in expected if name in json_data]
+    malformed = {name for name in present if _malformed(json_data[name])}
+    errors += [_error(name, 'geotransform must be [[6 numbers], "<projection>"]')
+               for name in present if name in malformed]
+
+    # checked by type first: float() would also accept strings such as "7"
+    names = [name for name in present if name not in malformed]
+    numeric = [all(type(v) in (int, float) for v in json_data[name][0]) for name in names]
+    params = np.array([json_data[name][0] if ok else [0.0] * 6
+                       for name, ok in zip(names, numeric)], dtype=float).reshape(-1, 6)
+    finite = np.isfinite(params).all(axis=1) & numeric
+    errors += [_error(name, 'geotransform parameters must be finite numbers')
+               for name, ok in zip(names, finite.tolist()) if not ok]
+    return errors
+
+
+def build_batch_index(pairs, json_data):
+    """The BatchIndex of pairs and geotransforms that passed both checks."""
+    return BatchIndex((base, PairEntry(slots['pre'], slots['post'], json_data[slots['pre']]))
+                      for base, slots in pairs.items())
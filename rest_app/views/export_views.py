@@ -0,0 +1,28 @@
+from django.http import StreamingHttpResponse
+from rest_app.exports import (execution_rows, stream_buildings_geojson, stream_csv,
+                              stream_geojson)
+
+
+def _attachment(streaming_content, content_type, filename):
+    response = StreamingHttpResponse(streaming_content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def export_csv(request, header_id):
+    """Stream the per-tile damage results of an execution as CSV."""
+    return _attachment(stream_csv(execution_rows(header_id)),
+                       'text/csv', f'{header_id}_results.csv')
+
+
+def export_geojson(request, header_id):
+    """Stream the tile footprints and damage results of an execution as GeoJSON."""
+    return _attachment(stream_geojson(execution_rows(header_id), {'header_id': header_id}),
+                       'application/geo+json', f'{header_id}_results.geojson')
+
+
+def export_buildings(request, header_id):
+    """Stream an outline of every building in the execution's damage masks as GeoJSON."""
+    return _attachment(stream_buildings_geojson(execution_rows(header_id),
+                                                {'header_id': header_id}),
+                       'application/geo+json', f'{header_id}_buildings.geojson')
@@ -0,0 +1,61 @@
+from django.http import JsonResponse
+from django.shortcuts import render
+from rest_app.history import HISTORY_PAGE_SIZE, execution_details, execution_map, list_executions
+
+# Largest page a client may ask for
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+def _paging(request):
+    """Read ?after= and ?limit= ; raises ValueError on bad input."""
+    after = request.GET.get('after')
+    limit = request.GET.get('limit')
+    after = int(after) if after else None
+    limit = min(int(limit), HISTORY_MAX_PAGE_SIZE) if limit else None
+    if limit is not None and limit < 1:
+        raise ValueError('limit must be positive')
+    return after, limit
+
+
+def execution_history(request):
+    """Executions, newest first; follow `next` with ?after=<next>."""
+    try:
+        after, limit = _paging(request)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid paging parameters'}, status=400)
+    page = list_executions(after, limit)
+    return JsonResponse({'executions': page['rows'], 'next': page['next']})
+
+
+def execution_history_details(request, header_id):
+    """Per-tile results of one execution, a page at a time."""
+    try:
+        after, limit = _paging(request)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid paging parameters'}, status=400)
+    page = execution_details(header_id, after=after, limit=limit)
+    return JsonResponse({'header_id': header_id, 'details': page['rows'], 'next': page['next']})
+
+
+def batch_results(request, header_id):
+    """
+    Result page of a multi-pair batch: one map of every tile, and tile cards
+    that the page fetches from `execution_history_details` as it scrolls.
+
+    `?pairs=` is the batch size; the page keeps polling until that many
+    tiles have been saved (detail rows are written in the background).
+    """
+    try:
+        expected = max(int(request.GET.get('pairs', 0)), 0)
+    except ValueError:
+        expected = 0
+    return render(request, 'batch_results.html', {
+        'header_id': header_id,
+        'expected_pairs': expected,
+        'page_size': min(HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE),
+    })
+
+
+def batch_results_map(request, header_id):
+    """Centre, footprint and totals of every tile of an execution, for the map."""
+    return JsonResponse({'header_id': header_id, **execution_map(header_id)})
@@ -0,0 +1,64 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_app.models import InferenceJob
+from rest_app.jobs import astream_job_events, job_events_snapshot, submit_inference_job
+from rest_app.pipeline import validate_inference_request, PipelineError
+from rest_app.uploads import rejected_uploads
+
+
+def create_job(request):
+    """Validate a batch and queue it; responds immediately with the job id."""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+
+    image_files = request.FILES.getlist('image_files')
+    json_file   = request.FILES.get('json_file')
+    try:
+        json_data, index = validate_inference_request(
+            image_files, json_file, rejected_uploads(request))
+    except PipelineError as exc:
+        return JsonResponse(exc.as_response(), status=exc.status)
+
+    job = submit_inference_job(image_files, json_data, index)
+    return JsonResponse({
+        'status':     job.status,
+        'job_id':     str(job.id),
+        'status_url': reverse('job_status', args=[job.id]),
+        'events_url': reverse('job_events', args=[job.id]),
+    }, status=202)
+
+
+def job_status(request, job_id):
+    """Report progress, and the results once finished, for one job."""
+    job = get_object_or_404(InferenceJob, pk=job_id)
+    return JsonResponse(job.as_dict())
+
+
+def job_events(request, job_id):
+    """
+    A job's progress as Server-Sent Events: one event per uploaded file,
+    inferred chunk and persisted chunk, then `succeeded` or `failed`, then
+    `report` once the PDF is ready, and `end`. A reconnecting EventSource
+    resumes after its Last-Event-ID.
+
+    Under ASGI the events are streamed as they happen. A WSGI worker gets
+    the events so far and closes the response; EventSource then polls.
+    """
+    get_object_or_404(InferenceJob, pk=job_id)
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.GET.get('after') or 0)
+    except ValueError:
+        after = 0
+
+    # a stream would hold a sync worker for JOB_EVENTS_MAX_SECONDS
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(astream_job_events(job_id, after),
+                                         content_type='text/event-stream')
+    else:
+        response = HttpResponse(job_events_snapshot(job_id, after),
+                                content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'    # nginx: pass events straight through
+    return response
@@ -0,0 +1,9 @@
+from django.http import HttpResponse
+from rest_app.metrics import render_metrics
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics(request):
+    """Stage latencies, request latencies and cache counters for Prometheus."""
+    return HttpResponse(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,30 @@
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from rest_app.models import Report
+
+# Seconds a client should wait before polling a pending report again
+REPORT_RETRY_AFTER = 3
+
+
+def report_viewer(request, header_id):
+    """
+    Redirect to the finished PDF of an execution.
+
+    While the report is still rendering this answers 202 with
+    {'status': 'pending'}; `?format=json` always answers with the status.
+    """
+    report = get_object_or_404(Report, header_id=header_id)
+    as_json = request.GET.get('format') == 'json'
+
+    if report.status == Report.READY:
+        if as_json:
+            return JsonResponse({'status': report.status, 'url': report.url,
+                                 'volumes': report.volumes})
+        return redirect(report.url)
+
+    if report.status == Report.FAILED:
+        return JsonResponse({'status': report.status, 'message': report.error}, status=500)
+
+    response = JsonResponse({'status': report.status}, status=200 if as_json else 202)
+    response['Retry-After'] = str(REPORT_RETRY_AFTER)
+    return response
@@ -0,0 +1,37 @@
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse
+from rest_app.thumbnails import (THUMBNAIL_MAX_AGE, ThumbnailError, mask_tile as render_mask_tile,
+                                 parse_geo_params, thumbnail as render_thumbnail)
+
+
+def _serve(request, render):
+    """Answer with the cached image (or 304 when the client already has it)."""
+    try:
+        path, content_type, etag = render()
+    except ThumbnailError as exc:
+        return JsonResponse({'status': 'error', 'message': exc.message}, status=exc.status)
+
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={THUMBNAIL_MAX_AGE}'
+    return response
+
+
+def thumbnail(request):
+    """Downscaled preview of an uploaded image (?url=&w=, ?mask=1 for masks)."""
+    try:
+        width = int(request.GET.get('w', 512))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid width'}, status=400)
+    mask = request.GET.get('mask') == '1'
+    return _serve(request, lambda: render_thumbnail(request.GET.get('url'), width, mask))
+
+
+def mask_tile(request, z, x, y):
+    """Web Mercator XYZ tile of a mask (?url=&gt=<6 geotransform parameters>)."""
+    def render():
+        geo_params = parse_geo_params(request.GET.get('gt'))
+        return render_mask_tile(request.GET.get('url'), geo_params, z, x, y)
+    return _serve(request, render)
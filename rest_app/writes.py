@@ -0,0 +1,192 @@
+"""
+Write path for Supabase rows.
+
+Rows are first written to a local spool (the `PendingWrite` table) in
+size-bounded batches, which only costs a local insert on the request path.
+A writer thread then pushes the spooled batches to Supabase in order,
+retrying with exponential backoff; a batch is removed from the spool only
+once Supabase has accepted it. Anything still spooled when Supabase is down
+is sent again by the next flush, which only happens when a request writes
+new rows: run `manage.py replay_supabase_spool` periodically (e.g. from cron)
+so a backlog also drains while the service is idle.
+
+The spool is shared by every worker process. A flush first claims the
+batches it will send with one atomic UPDATE, so two processes never send
+the same batch; a claim older than SUPABASE_CLAIM_TIMEOUT (its process died
+mid-flush) may be taken over. A flush renews its claims before every batch
+and stops as soon as one has been taken over.
+"""
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from rest_app.config.supabase import get_supabase_client
+from rest_app.history import invalidate_execution
+from rest_app.metrics import timed
+from rest_app.models import OpenExecution, PendingWrite
+
+SUPABASE_WRITE_BATCH_SIZE = int(os.getenv('SUPABASE_WRITE_BATCH_SIZE', '500'))
+SUPABASE_WRITE_RETRIES    = int(os.getenv('SUPABASE_WRITE_RETRIES', '3'))
+SUPABASE_WRITE_BACKOFF    = float(os.getenv('SUPABASE_WRITE_BACKOFF', '0.5'))
+# seconds after which a claimed batch is considered abandoned
+SUPABASE_CLAIM_TIMEOUT    = int(os.getenv('SUPABASE_CLAIM_TIMEOUT', '300'))
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+class SupabaseWriteError(Exception):
+    """Supabase did not accept a write after every retry."""
+
+
+def get_writer_executor():
+    """Return the single writer thread, so spooled batches reach Supabase in order."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='supabase-writer')
+    return _executor
+
+
+@timed('supabase.insert')
+def insert_with_retry(table_name, rows, retries=None, backoff=None):
+    """
+    Insert `rows` (a dict or a list of dicts) now, retrying failures.
+
+    Returns:
+        list: The inserted rows as returned by Supabase.
+
+    Raises:
+        SupabaseWriteError: when every attempt failed.
+    """
+    retries = SUPABASE_WRITE_RETRIES if retries is None else retries
+    backoff = SUPABASE_WRITE_BACKOFF if backoff is None else backoff
+
+    for attempt in range(retries + 1):
+        try:
+            response = get_supabase_client().table(table_name).insert(rows).execute()
+            if response.data:
+                return response.data
+            error = getattr(response, 'error', None) or 'empty response'
+        except Exception as exc:
+            error = exc
+        if attempt < retries:
+            # full jitter, as for the inference client
+            time.sleep(random.uniform(0, backoff * 2 ** attempt))
+    raise SupabaseWriteError(f'Insert into {table_name} failed: {error}')
+
+
+def _batch_header_id(rows):
+    header_ids = {str(row.get('header_id', '')) for row in rows}
+    return header_ids.pop() if len(header_ids) == 1 else ''
+
+
+def spool_rows(table_name, rows, batch_size=None):
+    """Store `rows` in the local spool in batches; returns the PendingWrite ids."""
+    batch_size = batch_size or SUPABASE_WRITE_BATCH_SIZE
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+    return [PendingWrite.objects.create(table_name=table_name, rows=batch,
+                                        header_id=_batch_header_id(batch)).id
+            for batch in batches]
+
+
+def open_execution(header_id):
+    """Mark an execution as still producing detail rows (see history.execution_complete)."""
+    OpenExecution.objects.get_or_create(header_id=str(header_id))
+
+
+def close_execution(header_id):
+    """Every detail row of the execution has been spooled."""
+    OpenExecution.objects.filter(header_id=str(header_id)).delete()
+
+
+def claim_spool(token):
+    """
+    Atomically claim every unclaimed (or abandoned) spooled batch for `token`.
+
+    Returns:
+        QuerySet: the batches now claimed by `token`, oldest first.
+    """
+    now = timezone.now()
+    PendingWrite.objects.filter(
+        Q(claimed_by='') | Q(claimed_at__lt=now - timedelta(seconds=SUPABASE_CLAIM_TIMEOUT))
+    ).update(claimed_by=token, claimed_at=now)
+    return PendingWrite.objects.filter(claimed_by=token).order_by('id')
+
+
+def renew_claim(token, pending):
+    """
+    Refresh the claims of `token` before sending `pending`.
+
+    Returns:
+        bool: False when `pending` has been taken over by another flush.
+    """
+    PendingWrite.objects.filter(claimed_by=token).update(claimed_at=timezone.now())
+    return PendingWrite.objects.filter(pk=pending.pk, claimed_by=token).exists()
+
+
+def flush_spool(retries=None, backoff=None):
+    """
+    Send every spooled batch this call can claim to Supabase, oldest first.
+
+    Stops at the first batch that still fails after its retries so later
+    batches never overtake it; its claims are released for the next flush.
+
+    Returns:
+        dict: number of batches 'written' and 'remaining' in the spool, and
+              the 'error' that stopped the flush (None if it completed).
+    """
+    written, error = 0, None
+    token = f"{os.getpid()}-{uuid.uuid4().hex}"
+    try:
+        for pending in claim_spool(token).iterator():
+            if not renew_claim(token, pending):
+                # a slow flush outlived SUPABASE_CLAIM_TIMEOUT: leave the rest to its successor
+                logger.warning("Supabase flush lost its claim on spooled batch %s", pending.pk)
+                break
+            try:
+                insert_with_retry(pending.table_name, pending.rows, retries, backoff)
+            except SupabaseWriteError as exc:
+                error = str(exc)
+                PendingWrite.objects.filter(pk=pending.pk).update(
+                    attempts=F('attempts') + 1, last_error=error, updated_at=timezone.now())
+                logger.warning("Supabase write spooled for later: %s", error)
+                break
+            PendingWrite.objects.filter(pk=pending.pk, claimed_by=token).delete()
+            written += 1
+            if pending.table_name == 'execution_details':
+                # cached history pages of these executions are now stale
+                for header_id in {row.get('header_id') for row in pending.rows}:
+                    invalidate_execution(header_id)
+    finally:
+        PendingWrite.objects.filter(claimed_by=token).update(claimed_by='', claimed_at=None)
+    return {'written': written, 'remaining': PendingWrite.objects.count(), 'error': error}
+
+
+def _flush_in_background():
+    try:
+        return flush_spool()
+    finally:
+        # worker threads own their DB connection; don't leak it
+        connection.close()
+
+
+def write_rows(table_name, rows, batch_size=None):
+    """
+    Durably queue rows for Supabase and return without waiting for it.
+
+    Returns:
+        Future: resolves to the flush_spool() result of the write.
+    """
+    if not rows:
+        return None
+    spool_rows(table_name, rows, batch_size)
+    return get_writer_executor().submit(_flush_in_background)